@@ -0,0 +1,6 @@
+from ._backend import Backend, NativeQubit
+from ._numpy_backend import NumPyBackend, StateVector
+from ._projectq_backend import ProjectQBackend
+from ._factorized_backend import FactorizedBackend, FactorizedState
+from ._mps_backend import MPSBackend, MPSState
+from ._gate_program import GateProgram
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+class Backend:
+    """
+    The base class of quantum simulation backends.
+    A backend allocates wavefunctions, on which the ansatz apply gates by the functions in Utilities/Operations.py,
+    and measures properties (expectation values, amplitudes) of the wavefunctions.
+
+    The wavefunction produced by allocate_wavefunction() should be indexable like a list of qubits.
+    Usage:
+        wavefunction = backend.allocate_wavefunction(n_qubit)
+        ansatz(parameter, wavefunction)
+        backend.flush(wavefunction)
+        energy = backend.get_expectation_value(hamiltonian, wavefunction)
+        backend.deallocate(wavefunction)
+    The operator of get_expectation_value() can be a QubitOperator or a PauliSum (see Utilities/PauliSum.py).
+
+    Backends with IS_BATCH_AVAILABLE = True also implement allocate_batch_wavefunction(n_qubit, n_batch),
+    which allocates n_batch wavefunctions evolved together. The ansatz applied on it receives parameters
+    whose entries are arrays of length n_batch, and the measurements return arrays of length n_batch.
+
+    Backends with IS_STATEVECTOR_AVAILABLE = False (like MPSBackend) simulate too many qubits to export
+    the statevectors, so the statevector-based shortcuts (prefix states, adjoint gradients) are not used with them.
+    """
+    IS_BATCH_AVAILABLE = False
+    IS_STATEVECTOR_AVAILABLE = True
+
+    def allocate_wavefunction(self, n_qubit):
+        return
+
+    def allocate_batch_wavefunction(self, n_qubit, n_batch):
+        return
+
+    def flush(self, wavefunction):
+        return
+
+    def get_expectation_value(self, operator, wavefunction):
+        return
+
+    def get_amplitude(self, bit_string, wavefunction):
+        return
+
+    def get_statevector(self, wavefunction):
+        """
+        Return all the amplitudes of the wavefunction as a NumPy array of length 2^n_qubit.
+        The i-th qubit of the wavefunction corresponds to the i-th bit of the index (little-endian),
+        i.e. amplitude[sum_i b_i*2^i] = <b_{n-1}...b_1 b_0|psi>, the same as ProjectQ.
+        Backends should override it. This default implementation calls get_amplitude() 2^n_qubit times.
+        """
+        n_qubit = len(wavefunction)
+        amplitudes = np.zeros(1 << n_qubit, dtype=complex)
+        for number in range(1 << n_qubit):
+            bit_string = [((number >> i) & 1) == 1 for i in range(n_qubit)]
+            amplitudes[number] = self.get_amplitude(bit_string, wavefunction)
+        return amplitudes
+
+    def deallocate(self, wavefunction):
+        return
+
+
+class NativeQubit:
+    """
+    The qubit handle of the wavefunctions of native (in-process) backends.
+    The functions in Utilities/Operations.py call the kernels of *register* directly
+    when they meet a NativeQubit instead of sending ProjectQ gates.
+    Attributes:
+        register: the wavefunction object that holds the amplitudes
+        index: the index of the qubit in the register
+    """
+    __slots__ = ("register", "index")
+
+    def __init__(self, register, index):
+        self.register = register
+        self.index = index
+
+
+def get_register_and_indices(qubits):
+    """
+    Return the register shared by a list of NativeQubit and the indices of the qubits in it
+    """
+    register = None
+    indices = []
+    for qubit in qubits:
+        if qubit is None:
+            indices.append(None)
+            continue
+        register = qubit.register
+        indices.append(qubit.index)
+    return register, indices
+
+
+def reorder_statevector(amplitudes, locations):
+    """
+    Reorder the amplitudes so that the bit locations[i] of the original index becomes the bit i
+    Args:
+        amplitudes: array of length 2^n
+        locations: a permutation of range(n)
+    """
+    n_qubit = len(locations)
+    if list(locations) == list(range(n_qubit)):
+        return amplitudes
+    tensor = np.reshape(amplitudes, (2,) * n_qubit)
+    axes = [n_qubit - 1 - locations[n_qubit - 1 - axis] for axis in range(n_qubit)]
+    return np.ascontiguousarray(np.transpose(tensor, axes)).reshape(-1)
@@ -0,0 +1,332 @@
+import numpy as np
+from ._backend import Backend, NativeQubit, get_register_and_indices, reorder_statevector
+from ._numpy_backend import StateVector, get_pauli_masks, apply_pauli_by_masks
+
+"""
+A simulator of the states that are products of small entangled parts, like the sparse-correlated basis states of QSD.
+Each group of qubits connected by the gates applied so far (a connected component) has its own StateVector,
+and two groups are merged (by a tensor product) only when a gate acts on both of them.
+The memory and time are exponential in the size of the largest group instead of the number of qubits.
+"""
+
+
+class Factor:
+    """
+    A connected component of FactorizedState
+    Attributes:
+        qubits: the qubit indices in the FactorizedState of the qubits of the component.
+            qubits[k] is the k-th qubit of state
+        state: the StateVector of the component
+    """
+
+    def __init__(self, qubits, state: StateVector):
+        self.qubits = qubits
+        self.state = state
+        self.local_index_dict = {qubit: k for k, qubit in enumerate(qubits)}
+
+    def get_sorted_amplitudes(self):
+        """
+        Return the amplitudes of the state with the qubits in ascending order of their indices
+        """
+        return reorder_statevector(self.state.amplitudes, np.argsort(self.qubits))
+
+
+class FactorizedState:
+    """
+    The wavefunction of FactorizedBackend, a product of the states of the connected components (see Factor).
+    It provides the same kernels as StateVector, which map the qubits to the components and merge
+    the components touched by a multi-qubit gate.
+    The factors can be shared with the copies of the state (see copy()). A gate only changes the factors
+    in owned_factors, and the other factors are copied first (see get_writable_factor()).
+    """
+
+    IS_GATE_PROGRAM_AVAILABLE = True
+    IS_STATE_LOADING_AVAILABLE = False
+
+    def __init__(self, n_qubit):
+        self.n_qubit = n_qubit
+        self.n_batch = None
+        self.factor_of_qubit = [Factor([i], StateVector(1)) for i in range(n_qubit)]
+        self.owned_factors = set(self.factor_of_qubit)
+        self.qubits = [NativeQubit(self, i) for i in range(n_qubit)]
+
+    def __len__(self):
+        return self.n_qubit
+
+    def __getitem__(self, key):
+        return self.qubits[key]
+
+    def __iter__(self):
+        return iter(self.qubits)
+
+    def copy(self):
+        """
+        Return a copy sharing the factors. Neither state owns the shared factors any more,
+        so each of them copies a factor before its first gate on it (copy-on-write)
+        """
+        new_state = FactorizedState(0)
+        new_state.n_qubit = self.n_qubit
+        new_state.factor_of_qubit = list(self.factor_of_qubit)
+        new_state.qubits = [NativeQubit(new_state, i) for i in range(self.n_qubit)]
+        self.owned_factors = set()
+        return new_state
+
+    def get_writable_factor(self, factor):
+        """
+        Return the factor if the state owns it, or else replace it in the state by an owned copy and return the copy
+        """
+        if factor in self.owned_factors:
+            return factor
+        factor = Factor(factor.qubits, StateVector(len(factor.qubits), factor.state.amplitudes.copy()))
+        for qubit in factor.qubits:
+            self.factor_of_qubit[qubit] = factor
+        self.owned_factors.add(factor)
+        return factor
+
+    def get_factors(self):
+        """
+        Return the list of the different factors, ordered by their smallest qubit
+        """
+        factor_dict = {}
+        for factor in self.factor_of_qubit:
+            factor_dict[id(factor)] = factor
+        return sorted(factor_dict.values(), key=lambda factor: min(factor.qubits))
+
+    def merge(self, qubits):
+        """
+        Merge the factors of the qubits into one and return it. The state owns the factor returned
+        """
+        factor_dict = {}
+        for qubit in qubits:
+            factor = self.factor_of_qubit[qubit]
+            factor_dict[id(factor)] = factor
+        factors = list(factor_dict.values())
+        merged = factors[0]
+        for factor in factors[1:]:
+            # The qubits of factor become the higher bits
+            amplitudes = np.outer(factor.state.amplitudes, merged.state.amplitudes).reshape(-1)
+            merged = Factor(merged.qubits + factor.qubits, StateVector(len(merged.qubits) + len(factor.qubits),
+                                                                       amplitudes))
+        if len(factors) == 1:
+            return self.get_writable_factor(merged)
+        for factor in factors:
+            self.owned_factors.discard(factor)
+        for qubit in merged.qubits:
+            self.factor_of_qubit[qubit] = merged
+        self.owned_factors.add(merged)
+        return merged
+
+    def _local(self, index):
+        factor = self.get_writable_factor(self.factor_of_qubit[index])
+        return factor.state, factor.local_index_dict[index]
+
+    def apply_x(self, index):
+        state, local_index = self._local(index)
+        state.apply_x(local_index)
+
+    def apply_y(self, index):
+        state, local_index = self._local(index)
+        state.apply_y(local_index)
+
+    def apply_z(self, index):
+        state, local_index = self._local(index)
+        state.apply_z(local_index)
+
+    def apply_h(self, index):
+        state, local_index = self._local(index)
+        state.apply_h(local_index)
+
+    def apply_rx(self, index, angle):
+        state, local_index = self._local(index)
+        state.apply_rx(local_index, angle)
+
+    def apply_ry(self, index, angle):
+        state, local_index = self._local(index)
+        state.apply_ry(local_index, angle)
+
+    def apply_rz(self, index, angle):
+        state, local_index = self._local(index)
+        state.apply_rz(local_index, angle)
+
+    def apply_single_qubit_matrix(self, index, matrix):
+        state, local_index = self._local(index)
+        state.apply_single_qubit_matrix(local_index, matrix)
+
+    def apply_global_phase(self, angle):
+        self.get_writable_factor(self.factor_of_qubit[0]).state.apply_global_phase(angle)
+
+    def apply_cnot(self, control, target):
+        factor = self.merge((control, target))
+        factor.state.apply_cnot(factor.local_index_dict[control], factor.local_index_dict[target])
+
+    def apply_cz(self, index1, index2):
+        factor = self.merge((index1, index2))
+        factor.state.apply_cz(factor.local_index_dict[index1], factor.local_index_dict[index2])
+
+    def apply_pauli_rotation(self, x_mask, z_mask, n_y, evolution_time):
+        qubits = [qubit for qubit in range(self.n_qubit) if ((x_mask | z_mask) >> qubit) & 1]
+        if len(qubits) == 0:
+            self.apply_global_phase(-evolution_time)
+            return
+        factor = self.merge(qubits)
+        local_x_mask, local_z_mask = get_local_masks(factor.qubits, x_mask, z_mask)
+        factor.state.apply_pauli_rotation(local_x_mask, local_z_mask, n_y, evolution_time)
+
+    def apply_time_evolution(self, string_pauli_coeff_list, time, indices=None):
+        string_pauli_coeff_list = list(string_pauli_coeff_list)
+        qubits = set()
+        for string_pauli, _coeff in string_pauli_coeff_list:
+            for qubit, _pauli_char in string_pauli:
+                qubits.add(qubit if indices is None else indices[qubit])
+        if len(qubits) == 0:
+            qubits.add(0)
+        factor = self.merge(sorted(qubits))
+        local_indices = {}
+        for string_pauli, _coeff in string_pauli_coeff_list:
+            for qubit, _pauli_char in string_pauli:
+                local_indices[qubit] = factor.local_index_dict[qubit if indices is None else indices[qubit]]
+        factor.state.apply_time_evolution(string_pauli_coeff_list, time, local_indices)
+
+    # The GateProgram is executed by the same kernel table as StateVector
+    apply_gate_program = StateVector.apply_gate_program
+    PROGRAM_KERNELS = StateVector.PROGRAM_KERNELS
+
+    def get_pauli_expectation(self, string_pauli, indices=None):
+        """
+        Return <P> as the product of the expectations of the parts of P on the factors
+        """
+        x_mask, z_mask, n_y = get_pauli_masks(string_pauli, indices)
+        expectation = 1j ** n_y
+        for factor in self.get_touched_factors(x_mask | z_mask):
+            local_x_mask, local_z_mask = get_local_masks(factor.qubits, x_mask, z_mask)
+            amplitudes = factor.state.amplitudes
+            expectation *= np.vdot(amplitudes, apply_pauli_by_masks(amplitudes, local_x_mask, local_z_mask, 0))
+        return expectation
+
+    def get_touched_factors(self, mask):
+        factor_dict = {}
+        for qubit in range(self.n_qubit):
+            if (mask >> qubit) & 1:
+                factor = self.factor_of_qubit[qubit]
+                factor_dict[id(factor)] = factor
+        return list(factor_dict.values())
+
+    def get_amplitude_by_number(self, number):
+        amplitude = 1.0 + 0.0j
+        for factor in self.get_factors():
+            local_number = 0
+            for k, qubit in enumerate(factor.qubits):
+                local_number |= ((number >> qubit) & 1) << k
+            amplitude *= factor.state.amplitudes[local_number]
+        return amplitude
+
+    def get_statevector(self):
+        """
+        Return the dense statevector, which takes 2^n_qubit memory
+        """
+        amplitudes = np.ones(1, dtype=complex)
+        qubit_order = []
+        for factor in self.get_factors():
+            amplitudes = np.outer(factor.state.amplitudes, amplitudes).reshape(-1)
+            qubit_order.extend(factor.qubits)
+        return reorder_statevector(amplitudes, np.argsort(qubit_order))
+
+
+def get_local_masks(qubits, x_mask, z_mask):
+    """
+    Return the masks of the Pauli word restricted to the qubits, where qubits[k] becomes the bit k
+    """
+    local_x_mask, local_z_mask = 0, 0
+    for k, qubit in enumerate(qubits):
+        local_x_mask |= ((x_mask >> qubit) & 1) << k
+        local_z_mask |= ((z_mask >> qubit) & 1) << k
+    return local_x_mask, local_z_mask
+
+
+def align_factors(first_state: FactorizedState, second_state: FactorizedState):
+    """
+    Merge the factors of the two states until they have the same connected components
+    """
+    while True:
+        changed = False
+        for state, other_state in ((first_state, second_state), (second_state, first_state)):
+            for factor in other_state.get_factors():
+                if len(state.get_touched_factors(sum(1 << qubit for qubit in factor.qubits))) > 1:
+                    state.merge(factor.qubits)
+                    changed = True
+        if not changed:
+            return
+
+
+def get_factorized_overlap(first_state: FactorizedState, second_state: FactorizedState, operator=None):
+    """
+    Return <second|operator|first> (or <second|first> if operator is None) as sums of products of
+    the terms on the common connected components of the two states. The states are not changed
+    Args:
+        operator: a QubitOperator
+    """
+    first_state, second_state = first_state.copy(), second_state.copy()
+    align_factors(first_state, second_state)
+    factor_pairs = []
+    for factor in first_state.get_factors():
+        other_factor = second_state.factor_of_qubit[factor.qubits[0]]
+        qubits = sorted(factor.qubits)
+        factor_pairs.append((qubits, factor.get_sorted_amplitudes(), other_factor.get_sorted_amplitudes()))
+    overlaps = [np.vdot(second_amplitudes, first_amplitudes) for _qubits, first_amplitudes, second_amplitudes
+                in factor_pairs]
+    if operator is None:
+        return np.prod(overlaps)
+
+    result = 0.0
+    for string_pauli, coeff in operator.terms.items():
+        x_mask, z_mask, n_y = get_pauli_masks(string_pauli)
+        term = coeff * (1j ** n_y)
+        for (qubits, first_amplitudes, second_amplitudes), overlap in zip(factor_pairs, overlaps):
+            local_x_mask, local_z_mask = get_local_masks(qubits, x_mask, z_mask)
+            if local_x_mask == 0 and local_z_mask == 0:
+                term *= overlap
+            else:
+                term *= np.vdot(second_amplitudes, apply_pauli_by_masks(first_amplitudes, local_x_mask, local_z_mask,
+                                                                        0))
+        result += term
+    return result
+
+
+class FactorizedBackend(Backend):
+    """
+    Backend of the factorized product-state simulator. See FactorizedState.
+    The expectation values of Pauli sums are evaluated term by term as products over the touched components,
+    so the dense statevector is never built unless get_statevector() is called.
+    """
+
+    def allocate_wavefunction(self, n_qubit):
+        return FactorizedState(n_qubit)
+
+    def get_expectation_value(self, operator, wavefunction):
+        from ..Utilities.PauliSum import PauliSum
+        if isinstance(operator, PauliSum):
+            operator = operator.to_qubit_operator()
+        register, indices = get_register_and_indices(wavefunction)
+        expectation = 0.0
+        for string_pauli, coeff in operator.terms.items():
+            if len(string_pauli) == 0:
+                expectation += coeff
+                continue
+            expectation += coeff * register.get_pauli_expectation(string_pauli, indices)
+        return float(np.real(expectation))
+
+    def get_amplitude(self, bit_string, wavefunction):
+        register, indices = get_register_and_indices(wavefunction)
+        number = 0
+        for i in range(len(bit_string)):
+            if bit_string[i]:
+                number |= 1 << indices[i]
+        return complex(register.get_amplitude_by_number(number))
+
+    def get_statevector(self, wavefunction):
+        if isinstance(wavefunction, FactorizedState):
+            return wavefunction.get_statevector()
+        register, indices = get_register_and_indices(wavefunction)
+        if len(indices) != register.n_qubit:
+            raise Exception("The statevector can only be exported for all the qubits in the register!")
+        return reorder_statevector(register.get_statevector(), indices)
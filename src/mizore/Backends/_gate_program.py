@@ -0,0 +1,378 @@
+import numpy as np
+from openfermion.ops import QubitOperator
+
+from ._backend import NativeQubit
+
+"""
+A flat array-backed representation of a parametrized circuit, see GateProgram.
+The programs are produced by tracing an ansatz on a GateRecorder, see BlockCircuit.compile().
+"""
+
+OP_X = 0
+OP_Y = 1
+OP_Z = 2
+OP_H = 3
+OP_RX = 4
+OP_RY = 5
+OP_RZ = 6
+OP_CNOT = 7
+OP_CZ = 8
+OP_GLOBAL_PHASE = 9
+OP_PAULI_ROTATION = 10
+OP_TIME_EVOLUTION = 11
+# A fused 2x2 matrix, which only appears in the fused instructions (see GateProgram.get_fused_plan())
+OP_MATRIX = 12
+
+NO_PARAMETER = -1
+
+
+class AffineParameter:
+    """
+    The symbolic value coeff * parameter[slot] + offset used for tracing an ansatz.
+    The slot is NO_PARAMETER for constants.
+    """
+    __slots__ = ("slot", "coeff", "offset")
+    # Make NumPy scalars defer to the reflected operators below
+    __array_ufunc__ = None
+
+    def __init__(self, slot=NO_PARAMETER, coeff=1.0, offset=0.0):
+        self.slot = slot
+        self.coeff = coeff if slot != NO_PARAMETER else 0.0
+        self.offset = offset
+
+    def __add__(self, other):
+        if not isinstance(other, AffineParameter):
+            return AffineParameter(self.slot, self.coeff, self.offset + other)
+        if other.slot == NO_PARAMETER or self.slot == NO_PARAMETER or other.slot == self.slot:
+            slot = self.slot if self.slot != NO_PARAMETER else other.slot
+            return AffineParameter(slot, self.coeff + other.coeff, self.offset + other.offset)
+        raise Exception("An angle depending on more than one parameter can not be compiled!")
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return AffineParameter(self.slot, -self.coeff, -self.offset)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        if isinstance(other, AffineParameter):
+            raise Exception("An angle nonlinear in the parameters can not be compiled!")
+        return AffineParameter(self.slot, self.coeff * other, self.offset * other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return self * (1 / other)
+
+
+# The 2x2 matrix of the single-qubit gate of each op code <= OP_RZ is sum_k coeffs[op_code, k] * basis_k
+# on the basis (cos(a/2), sin(a/2), e^{-ia/2}, e^{ia/2}, 1) of its angle a
+_SINGLE_QUBIT_MATRIX_COEFFS = np.zeros((OP_RZ + 1, 5, 2, 2), dtype=complex)
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_X, 4] = [[0, 1], [1, 0]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_Y, 4] = [[0, -1j], [1j, 0]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_Z, 4] = [[1, 0], [0, -1]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_H, 4] = np.array([[1, 1], [1, -1]]) * np.sqrt(0.5)
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_RX, 0] = [[1, 0], [0, 1]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_RX, 1] = [[0, -1j], [-1j, 0]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_RY, 0] = [[1, 0], [0, 1]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_RY, 1] = [[0, -1], [1, 0]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_RZ, 2] = [[1, 0], [0, 0]]
+_SINGLE_QUBIT_MATRIX_COEFFS[OP_RZ, 3] = [[0, 0], [0, 1]]
+
+
+def get_single_qubit_matrices(op_codes, angles):
+    """
+    Return the matrices of the single-qubit gates (op codes <= OP_RZ) with the angles in one vectorized pass.
+    angles can also be (n_gate x n_batch), then the matrices are (n_gate x n_batch x 2 x 2)
+    """
+    half = angles / 2
+    basis = np.stack([np.cos(half), np.sin(half), np.exp(-1j * half), np.exp(1j * half), np.ones_like(half)], axis=-1)
+    coeffs = _SINGLE_QUBIT_MATRIX_COEFFS[op_codes].reshape((len(op_codes),) + (1,) * (angles.ndim - 1) + (5, 2, 2))
+    return np.einsum("...k,...kij->...ij", basis, coeffs)
+
+
+class FusedPlan:
+    """
+    The fused instructions of a GateProgram (see GateProgram.get_fused_plan())
+    Attributes:
+        instruction_list: (op_code, arguments) of the fused instructions
+        starts: the index of the first gate of each fused instruction, which covers the gates up to the next start
+        matrix_positions: the positions of the OP_MATRIX instructions in instruction_list
+        run_gate_indices: (n_matrix x max run length) the gates multiplied into each OP_MATRIX, padded by -1
+    """
+
+    def __init__(self, instruction_list, starts, matrix_positions, run_gate_indices):
+        self.instruction_list = instruction_list
+        self.starts = starts
+        self.matrix_positions = matrix_positions
+        self.run_gate_indices = run_gate_indices
+
+
+def to_affine_parameter(value):
+    if isinstance(value, AffineParameter):
+        return value
+    return AffineParameter(offset=value)
+
+
+class GateProgram:
+    """
+    A circuit compiled into flat arrays. The k-th gate is op_codes[k] applied with the integer
+    arguments arguments[k] and the angle param_coeffs[k] * parameter[param_slots[k]] + param_offsets[k]
+    (the angle is param_offsets[k] when param_slots[k] is NO_PARAMETER).
+
+    The arguments are
+        OP_X, OP_Y, OP_Z, OP_H, OP_RX, OP_RY, OP_RZ: (qubit, -, -)
+        OP_CNOT: (control, target, -); OP_CZ: (qubit1, qubit2, -)
+        OP_PAULI_ROTATION: (x_mask, z_mask, n_y) for e^{-iPt} (see StateVector.apply_pauli_rotation)
+        OP_TIME_EVOLUTION: (index in operator_list, -, -) for e^{-iHt}
+        OP_GLOBAL_PHASE: (-, -, -)
+    The native registers execute the fused instructions instead (see get_fused_plan()), where
+        OP_MATRIX: (qubit, -, -) with a 2x2 matrix in place of the angle
+
+    Attributes:
+        n_qubit: number of qubits the program acts on
+        n_parameter: number of adjustable parameters
+    """
+
+    def __init__(self, n_qubit, n_parameter, op_codes, arguments, param_slots, param_coeffs, param_offsets,
+                 operator_list):
+        self.n_qubit = n_qubit
+        self.n_parameter = n_parameter
+        self.op_codes = op_codes
+        self.arguments = arguments
+        self.param_slots = param_slots
+        self.param_coeffs = param_coeffs
+        self.param_offsets = param_offsets
+        self.operator_list = operator_list
+        self.instruction_list = list(zip(op_codes.tolist(), arguments.tolist()))
+        self._fused_plan = None
+
+    def __len__(self):
+        return len(self.op_codes)
+
+    def get_fused_plan(self):
+        """
+        Return (and cache) the FusedPlan of the program, where each run of consecutive single-qubit gates
+        on the same qubit is fused into one OP_MATRIX, and each run of consecutive Pauli rotations
+        of the same Pauli word into one rotation by the sum of their angles
+        """
+        if self._fused_plan is not None:
+            return self._fused_plan
+        instruction_list, starts, matrix_positions, run_list = [], [], [], []
+        n_gate = len(self.instruction_list)
+        k = 0
+        while k < n_gate:
+            op_code, args = self.instruction_list[k]
+            end = k + 1
+            if op_code <= OP_RZ:
+                while end < n_gate and self.instruction_list[end][0] <= OP_RZ \
+                        and self.instruction_list[end][1][0] == args[0]:
+                    end += 1
+                if end - k > 1:
+                    op_code = OP_MATRIX
+                    matrix_positions.append(len(instruction_list))
+                    run_list.append(list(range(k, end)))
+            elif op_code == OP_PAULI_ROTATION:
+                while end < n_gate and self.instruction_list[end] == (op_code, args):
+                    end += 1
+            instruction_list.append((op_code, args))
+            starts.append(k)
+            k = end
+        max_run_length = max([len(run) for run in run_list], default=0)
+        run_gate_indices = np.full((len(run_list), max_run_length), -1, dtype=np.int64)
+        for i, run in enumerate(run_list):
+            run_gate_indices[i, :len(run)] = run
+        self._fused_plan = FusedPlan(instruction_list, np.array(starts, dtype=np.int64), matrix_positions,
+                                     run_gate_indices)
+        return self._fused_plan
+
+    def get_fused_values(self, angles):
+        """
+        Return the value passed to the kernel of each fused instruction (see get_fused_plan()):
+        the matrix for OP_MATRIX and the (summed) angle for the others.
+        The matrices of all the runs are computed in one vectorized pass
+        """
+        plan = self.get_fused_plan()
+        if len(plan.instruction_list) == 0:
+            return []
+        values = list(np.add.reduceat(angles, plan.starts, axis=0))
+        if len(plan.matrix_positions) == 0:
+            return values
+        gate_indices = plan.run_gate_indices
+        padded_matrices = get_single_qubit_matrices(self.op_codes[gate_indices[gate_indices >= 0]],
+                                                    angles[gate_indices[gate_indices >= 0]])
+        # The padding -1 picks the identity appended at the end
+        identity = np.broadcast_to(np.eye(2, dtype=complex), (1,) + padded_matrices.shape[1:])
+        padded_matrices = np.concatenate([padded_matrices, identity])
+        matrix_index = np.full(gate_indices.shape, -1, dtype=np.int64)
+        matrix_index[gate_indices >= 0] = np.arange(np.count_nonzero(gate_indices >= 0))
+        run_matrices = padded_matrices[matrix_index[:, 0]]
+        for j in range(1, gate_indices.shape[1]):
+            run_matrices = padded_matrices[matrix_index[:, j]] @ run_matrices
+        for position, matrix in zip(plan.matrix_positions, run_matrices):
+            values[position] = matrix
+        return values
+
+    def get_angles(self, parameter):
+        """
+        Return the angles of all the gates, computed in one vectorized pass.
+        parameter can also be a (n_parameter x n_batch) array, then the angles are (n_gate x n_batch)
+        """
+        parameter = np.asarray(parameter)
+        # The last row is for the gates without adjustable parameter
+        padded = np.concatenate([parameter, np.zeros((1,) + parameter.shape[1:])])
+        shape = (-1,) + (1,) * (parameter.ndim - 1)
+        return self.param_coeffs.reshape(shape) * padded[self.param_slots] + self.param_offsets.reshape(shape)
+
+    def apply(self, parameter, wavefunction):
+        """
+        Apply the program on the wavefunction like an ansatz.
+        Registers with IS_GATE_PROGRAM_AVAILABLE execute the arrays by themselves.
+        Otherwise the gates are applied by Utilities.Operations, e.g. on a ProjectQ qureg
+        """
+        if getattr(wavefunction, "IS_GATE_PROGRAM_AVAILABLE", False):
+            wavefunction.apply_gate_program(self, parameter)
+            return
+        from ..Utilities import Operations
+        angles = self.get_angles(parameter)
+        for k in range(len(self.instruction_list)):
+            op_code, (arg0, arg1, arg2) = self.instruction_list[k]
+            angle = angles[k]
+            if op_code <= OP_Z:
+                Operations._pauli("XYZ"[op_code], wavefunction[arg0])
+            elif op_code == OP_H:
+                Operations._h(wavefunction[arg0])
+            elif op_code == OP_RX:
+                Operations._rx(angle, wavefunction[arg0])
+            elif op_code == OP_RY:
+                Operations._ry(angle, wavefunction[arg0])
+            elif op_code == OP_RZ:
+                Operations._rz(angle, wavefunction[arg0])
+            elif op_code == OP_CNOT:
+                Operations._cnot(wavefunction[arg0], wavefunction[arg1])
+            elif op_code == OP_CZ:
+                Operations._cz(wavefunction[arg0], wavefunction[arg1])
+            elif op_code == OP_GLOBAL_PHASE:
+                Operations.apply_global_phase(wavefunction, angle)
+            elif op_code == OP_PAULI_ROTATION:
+                qsubset, pauliword = masks2pauliword(arg0, arg1)
+                Operations.generalized_rotation(wavefunction, qsubset, pauliword, angle)
+            else:
+                Operations.apply_time_evolution(self.operator_list[arg0], angle, wavefunction)
+
+
+def masks2pauliword(x_mask, z_mask):
+    """
+    Return the qsubset and the pauliword (1:X,2:Y,3:Z) of the Pauli word given by the masks
+    """
+    qsubset = []
+    pauliword = []
+    index = 0
+    while (x_mask | z_mask) >> index:
+        x_bit, z_bit = (x_mask >> index) & 1, (z_mask >> index) & 1
+        if x_bit or z_bit:
+            qsubset.append(index)
+            pauliword.append(2 if x_bit and z_bit else (1 if x_bit else 3))
+        index += 1
+    return qsubset, pauliword
+
+
+def _as_angle_array(values):
+    array = np.array(values)
+    return array.astype(np.result_type(array.dtype, float))
+
+
+class GateRecorder:
+    """
+    A register which records the kernels called on it instead of simulating them.
+    It is used with AffineParameter to trace an ansatz into a GateProgram.
+    """
+
+    def __init__(self, n_qubit):
+        self.n_qubit = n_qubit
+        self.qubits = [NativeQubit(self, i) for i in range(n_qubit)]
+        self.op_code_list = []
+        self.argument_list = []
+        self.angle_list = []
+        self.operator_list = []
+
+    def __len__(self):
+        return self.n_qubit
+
+    def __getitem__(self, key):
+        return self.qubits[key]
+
+    def __iter__(self):
+        return iter(self.qubits)
+
+    def _record(self, op_code, arguments, angle=0.0):
+        self.op_code_list.append(op_code)
+        self.argument_list.append(tuple(arguments) + (-1,) * (3 - len(arguments)))
+        self.angle_list.append(to_affine_parameter(angle))
+
+    def apply_x(self, index):
+        self._record(OP_X, (index,))
+
+    def apply_y(self, index):
+        self._record(OP_Y, (index,))
+
+    def apply_z(self, index):
+        self._record(OP_Z, (index,))
+
+    def apply_h(self, index):
+        self._record(OP_H, (index,))
+
+    def apply_rx(self, index, angle):
+        self._record(OP_RX, (index,), angle)
+
+    def apply_ry(self, index, angle):
+        self._record(OP_RY, (index,), angle)
+
+    def apply_rz(self, index, angle):
+        self._record(OP_RZ, (index,), angle)
+
+    def apply_global_phase(self, angle):
+        self._record(OP_GLOBAL_PHASE, (), angle)
+
+    def apply_cnot(self, control, target):
+        self._record(OP_CNOT, (control, target))
+
+    def apply_cz(self, index1, index2):
+        self._record(OP_CZ, (index1, index2))
+
+    def apply_pauli_rotation(self, x_mask, z_mask, n_y, evolution_time):
+        self._record(OP_PAULI_ROTATION, (x_mask, z_mask, n_y), evolution_time)
+
+    def apply_time_evolution(self, string_pauli_coeff_list, time, indices=None):
+        operator = QubitOperator()
+        for string_pauli, coeff in string_pauli_coeff_list:
+            if indices is not None:
+                string_pauli = tuple((indices[i], pauli) for i, pauli in string_pauli)
+            operator += QubitOperator(string_pauli, coeff)
+        self._record(OP_TIME_EVOLUTION, (len(self.operator_list),), time)
+        self.operator_list.append(operator)
+
+    def get_program(self, n_parameter):
+        angle_list = self.angle_list
+        return GateProgram(self.n_qubit, n_parameter,
+                           np.array(self.op_code_list, dtype=np.int8),
+                           np.array(self.argument_list, dtype=np.int64).reshape(-1, 3),
+                           np.array([angle.slot for angle in angle_list], dtype=np.int64),
+                           _as_angle_array([angle.coeff for angle in angle_list]),
+                           _as_angle_array([angle.offset for angle in angle_list]),
+                           self.operator_list)
+
+
+def trace_ansatz(ansatz, n_qubit, n_parameter):
+    """
+    Trace the ansatz(parameter, wavefunction) into a GateProgram.
+    The ansatz must apply its gates by Utilities.Operations and its angles must be affine in the parameters
+    """
+    recorder = GateRecorder(n_qubit)
+    ansatz([AffineParameter(i) for i in range(n_parameter)], recorder)
+    return recorder.get_program(n_parameter)
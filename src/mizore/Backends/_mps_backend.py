@@ -0,0 +1,353 @@
+import numpy as np
+from ._backend import Backend, NativeQubit, get_register_and_indices, reorder_statevector
+from ._numpy_backend import StateVector
+from ._factorized_backend import get_local_masks
+
+"""
+A matrix product state (MPS) simulator for the circuits on 1-D chains with low entanglement.
+The memory and time are polynomial in the number of qubits and the bond dimension instead of 2^n_qubit.
+
+The state is kept in the mixed canonical form around self.center, so the truncations by SVD are optimal.
+A gate on several qubits first moves them onto adjacent sites by swaps (the qubits stay there afterwards,
+which is tracked by site_of_qubit), then the sites are contracted into one tensor, on which the kernels of
+StateVector act with the two bond indices as the batch, and the tensor is split back by SVDs.
+The bond dimensions are cut at max_bond_dimension and the singular values whose squares sum to less than
+cutoff (relative to the norm) are dropped. The discarded weight is accumulated in truncation_error.
+"""
+
+# The largest number of qubits a gate can act on, since the sites of the gate are contracted densely
+MAX_DENSE_QUBIT = 16
+
+_PAULI_MATRIX_DICT = {"X": np.array([[0, 1], [1, 0]], dtype=complex),
+                      "Y": np.array([[0, -1j], [1j, 0]], dtype=complex),
+                      "Z": np.array([[1, 0], [0, -1]], dtype=complex)}
+
+
+class MPSState:
+    """
+    The wavefunction of MPSBackend. It provides the same kernels as StateVector.
+    Attributes:
+        tensors: tensors[s] is the (left bond x 2 x right bond) tensor of the site s
+        site_of_qubit, qubit_of_site: the current placement of the qubits on the sites
+        center: the orthogonality center. The sites on its left are left-canonical and on its right right-canonical
+        truncation_error: the total weight of the singular values discarded so far.
+            The fidelity with the exact state is about 1 - truncation_error when it is small
+    """
+
+    IS_GATE_PROGRAM_AVAILABLE = True
+    IS_STATE_LOADING_AVAILABLE = False
+
+    def __init__(self, n_qubit, max_bond_dimension=64, cutoff=1e-12):
+        self.n_qubit = n_qubit
+        self.n_batch = None
+        self.max_bond_dimension = max_bond_dimension
+        self.cutoff = cutoff
+        self.tensors = [np.array([1.0, 0.0], dtype=complex).reshape(1, 2, 1) for _ in range(n_qubit)]
+        self.site_of_qubit = list(range(n_qubit))
+        self.qubit_of_site = list(range(n_qubit))
+        self.center = 0
+        self.truncation_error = 0.0
+        self.qubits = [NativeQubit(self, i) for i in range(n_qubit)]
+
+    def __len__(self):
+        return self.n_qubit
+
+    def __getitem__(self, key):
+        return self.qubits[key]
+
+    def __iter__(self):
+        return iter(self.qubits)
+
+    def get_bond_dimensions(self):
+        return [tensor.shape[2] for tensor in self.tensors[:-1]]
+
+    def _move_center(self, site):
+        while self.center < site:
+            tensor = self.tensors[self.center]
+            left_dim, _, right_dim = tensor.shape
+            q, r = np.linalg.qr(tensor.reshape(left_dim * 2, right_dim))
+            self.tensors[self.center] = q.reshape(left_dim, 2, -1)
+            self.tensors[self.center + 1] = np.tensordot(r, self.tensors[self.center + 1], axes=(1, 0))
+            self.center += 1
+        while self.center > site:
+            tensor = self.tensors[self.center]
+            left_dim, _, right_dim = tensor.shape
+            q, r = np.linalg.qr(tensor.reshape(left_dim, 2 * right_dim).T)
+            self.tensors[self.center] = q.T.reshape(-1, 2, right_dim)
+            self.tensors[self.center - 1] = np.tensordot(self.tensors[self.center - 1], r.T, axes=(2, 0))
+            self.center -= 1
+
+    def _truncate(self, singular_values):
+        """
+        Return the number of singular values kept and the rescaling factor that keeps the norm
+        """
+        weights = singular_values ** 2
+        total = np.sum(weights)
+        tail = np.cumsum(weights[::-1])[::-1]
+        n_keep = max(1, min(self.max_bond_dimension, int(np.count_nonzero(tail > self.cutoff * total))))
+        discarded = total - np.sum(weights[:n_keep])
+        if discarded <= 0:
+            return n_keep, 1.0
+        self.truncation_error += discarded / total
+        return n_keep, np.sqrt(total / (total - discarded))
+
+    def _split(self, theta, start, n_site, to_left=False):
+        """
+        Split the (left bond x 2 x ... x 2 x right bond) tensor of n_site sites from start into the site tensors.
+        The center ends at the last site, or at the first site if to_left
+        """
+        left_dim, right_dim = theta.shape[0], theta.shape[-1]
+        if not to_left:
+            for site in range(start, start + n_site - 1):
+                u, s, vh = np.linalg.svd(theta.reshape(left_dim * 2, -1), full_matrices=False)
+                n_keep, scale = self._truncate(s)
+                self.tensors[site] = u[:, :n_keep].reshape(left_dim, 2, n_keep)
+                theta = (s[:n_keep, None] * scale) * vh[:n_keep]
+                left_dim = n_keep
+            self.tensors[start + n_site - 1] = theta.reshape(left_dim, 2, right_dim)
+            self.center = start + n_site - 1
+        else:
+            for site in reversed(range(start + 1, start + n_site)):
+                u, s, vh = np.linalg.svd(theta.reshape(-1, 2 * right_dim), full_matrices=False)
+                n_keep, scale = self._truncate(s)
+                self.tensors[site] = vh[:n_keep].reshape(n_keep, 2, right_dim)
+                theta = u[:, :n_keep] * (s[:n_keep] * scale)
+                right_dim = n_keep
+            self.tensors[start] = theta.reshape(left_dim, 2, right_dim)
+            self.center = start
+
+    def _swap(self, site, to_left=False):
+        """
+        Swap the qubits on the site and the site+1
+        """
+        self._move_center(site if self.center <= site else site + 1)
+        theta = np.tensordot(self.tensors[site], self.tensors[site + 1], axes=(2, 0))
+        self._split(theta.transpose(0, 2, 1, 3), site, 2, to_left)
+        qubit1, qubit2 = self.qubit_of_site[site], self.qubit_of_site[site + 1]
+        self.qubit_of_site[site], self.qubit_of_site[site + 1] = qubit2, qubit1
+        self.site_of_qubit[qubit1], self.site_of_qubit[qubit2] = site + 1, site
+
+    def _gather(self, qubits):
+        """
+        Move the qubits onto adjacent sites by swaps toward their middle one and return the first site
+        """
+        sites = sorted(self.site_of_qubit[qubit] for qubit in qubits)
+        middle = len(sites) // 2
+        anchor = sites[middle]
+        for k in range(middle + 1, len(sites)):
+            for site in reversed(range(anchor + k - middle, sites[k])):
+                self._swap(site, to_left=True)
+        for k in reversed(range(middle)):
+            for site in range(sites[k], anchor - middle + k):
+                self._swap(site)
+        return anchor - middle
+
+    def _apply_on_site(self, index, kernel):
+        """
+        Call kernel(state, 0) on the StateVector of one qubit batched over the two bonds of its site
+        """
+        site = self.site_of_qubit[index]
+        left_dim, _, right_dim = self.tensors[site].shape
+        amplitudes = np.ascontiguousarray(self.tensors[site].transpose(0, 2, 1)).reshape(-1, 2)
+        state = StateVector(1, amplitudes, n_batch=left_dim * right_dim)
+        kernel(state, 0)
+        self.tensors[site] = state.amplitudes.reshape(left_dim, right_dim, 2).transpose(0, 2, 1)
+
+    def _apply_on_qubits(self, qubits, kernel):
+        """
+        Gather the qubits and call kernel(state, local_qubits) on the StateVector of their contracted sites,
+        where the qubit local_qubits[k] is the k-th qubit of state
+        """
+        n_site = len(qubits)
+        if n_site > MAX_DENSE_QUBIT:
+            raise Exception("The gate acts on " + str(n_site) + " qubits, more than MAX_DENSE_QUBIT of the MPS!")
+        start = self._gather(qubits)
+        self._move_center(min(max(self.center, start), start + n_site - 1))
+        theta = self.tensors[start]
+        for site in range(start + 1, start + n_site):
+            theta = np.tensordot(theta, self.tensors[site], axes=(theta.ndim - 1, 0))
+        left_dim, right_dim = theta.shape[0], theta.shape[-1]
+        # The little-endian order puts the last site at the highest bit. The permutation is its own inverse
+        axes = [0, n_site + 1] + list(range(n_site, 0, -1))
+        amplitudes = np.ascontiguousarray(theta.transpose(axes)).reshape(left_dim * right_dim, -1)
+        state = StateVector(n_site, amplitudes, n_batch=left_dim * right_dim)
+        kernel(state, self.qubit_of_site[start:start + n_site])
+        theta = state.amplitudes.reshape((left_dim, right_dim) + (2,) * n_site).transpose(axes)
+        self._split(theta, start, n_site)
+
+    def apply_x(self, index):
+        self._apply_on_site(index, lambda state, local_index: state.apply_x(local_index))
+
+    def apply_y(self, index):
+        self._apply_on_site(index, lambda state, local_index: state.apply_y(local_index))
+
+    def apply_z(self, index):
+        self._apply_on_site(index, lambda state, local_index: state.apply_z(local_index))
+
+    def apply_h(self, index):
+        self._apply_on_site(index, lambda state, local_index: state.apply_h(local_index))
+
+    def apply_rx(self, index, angle):
+        self._apply_on_site(index, lambda state, local_index: state.apply_rx(local_index, angle))
+
+    def apply_ry(self, index, angle):
+        self._apply_on_site(index, lambda state, local_index: state.apply_ry(local_index, angle))
+
+    def apply_rz(self, index, angle):
+        self._apply_on_site(index, lambda state, local_index: state.apply_rz(local_index, angle))
+
+    def apply_single_qubit_matrix(self, index, matrix):
+        self._apply_on_site(index, lambda state, local_index: state.apply_single_qubit_matrix(local_index, matrix))
+
+    def apply_global_phase(self, angle):
+        self.tensors[self.center] = self.tensors[self.center] * np.exp(1j * angle)
+
+    def apply_cnot(self, control, target):
+        self._apply_on_qubits((control, target), lambda state, local_qubits: state.apply_cnot(
+            local_qubits.index(control), local_qubits.index(target)))
+
+    def apply_cz(self, index1, index2):
+        self._apply_on_qubits((index1, index2), lambda state, local_qubits: state.apply_cz(
+            local_qubits.index(index1), local_qubits.index(index2)))
+
+    def apply_pauli_rotation(self, x_mask, z_mask, n_y, evolution_time):
+        qubits = [qubit for qubit in range(self.n_qubit) if ((x_mask | z_mask) >> qubit) & 1]
+        if len(qubits) == 0:
+            self.apply_global_phase(-evolution_time)
+            return
+
+        def kernel(state, local_qubits):
+            local_x_mask, local_z_mask = get_local_masks(local_qubits, x_mask, z_mask)
+            state.apply_pauli_rotation(local_x_mask, local_z_mask, n_y, evolution_time)
+
+        self._apply_on_qubits(qubits, kernel)
+
+    def apply_time_evolution(self, string_pauli_coeff_list, time, indices=None):
+        string_pauli_coeff_list = list(string_pauli_coeff_list)
+        qubits = set()
+        for string_pauli, _coeff in string_pauli_coeff_list:
+            for qubit, _pauli_char in string_pauli:
+                qubits.add(qubit if indices is None else indices[qubit])
+        if len(qubits) == 0:
+            qubits.add(0)
+
+        def kernel(state, local_qubits):
+            local_indices = {}
+            for string_pauli, _coeff in string_pauli_coeff_list:
+                for qubit, _pauli_char in string_pauli:
+                    local_indices[qubit] = local_qubits.index(qubit if indices is None else indices[qubit])
+            state.apply_time_evolution(string_pauli_coeff_list, time, local_indices)
+
+        self._apply_on_qubits(sorted(qubits), kernel)
+
+    # The GateProgram is executed by the same kernel table as StateVector
+    apply_gate_program = StateVector.apply_gate_program
+    PROGRAM_KERNELS = StateVector.PROGRAM_KERNELS
+
+    def get_pauli_expectation(self, string_pauli, indices=None):
+        """
+        Return <P> by contracting the transfer matrices between the first and the last site of P.
+        The sites outside are canonical and contract to identities
+        """
+        matrix_of_site = {}
+        for qubit, pauli_char in string_pauli:
+            matrix_of_site[self.site_of_qubit[qubit if indices is None else indices[qubit]]] = \
+                _PAULI_MATRIX_DICT[pauli_char]
+        if len(matrix_of_site) == 0:
+            return 1.0
+        first_site, last_site = min(matrix_of_site), max(matrix_of_site)
+        self._move_center(min(max(self.center, first_site), last_site))
+        environment = None
+        for site in range(first_site, last_site + 1):
+            tensor = self.tensors[site]
+            applied = tensor
+            if site in matrix_of_site:
+                applied = np.einsum("st,atb->asb", matrix_of_site[site], tensor)
+            if environment is None:
+                environment = np.einsum("asc,asd->cd", np.conjugate(tensor), applied)
+            else:
+                environment = np.einsum("ab,asc,bsd->cd", environment, np.conjugate(tensor), applied)
+        return np.trace(environment)
+
+    def get_amplitude_by_number(self, number):
+        vector = np.ones(1, dtype=complex)
+        for site, tensor in enumerate(self.tensors):
+            vector = vector.dot(tensor[:, (number >> self.qubit_of_site[site]) & 1, :])
+        return vector[0]
+
+    def get_statevector(self):
+        """
+        Return the dense statevector, which takes 2^n_qubit memory
+        """
+        amplitudes = np.ones((1, 1), dtype=complex)
+        for tensor in self.tensors:
+            # The new site becomes the highest bit
+            amplitudes = np.einsum("ia,asb->sib", amplitudes, tensor).reshape(-1, tensor.shape[2])
+        return reorder_statevector(amplitudes.reshape(-1), self.site_of_qubit)
+
+
+class MPSBackend(Backend):
+    """
+    Backend of the MPS simulator. See MPSState.
+    The expectation values of Pauli sums are evaluated term by term by transfer matrices,
+    so the dense statevector is never built unless get_statevector() is called.
+    Attributes:
+        max_bond_dimension, cutoff: the truncation of the bonds, see MPSState
+        truncation_warning: a warning is printed when a wavefunction is deallocated
+            with a truncation error larger than it
+        max_truncation_error: the largest truncation error of the wavefunctions deallocated by this backend
+            (in this process) since the last reset_truncation_error()
+    """
+    IS_STATEVECTOR_AVAILABLE = False
+
+    def __init__(self, max_bond_dimension=64, cutoff=1e-12, truncation_warning=1e-4):
+        self.max_bond_dimension = max_bond_dimension
+        self.cutoff = cutoff
+        self.truncation_warning = truncation_warning
+        self.max_truncation_error = 0.0
+
+    def reset_truncation_error(self):
+        self.max_truncation_error = 0.0
+
+    def allocate_wavefunction(self, n_qubit):
+        return MPSState(n_qubit, self.max_bond_dimension, self.cutoff)
+
+    def get_expectation_value(self, operator, wavefunction):
+        from ..Utilities.PauliSum import PauliSum
+        if isinstance(operator, PauliSum):
+            operator = operator.to_qubit_operator()
+        register, indices = get_register_and_indices(wavefunction)
+        expectation = 0.0
+        # Sorting the terms by their first site keeps the moves of the center short
+        for string_pauli, coeff in sorted(operator.terms.items(), key=lambda term: min(
+                [register.site_of_qubit[indices[qubit]] for qubit, _pauli_char in term[0]], default=-1)):
+            if len(string_pauli) == 0:
+                expectation += coeff
+                continue
+            expectation += coeff * register.get_pauli_expectation(string_pauli, indices)
+        return float(np.real(expectation))
+
+    def get_amplitude(self, bit_string, wavefunction):
+        register, indices = get_register_and_indices(wavefunction)
+        number = 0
+        for i in range(len(bit_string)):
+            if bit_string[i]:
+                number |= 1 << indices[i]
+        return complex(register.get_amplitude_by_number(number))
+
+    def get_statevector(self, wavefunction):
+        if isinstance(wavefunction, MPSState):
+            return wavefunction.get_statevector()
+        register, indices = get_register_and_indices(wavefunction)
+        if len(indices) != register.n_qubit:
+            raise Exception("The statevector can only be exported for all the qubits in the register!")
+        return reorder_statevector(register.get_statevector(), indices)
+
+    def deallocate(self, wavefunction):
+        register, _indices = get_register_and_indices(wavefunction)
+        if register is None:
+            return
+        self.max_truncation_error = max(self.max_truncation_error, register.truncation_error)
+        if register.truncation_error > self.truncation_warning:
+            print("Warning: the truncation error of the MPS is", register.truncation_error,
+                  "with the max bond dimension", self.max_bond_dimension)
@@ -0,0 +1,461 @@
+import numpy as np
+from functools import lru_cache
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import expm_multiply
+from ._backend import Backend, NativeQubit, get_register_and_indices, reorder_statevector
+
+"""
+An in-process statevector simulator implemented by NumPy.
+It implements the gates used in Utilities/Operations.py directly on a complex array
+and avoids the engine setup and compiler passes of ProjectQ.
+"""
+
+_BASIS_INDEX_CACHE = dict()
+
+
+def get_basis_indices(n_dim):
+    """
+    Return (and cache) the read-only array [0,1,...,n_dim-1]
+    """
+    if n_dim not in _BASIS_INDEX_CACHE:
+        indices = np.arange(n_dim, dtype=np.int64)
+        indices.setflags(write=False)
+        _BASIS_INDEX_CACHE[n_dim] = indices
+    return _BASIS_INDEX_CACHE[n_dim]
+
+
+def parity(array):
+    """
+    Return the parity of the number of 1 bits of each (non-negative) integer in the array
+    """
+    array = array.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        array ^= array >> shift
+    return array & 1
+
+
+def get_pauli_masks(string_pauli, indices=None):
+    """
+    Args:
+        string_pauli: the term of a QubitOperator like ((0,'X'),(2,'Y'))
+        indices: (optional) the qubit index in the register of each qubit in string_pauli
+    Returns:
+        x_mask, z_mask, n_y: The Pauli word is i^{n_y} X^{x_mask} Z^{z_mask}
+    """
+    x_mask = 0
+    z_mask = 0
+    n_y = 0
+    for qubit, pauli_char in string_pauli:
+        if indices is not None:
+            qubit = indices[qubit]
+        bit = 1 << qubit
+        if pauli_char == 'X':
+            x_mask |= bit
+        elif pauli_char == 'Y':
+            x_mask |= bit
+            z_mask |= bit
+            n_y += 1
+        else:
+            z_mask |= bit
+    return x_mask, z_mask, n_y
+
+
+@lru_cache(maxsize=4096)
+def get_pauliword_masks(indices, pauliword):
+    """
+    The masks of the Pauli word used by Operations.generalized_rotation()
+    Args:
+        indices: tuple of the qubit index in the register of each qubit in the word
+        pauliword: tuple like (1,2,3) where 1:X,2:Y,3:Z and 0 for identity
+    Returns:
+        x_mask, z_mask, n_y
+    """
+    x_mask = 0
+    z_mask = 0
+    n_y = 0
+    for i in range(len(pauliword)):
+        bit = 1 << indices[i]
+        if pauliword[i] == 1:
+            x_mask |= bit
+        elif pauliword[i] == 2:
+            x_mask |= bit
+            z_mask |= bit
+            n_y += 1
+        elif pauliword[i] == 3:
+            z_mask |= bit
+    return x_mask, z_mask, n_y
+
+
+@lru_cache(maxsize=4096)
+def get_pauli_rotation_kernel(n_qubit, x_mask, z_mask, n_y):
+    """
+    Precompute what apply_pauli_rotation() needs for a Pauli word.
+    The amplitudes are viewed as a tensor of shape (2,)*n_qubit where the axis n_qubit-1-i is the i-th qubit.
+    Returns:
+        flip_axes: the axes flipped by the X part of the word
+        phase: a tensor broadcastable to the amplitude tensor, i^{n_y}(-1)^{|c&z_mask|}, which has length 2
+        only on the axes of the Z part so that its size is 2^{weight of Z part}
+    """
+    flip_axes = tuple(n_qubit - 1 - i for i in range(n_qubit) if (x_mask >> i) & 1)
+    phase = np.full((1,) * n_qubit, 1j ** n_y, dtype=complex)
+    for i in range(n_qubit):
+        if (z_mask >> i) & 1:
+            shape = [1] * n_qubit
+            shape[n_qubit - 1 - i] = 2
+            phase = phase * np.array([1, -1]).reshape(shape)
+    phase.setflags(write=False)
+    return flip_axes, phase
+
+
+def apply_pauli_by_masks(amplitudes, x_mask, z_mask, n_y):
+    """
+    Return P|psi> without changing the amplitudes of |psi>
+    The amplitudes can also be a (n_batch x 2^n_qubit) array
+    (P|psi>)[c] = i^{n_y} (-1)^{|(c^x_mask)&z_mask|} psi[c^x_mask]
+    """
+    source = get_basis_indices(amplitudes.shape[-1]) ^ x_mask
+    res = amplitudes[..., source]
+    if z_mask != 0:
+        res[..., parity(source & z_mask) == 1] *= -1
+    if n_y % 4 != 0:
+        res *= 1j ** n_y
+    return res
+
+
+def iter_grouped_diagonals(n_dim, x_masks, z_masks, phased_coeffs):
+    """
+    Group the terms coeff * X^x Z^z by x and yield (x_mask, diagonal), where diagonal is the diagonal
+    of the sum of coeff * Z^z in the group. Only one diagonal is held at a time.
+    The matrix element of the group is <c|...|c^x_mask> = diagonal[c^x_mask].
+    """
+    basis = get_basis_indices(n_dim)
+    x_masks = np.asarray(x_masks, dtype=np.int64)
+    for x_mask in np.unique(x_masks).tolist():
+        diagonal = np.zeros(n_dim, dtype=complex)
+        for k in np.nonzero(x_masks == x_mask)[0].tolist():
+            z_mask = int(z_masks[k])
+            if z_mask == 0:
+                diagonal += phased_coeffs[k]
+            else:
+                diagonal += phased_coeffs[k] * (1 - 2 * parity(basis & z_mask))
+        yield x_mask, diagonal
+
+
+def get_diagonal_by_z_masks(n_qubit, z_masks, coeffs):
+    """
+    Return the diagonal of sum_k coeffs[k] Z^{z_masks[k]}, i.e. diagonal[c] = sum_k coeffs[k] (-1)^{|c&z_masks[k]|}.
+    The coefficients are put at the indices z_masks and transformed by the fast Walsh-Hadamard transform,
+    which takes O(n_qubit*2^n_qubit) time however many terms there are.
+    """
+    coeffs = np.asarray(coeffs)
+    diagonal = np.zeros(1 << n_qubit, dtype=np.result_type(coeffs.dtype, float))
+    np.add.at(diagonal, np.asarray(z_masks, dtype=np.int64), coeffs)
+    for i in range(n_qubit):
+        pairs = diagonal.reshape(-1, 2, 1 << i)
+        low = pairs[:, 0, :].copy()
+        pairs[:, 0, :] += pairs[:, 1, :]
+        pairs[:, 1, :] *= -1
+        pairs[:, 1, :] += low
+    return diagonal
+
+
+def get_csr_matrix_by_masks(n_dim, x_masks, z_masks, phased_coeffs):
+    """
+    Return the CSR matrix of sum_k phased_coeffs[k] X^{x_masks[k]} Z^{z_masks[k]}.
+    The arrays of the CSR matrix are filled directly: each distinct x_mask gives one nonzero per row.
+    """
+    n_group = len(np.unique(np.asarray(x_masks, dtype=np.int64)))
+    if n_group == 0:
+        return csr_matrix((n_dim, n_dim), dtype=complex)
+    index_dtype = np.int32 if n_group * n_dim < 2 ** 31 else np.int64
+    basis = get_basis_indices(n_dim)
+    data = np.empty((n_dim, n_group), dtype=complex)
+    indices = np.empty((n_dim, n_group), dtype=index_dtype)
+    for i_group, (x_mask, diagonal) in enumerate(iter_grouped_diagonals(n_dim, x_masks, z_masks, phased_coeffs)):
+        source = basis ^ x_mask
+        data[:, i_group] = diagonal[source]
+        indices[:, i_group] = source
+    indptr = np.arange(0, n_dim * n_group + 1, n_group, dtype=index_dtype)
+    matrix = csr_matrix((data.ravel(), indices.ravel(), indptr), shape=(n_dim, n_dim))
+    matrix.sort_indices()
+    return matrix
+
+
+def get_sparse_operator_by_masks(n_qubit, string_pauli_coeff_list, indices=None):
+    """
+    Return the CSR matrix of sum_i coeff_i P_i
+    Args:
+        string_pauli_coeff_list: iterable of (string_pauli, coeff)
+    """
+    x_masks, z_masks, phased_coeffs = [], [], []
+    for string_pauli, coeff in string_pauli_coeff_list:
+        x_mask, z_mask, n_y = get_pauli_masks(string_pauli, indices)
+        x_masks.append(x_mask)
+        z_masks.append(z_mask)
+        phased_coeffs.append(coeff * (1j ** n_y))
+    return get_csr_matrix_by_masks(1 << n_qubit, x_masks, z_masks, phased_coeffs)
+
+
+class StateVector:
+    """
+    The wavefunction of NumPyBackend.
+    The amplitudes are stored in a complex array of length 2^n_qubit, where the i-th qubit
+    corresponds to the i-th bit of the index of the array (little-endian), the same as ProjectQ.
+    Indexing the StateVector gives NativeQubit handles so that it can be used like a ProjectQ qureg.
+
+    When n_batch is set, the amplitudes are a (n_batch x 2^n_qubit) array holding n_batch wavefunctions
+    which are evolved together. In this case, the angles passed to the kernels can be either numbers
+    or arrays of length n_batch (one angle for each wavefunction).
+    """
+
+    IS_GATE_PROGRAM_AVAILABLE = True
+    IS_STATE_LOADING_AVAILABLE = True
+
+    def __init__(self, n_qubit, amplitudes=None, n_batch=None):
+        self.n_qubit = n_qubit
+        self.n_batch = n_batch
+        self._lead_shape = () if n_batch is None else (n_batch,)
+        if amplitudes is None:
+            amplitudes = np.zeros(self._lead_shape + (1 << n_qubit,), dtype=complex)
+            amplitudes[..., 0] = 1.0
+        self.amplitudes = amplitudes
+        self.qubits = [NativeQubit(self, i) for i in range(n_qubit)]
+
+    def __len__(self):
+        return self.n_qubit
+
+    def __getitem__(self, key):
+        return self.qubits[key]
+
+    def __iter__(self):
+        return iter(self.qubits)
+
+    def _split(self, index):
+        return self.amplitudes.reshape(self._lead_shape + (-1, 2, 1 << index))
+
+    def _split_pair(self, index1, index2):
+        high, low = max(index1, index2), min(index1, index2)
+        return self.amplitudes.reshape(self._lead_shape + (-1, 2, 1 << (high - low - 1), 2, 1 << low))
+
+    def _broadcast(self, value, n_axis=2):
+        """
+        Make a number or an array of length n_batch broadcastable to the arrays with n_axis axes after the batch axis
+        """
+        if self.n_batch is None:
+            return value
+        return np.reshape(value, (-1,) + (1,) * n_axis)
+
+    def apply_matrix(self, index, mat):
+        view = self._split(index)
+        amp0 = view[..., 0, :].copy()
+        amp1 = view[..., 1, :]
+        view[..., 0, :] *= mat[0][0]
+        view[..., 0, :] += mat[0][1] * amp1
+        amp1 *= mat[1][1]
+        amp1 += mat[1][0] * amp0
+
+    def apply_single_qubit_matrix(self, index, matrix):
+        """
+        Args:
+            matrix: a 2x2 array, or a (n_batch x 2 x 2) array holding a matrix for each wavefunction
+        """
+        if np.ndim(matrix) == 3:
+            matrix = [[self._broadcast(matrix[:, i, j]) for j in range(2)] for i in range(2)]
+        self.apply_matrix(index, matrix)
+
+    def apply_x(self, index):
+        view = self._split(index)
+        amp0 = view[..., 0, :].copy()
+        view[..., 0, :] = view[..., 1, :]
+        view[..., 1, :] = amp0
+
+    def apply_y(self, index):
+        view = self._split(index)
+        amp0 = view[..., 0, :].copy()
+        view[..., 0, :] = -1j * view[..., 1, :]
+        view[..., 1, :] = 1j * amp0
+
+    def apply_z(self, index):
+        self._split(index)[..., 1, :] *= -1
+
+    def apply_h(self, index):
+        view = self._split(index)
+        amp0 = view[..., 0, :].copy()
+        view[..., 0, :] += view[..., 1, :]
+        view[..., 0, :] *= _SQRT_HALF
+        view[..., 1, :] -= amp0
+        view[..., 1, :] *= -_SQRT_HALF
+
+    def apply_rx(self, index, angle):
+        c, s = self._broadcast(np.cos(angle / 2)), self._broadcast(np.sin(angle / 2))
+        self.apply_matrix(index, ((c, -1j * s), (-1j * s, c)))
+
+    def apply_ry(self, index, angle):
+        c, s = self._broadcast(np.cos(angle / 2)), self._broadcast(np.sin(angle / 2))
+        self.apply_matrix(index, ((c, -s), (s, c)))
+
+    def apply_rz(self, index, angle):
+        view = self._split(index)
+        view[..., 0, :] *= self._broadcast(np.exp(-0.5j * angle))
+        view[..., 1, :] *= self._broadcast(np.exp(0.5j * angle))
+
+    def apply_global_phase(self, angle):
+        self.amplitudes *= self._broadcast(np.exp(1j * angle), n_axis=1)
+
+    def apply_cnot(self, control, target):
+        view = self._split_pair(control, target)
+        if control > target:
+            target0, target1 = view[..., 1, :, 0, :], view[..., 1, :, 1, :]
+        else:
+            target0, target1 = view[..., 0, :, 1, :], view[..., 1, :, 1, :]
+        amp0 = target0.copy()
+        target0[...] = target1
+        target1[...] = amp0
+
+    def apply_cz(self, index1, index2):
+        self._split_pair(index1, index2)[..., 1, :, 1, :] *= -1
+
+    def apply_pauli_rotation(self, x_mask, z_mask, n_y, evolution_time):
+        """
+        Apply e^{-iPt}|psi> = cos(t)|psi> - i sin(t)P|psi> in one pass over the amplitudes,
+        where P = i^{n_y} X^{x_mask} Z^{z_mask} and t = evolution_time.
+        The result is the same as the gates applied by Operations.generalized_rotation()
+        """
+        flip_axes, phase = get_pauli_rotation_kernel(self.n_qubit, x_mask, z_mask, n_y)
+        tensor = self.amplitudes.reshape(self._lead_shape + (2,) * self.n_qubit)
+        pauli_applied = phase * tensor
+        if len(flip_axes) != 0:
+            n_lead = len(self._lead_shape)
+            pauli_applied = np.flip(pauli_applied, axis=tuple(axis + n_lead for axis in flip_axes))
+        pauli_applied *= self._broadcast(-1j * np.sin(evolution_time), n_axis=self.n_qubit)
+        pauli_applied += self._broadcast(np.cos(evolution_time), n_axis=self.n_qubit) * tensor
+        self.amplitudes = pauli_applied.reshape(self._lead_shape + (-1,))
+
+    def apply_time_evolution(self, string_pauli_coeff_list, time, indices=None):
+        """
+        Apply e^{-iHt} where H = sum_i coeff_i P_i, the same convention as projectq.ops.TimeEvolution
+        """
+        operator = get_sparse_operator_by_masks(self.n_qubit, string_pauli_coeff_list, indices)
+        if self.n_batch is None:
+            self.amplitudes = expm_multiply(-1j * time * operator, self.amplitudes)
+        elif np.ndim(time) == 0:
+            self.amplitudes = expm_multiply(-1j * time * operator, self.amplitudes.T).T
+        else:
+            for i in range(self.n_batch):
+                self.amplitudes[i] = expm_multiply(-1j * time[i] * operator, self.amplitudes[i])
+
+    def is_zero_state(self):
+        """
+        Return True if all the wavefunctions are |0...0>
+        """
+        if not np.all(self.amplitudes[..., 0] == 1.0):
+            return False
+        return np.count_nonzero(self.amplitudes) == (1 if self.n_batch is None else self.n_batch)
+
+    def load_amplitudes(self, amplitudes):
+        """
+        Overwrite the wavefunctions by a copy of the amplitudes of length 2^n_qubit
+        """
+        self.amplitudes[...] = amplitudes
+
+    def apply_gate_program(self, program, parameter):
+        """
+        Execute a GateProgram (see BlockCircuit.compile()) by its fused instructions (see GateProgram.get_fused_plan()).
+        The angles and the fused matrices of all the gates are computed in vectorized passes
+        and the kernels are looked up by the op codes.
+        """
+        values = program.get_fused_values(program.get_angles(parameter))
+        kernels = self.PROGRAM_KERNELS
+        operator_list = program.operator_list
+        for (op_code, args), value in zip(program.get_fused_plan().instruction_list, values):
+            kernels[op_code](self, args, value, operator_list)
+
+    # The kernels indexed by the op codes of GateProgram, called as kernel(register, arguments, angle, operator_list).
+    # They only call the methods of the register, so the other registers with the same methods share the table
+    PROGRAM_KERNELS = (
+        lambda register, args, angle, operator_list: register.apply_x(args[0]),
+        lambda register, args, angle, operator_list: register.apply_y(args[0]),
+        lambda register, args, angle, operator_list: register.apply_z(args[0]),
+        lambda register, args, angle, operator_list: register.apply_h(args[0]),
+        lambda register, args, angle, operator_list: register.apply_rx(args[0], angle),
+        lambda register, args, angle, operator_list: register.apply_ry(args[0], angle),
+        lambda register, args, angle, operator_list: register.apply_rz(args[0], angle),
+        lambda register, args, angle, operator_list: register.apply_cnot(args[0], args[1]),
+        lambda register, args, angle, operator_list: register.apply_cz(args[0], args[1]),
+        lambda register, args, angle, operator_list: register.apply_global_phase(angle),
+        lambda register, args, angle, operator_list: register.apply_pauli_rotation(args[0], args[1], args[2], angle),
+        lambda register, args, angle, operator_list: register.apply_time_evolution(
+            operator_list[args[0]].terms.items(), angle),
+        lambda register, args, matrix, operator_list: register.apply_single_qubit_matrix(args[0], matrix),
+    )
+
+    def get_pauli_expectation(self, string_pauli, indices=None):
+        x_mask, z_mask, n_y = get_pauli_masks(string_pauli, indices)
+        pauli_applied = apply_pauli_by_masks(self.amplitudes, x_mask, z_mask, n_y)
+        if self.n_batch is None:
+            return np.vdot(self.amplitudes, pauli_applied)
+        return np.einsum("bi,bi->b", np.conjugate(self.amplitudes), pauli_applied)
+
+
+_SQRT_HALF = np.sqrt(0.5)
+
+
+class NumPyBackend(Backend):
+    """
+    Backend of the in-process NumPy statevector simulator. See StateVector.
+    """
+    IS_BATCH_AVAILABLE = True
+
+    def allocate_wavefunction(self, n_qubit):
+        return StateVector(n_qubit)
+
+    def allocate_batch_wavefunction(self, n_qubit, n_batch):
+        return StateVector(n_qubit, n_batch=n_batch)
+
+    def get_expectation_value(self, operator, wavefunction):
+        from ..Utilities.PauliSum import PauliSum
+        from ..Utilities.OperatorCache import get_operator_diagonal
+        register, indices = get_register_and_indices(wavefunction)
+        if isinstance(operator, PauliSum):
+            if isinstance(wavefunction, StateVector):
+                if operator.is_diagonal():
+                    diagonal, _other_part = get_operator_diagonal(register.n_qubit, operator)
+                    expectation = np.abs(register.amplitudes) ** 2 @ diagonal
+                    return expectation if register.n_batch is not None else float(expectation)
+                return operator.get_expectation(register.amplitudes)
+            operator = operator.to_qubit_operator()
+        expectation = 0.0
+        if isinstance(wavefunction, StateVector):
+            # <psi|Z part|psi> = |psi|^2 . (the energies of the basis states), which are computed once per operator
+            diagonal, operator = get_operator_diagonal(register.n_qubit, operator)
+            if diagonal is not None:
+                expectation = np.abs(register.amplitudes) ** 2 @ diagonal
+        for string_pauli, coeff in operator.terms.items():
+            if len(string_pauli) == 0:
+                expectation = expectation + coeff
+                continue
+            expectation = expectation + coeff * register.get_pauli_expectation(string_pauli, indices)
+        if register.n_batch is not None:
+            return np.real(expectation) * np.ones(register.n_batch)
+        return float(np.real(expectation))
+
+    def get_amplitude(self, bit_string, wavefunction):
+        register, indices = get_register_and_indices(wavefunction)
+        number = 0
+        for i in range(len(bit_string)):
+            if bit_string[i]:
+                number |= 1 << indices[i]
+        if register.n_batch is not None:
+            return register.amplitudes[:, number].copy()
+        return complex(register.amplitudes[number])
+
+    def get_statevector(self, wavefunction):
+        """
+        Return the amplitude array of the wavefunction without copying (see Backend.get_statevector)
+        """
+        if isinstance(wavefunction, StateVector):
+            return wavefunction.amplitudes
+        register, indices = get_register_and_indices(wavefunction)
+        if len(indices) != register.n_qubit:
+            raise Exception("The statevector can only be exported for all the qubits in the register!")
+        return reorder_statevector(register.amplitudes, indices)
@@ -0,0 +1,61 @@
+from projectq.ops import All, Measure
+from projectq.backends import Simulator as projectq_simulator
+from projectq.cengines import (MainEngine,
+                               AutoReplacer,
+                               LocalOptimizer,
+                               TagRemover,
+                               DecompositionRuleSet)
+import projectq.setups.decompositions
+import numpy as np
+from ._backend import Backend, reorder_statevector
+
+
+def get_projectq_engine(gate_fusion=True):
+    # Create a main compiler engine with a simulator backend:
+    backend = projectq_simulator(gate_fusion=gate_fusion)
+    cache_depth = 10
+    rule_set = DecompositionRuleSet(modules=[projectq.setups.decompositions])
+    engines = [TagRemover(),
+               LocalOptimizer(cache_depth),
+               AutoReplacer(rule_set)]
+    compiler_engine = MainEngine(backend=backend, engine_list=engines)
+    return compiler_engine
+
+
+class ProjectQBackend(Backend):
+    """
+    Backend based on the simulator of ProjectQ.
+    A new MainEngine is created for each wavefunction allocated.
+    """
+
+    def __init__(self, gate_fusion=True):
+        self.gate_fusion = gate_fusion
+
+    def allocate_wavefunction(self, n_qubit):
+        compiler_engine = get_projectq_engine(gate_fusion=self.gate_fusion)
+        return compiler_engine.allocate_qureg(n_qubit)
+
+    def flush(self, wavefunction):
+        wavefunction[0].engine.flush()
+
+    def get_expectation_value(self, operator, wavefunction):
+        from ..Utilities.PauliSum import PauliSum
+        if isinstance(operator, PauliSum):
+            operator = operator.to_qubit_operator()
+        return wavefunction[0].engine.backend.get_expectation_value(operator, wavefunction)
+
+    def get_amplitude(self, bit_string, wavefunction):
+        return wavefunction[0].engine.backend.get_amplitude(bit_string, wavefunction)
+
+    def get_statevector(self, wavefunction):
+        """
+        Export the statevector by the cheat() of the simulator of ProjectQ (see Backend.get_statevector)
+        """
+        mapping, amplitudes = wavefunction[0].engine.backend.cheat()
+        locations = [mapping[qubit.id] for qubit in wavefunction]
+        return reorder_statevector(np.array(amplitudes, dtype=complex), locations)
+
+    def deallocate(self, wavefunction):
+        # For deallocate qubit
+        All(Measure) | wavefunction
+        wavefunction[0].engine.flush()
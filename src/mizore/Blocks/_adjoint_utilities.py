@@ -0,0 +1,240 @@
+import numpy as np
+from ._block_circuit import BlockCircuit
+from ._utilities import get_circuit_prefix_state, get_circuit_complete_amplitudes
+from ..Utilities.CircuitEvaluation import get_ansatz_complete_amplitudes, get_backend
+from ..Backends._numpy_backend import StateVector, apply_pauli_by_masks, get_sparse_operator_by_masks
+from ..Backends._gate_program import OP_RX, OP_RY, OP_RZ, OP_GLOBAL_PHASE, OP_PAULI_ROTATION, OP_TIME_EVOLUTION, \
+    NO_PARAMETER
+from ..Utilities.PauliSum import PauliSum
+from ..Utilities.OperatorCache import get_cached_operator_matrix
+
+"""
+The derivatives of a circuit w.r.t. its active parameters without building shifted or derivative circuits.
+
+get_circuit_energy_gradient(): the adjoint (reverse-mode) gradient of the energy.
+One forward pass gives |psi> and <lambda| = <psi|H, then both are uncomputed gate by gate from the end
+while dE/dtheta = 2Re<lambda|dU/dtheta|psi> is collected for each parametrized gate.
+All the gradient costs O(n_gate*2^n_qubit) instead of the n_parameter+1 circuit evaluations of finite differences.
+
+get_circuit_derivative_states(): the statevectors |d_k psi> of all the parameters in one forward pass,
+which carries them as a batch (see StateVector) and starts the k-th one at the gates of the k-th parameter.
+"""
+
+# The step of the central differences for the blocks that can not be compiled
+BLOCK_DERIVATIVE_STEP = 1e-5
+
+
+def is_adjoint_gradient_available(circuit: BlockCircuit):
+    """
+    Return whether get_circuit_energy_gradient() can be used for the circuit, i.e. all the blocks from
+    the first active block to the end can be uncomputed by their apply_inverse_gate()
+    and the backend can export the statevector
+    """
+    if not get_backend().IS_STATEVECTOR_AVAILABLE:
+        return False
+    if circuit.qubit_index_mapping is not None or len(circuit.active_position_list) == 0:
+        return False
+    for block in circuit.block_list[min(circuit.active_position_list):]:
+        if not block.IS_INVERSE_DEFINED:
+            return False
+    return True
+
+
+def get_circuit_energy_gradient(circuit: BlockCircuit, hamiltonian, parameter=None):
+    """
+    Return the gradient of the energy <H> of the circuit w.r.t. the parameters on the active positions,
+    in the same order as the parameters of circuit.get_ansatz_on_active_position()
+    Args:
+        hamiltonian: a QubitOperator or a PauliSum
+        parameter: (optional) the adjustments of the active parameters where the gradient is taken. Default: zeros
+    """
+    return get_circuit_energy_and_gradient(circuit, hamiltonian, parameter)[1]
+
+
+def get_circuit_energy_and_gradient(circuit: BlockCircuit, hamiltonian, parameter=None):
+    """
+    Return (energy, gradient). The energy comes for free from the forward pass, see get_circuit_energy_gradient()
+    """
+    n_qubit = circuit.n_qubit
+    position_list = circuit.active_position_list
+    start_position = min(position_list)
+    if parameter is None:
+        parameter = np.zeros(circuit.count_n_parameter_on_active_position())
+    pcircuit = circuit.get_ansatz_on_active_position()
+    amplitudes = np.array(get_ansatz_complete_amplitudes(n_qubit, pcircuit.ansatz, parameter), dtype=complex)
+    if isinstance(hamiltonian, PauliSum):
+        hamiltonian_applied = hamiltonian.dot(amplitudes)
+    else:
+        hamiltonian_applied = get_cached_operator_matrix(n_qubit, hamiltonian).dot(amplitudes)
+    energy = float(np.real(np.vdot(amplitudes, hamiltonian_applied)))
+    psi = StateVector(n_qubit, amplitudes)
+    lam = StateVector(n_qubit, np.array(hamiltonian_applied, dtype=complex))
+    program = circuit.compile(position_list, start_position=start_position)
+    if program is not None:
+        return energy, get_program_gradient(program, psi, lam, parameter)
+    return energy, get_block_gradient(circuit, position_list, start_position, psi, lam, parameter)
+
+
+def apply_generator(op_code, args, amplitudes, operator_list):
+    """
+    Return G|psi> for the gate e^{-i G angle} of the op code (see Backends.GateProgram)
+    """
+    if op_code == OP_RX:
+        return 0.5 * apply_pauli_by_masks(amplitudes, 1 << args[0], 0, 0)
+    if op_code == OP_RY:
+        return 0.5 * apply_pauli_by_masks(amplitudes, 1 << args[0], 1 << args[0], 1)
+    if op_code == OP_RZ:
+        return 0.5 * apply_pauli_by_masks(amplitudes, 0, 1 << args[0], 0)
+    if op_code == OP_GLOBAL_PHASE:
+        return -amplitudes
+    if op_code == OP_PAULI_ROTATION:
+        return apply_pauli_by_masks(amplitudes, args[0], args[1], args[2])
+    if op_code == OP_TIME_EVOLUTION:
+        n_qubit = len(amplitudes).bit_length() - 1
+        return get_sparse_operator_by_masks(n_qubit, operator_list[args[0]].terms.items()).dot(amplitudes)
+    raise Exception("The gate has no parameter to differentiate!")
+
+
+def get_program_gradient(program, psi: StateVector, lam: StateVector, parameter):
+    """
+    The adjoint sweep over a GateProgram. psi and lam are the states after the program and are overwritten
+    """
+    gradient = np.zeros(program.n_parameter)
+    angles = program.get_angles(parameter)
+    kernels = psi.PROGRAM_KERNELS
+    for k in reversed(range(len(program.instruction_list))):
+        op_code, args = program.instruction_list[k]
+        slot = program.param_slots[k]
+        if slot != NO_PARAMETER and program.param_coeffs[k] != 0:
+            # d/dangle e^{-iG angle}|psi_before> = -iG|psi_after>
+            generator_applied = apply_generator(op_code, args, psi.amplitudes, program.operator_list)
+            gradient[slot] += 2 * program.param_coeffs[k] * np.imag(np.vdot(lam.amplitudes, generator_applied))
+        # The gates without parameter are their own inverse, the others are inverted by negating the angle
+        kernels[op_code](psi, args, -angles[k], program.operator_list)
+        kernels[op_code](lam, args, -angles[k], program.operator_list)
+    return gradient
+
+
+def apply_block_inverse(block, parameter, wavefunction):
+    if block.is_inversed:
+        block.apply_forward_gate(parameter, wavefunction)
+    else:
+        block.apply_inverse_gate(parameter, wavefunction)
+
+
+def get_block_gradient(circuit: BlockCircuit, position_list, start_position, psi: StateVector, lam: StateVector,
+                       parameter):
+    """
+    The adjoint sweep over the blocks, uncomputed by their apply_inverse_gate().
+    The derivatives of a block are taken by central differences of the block alone on the state before it
+    """
+    # The parameters of the active blocks are in the order of the positions
+    block_parameter_dict = {}
+    para_index = 0
+    for position in range(len(circuit.block_list)):
+        if position in position_list:
+            n_parameter = circuit.block_list[position].n_parameter
+            block_parameter_dict[position] = np.array(parameter[para_index:para_index + n_parameter], dtype=float)
+            para_index += n_parameter
+    gradient_list = []
+    for position in reversed(range(start_position, len(circuit.block_list))):
+        block = circuit.block_list[position]
+        block_parameter = block_parameter_dict.get(position, np.zeros(block.n_parameter))
+        apply_block_inverse(block, block_parameter, psi)
+        if position in position_list:
+            block_gradient = np.zeros(block.n_parameter)
+            for i in range(block.n_parameter):
+                shift = np.zeros(block.n_parameter)
+                shift[i] = BLOCK_DERIVATIVE_STEP
+                forward = StateVector(circuit.n_qubit, psi.amplitudes.copy())
+                block.apply(block_parameter + shift, forward)
+                backward = StateVector(circuit.n_qubit, psi.amplitudes.copy())
+                block.apply(block_parameter - shift, backward)
+                derivative = (forward.amplitudes - backward.amplitudes) / (2 * BLOCK_DERIVATIVE_STEP)
+                block_gradient[i] = 2 * np.real(np.vdot(lam.amplitudes, derivative))
+            gradient_list.append(block_gradient)
+        apply_block_inverse(block, block_parameter, lam)
+    gradient_list.reverse()
+    return np.concatenate(gradient_list) if len(gradient_list) != 0 else np.zeros(0)
+
+
+def is_derivative_state_available(circuit: BlockCircuit):
+    return circuit.qubit_index_mapping is None
+
+
+def get_active_parameter_order(circuit: BlockCircuit):
+    """
+    Return the indices of the parameters, which are ordered by the positions of the blocks in the ansatz,
+    in the order of circuit.active_position_list (the order used by adjust_parameter_on_active_position())
+    """
+    offset_dict = {}
+    para_index = 0
+    for position in sorted(circuit.active_position_list):
+        offset_dict[position] = para_index
+        para_index += circuit.block_list[position].n_parameter
+    order = []
+    for position in circuit.active_position_list:
+        order.extend(range(offset_dict[position], offset_dict[position] + circuit.block_list[position].n_parameter))
+    return order
+
+
+def get_circuit_derivative_states(circuit: BlockCircuit):
+    """
+    Return (amplitudes, derivative_states), where derivative_states[k] is the statevector d|psi>/d theta_k
+    of the k-th parameter on the active positions, in the order of circuit.active_position_list.
+    The circuit should not have a qubit_index_mapping
+    """
+    n_qubit = circuit.n_qubit
+    position_list = circuit.active_position_list
+    n_parameter = circuit.count_n_parameter_on_active_position()
+    if n_parameter == 0:
+        amplitudes = np.array(get_circuit_complete_amplitudes(circuit), dtype=complex)
+        return amplitudes, np.zeros((0, len(amplitudes)), dtype=complex)
+    start_position = min(position_list)
+    amplitudes, _n_prefix_block = get_circuit_prefix_state(circuit, start_position)
+    psi = StateVector(n_qubit, np.array(amplitudes, dtype=complex))
+    derivative = StateVector(n_qubit, np.zeros((n_parameter, 1 << n_qubit), dtype=complex), n_batch=n_parameter)
+    program = circuit.compile(position_list, start_position=start_position)
+    if program is not None:
+        sweep_program_derivative_states(program, psi, derivative)
+    else:
+        sweep_block_derivative_states(circuit, position_list, start_position, psi, derivative)
+    return psi.amplitudes, derivative.amplitudes[get_active_parameter_order(circuit)]
+
+
+def sweep_program_derivative_states(program, psi: StateVector, derivative: StateVector):
+    angles = program.get_angles(np.zeros(program.n_parameter))
+    kernels = psi.PROGRAM_KERNELS
+    for k in range(len(program.instruction_list)):
+        op_code, args = program.instruction_list[k]
+        kernels[op_code](psi, args, angles[k], program.operator_list)
+        kernels[op_code](derivative, args, angles[k], program.operator_list)
+        slot = program.param_slots[k]
+        if slot != NO_PARAMETER and program.param_coeffs[k] != 0:
+            # d/dangle e^{-iG angle}|psi_before> = -iG|psi_after>
+            generator_applied = apply_generator(op_code, args, psi.amplitudes, program.operator_list)
+            derivative.amplitudes[slot] += (-1j * program.param_coeffs[k]) * generator_applied
+
+
+def sweep_block_derivative_states(circuit: BlockCircuit, position_list, start_position, psi: StateVector,
+                                  derivative: StateVector):
+    """
+    The derivatives of a block are taken by central differences of the block alone on the state before it
+    """
+    para_index = 0
+    for position in range(start_position, len(circuit.block_list)):
+        block = circuit.block_list[position]
+        zeros = np.zeros(block.n_parameter)
+        block.apply(zeros, derivative)
+        if position in position_list:
+            for i in range(block.n_parameter):
+                shift = np.zeros(block.n_parameter)
+                shift[i] = BLOCK_DERIVATIVE_STEP
+                forward = StateVector(circuit.n_qubit, psi.amplitudes.copy())
+                block.apply(shift, forward)
+                backward = StateVector(circuit.n_qubit, psi.amplitudes.copy())
+                block.apply(-shift, backward)
+                derivative.amplitudes[para_index] = (forward.amplitudes - backward.amplitudes) / (
+                        2 * BLOCK_DERIVATIVE_STEP)
+                para_index += 1
+        block.apply(zeros, psi)
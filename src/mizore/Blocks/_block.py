@@ -1,3 +1,41 @@
+# The number of changes of the blocks and the block lists of BlockCircuit made so far in this process.
+# The caches depending on the blocks (see BlockCircuit.compile()) are checked again only when it has increased
+_n_block_change = 0
+
+
+def mark_block_changed():
+    global _n_block_change
+    _n_block_change += 1
+
+
+def get_n_block_change():
+    return _n_block_change
+
+
+class VersionedList(list):
+    """
+    A list whose version increases when it is changed in place, used for Block.parameter and BlockCircuit.block_list
+    """
+    version = 0
+
+
+def _make_changing_method(name):
+    list_method = getattr(list, name)
+
+    def changing_method(self, *args):
+        result = list_method(self, *args)
+        self.version += 1
+        mark_block_changed()
+        return result
+
+    return changing_method
+
+
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__", "append", "extend", "insert", "pop", "remove",
+              "clear", "sort", "reverse"):
+    setattr(VersionedList, _name, _make_changing_method(_name))
+
+
 class Block():
     """
     Base class of all the blocks
@@ -11,6 +49,8 @@ class Block():
         parameter: The list of parameters of the parametric block
         is_inversed: If true, the function apply() will apply apply_inverse_gate() when called
         IS_INVERSE_DEFINED: Set to be true when apply_inverse_gate() is implemented
+    Changing parameter (in place or by assignment) or is_inversed increases the version of the block
+    (see get_version()), by which BlockCircuit finds its cached programs outdated.
     """
 
     IS_INVERSE_DEFINED = False
@@ -27,7 +67,42 @@ class Block():
         else:
             self.active_qubits = set()
         return
-    
+
+    @property
+    def parameter(self):
+        return self._parameter
+
+    @parameter.setter
+    def parameter(self, parameter):
+        self._parameter = VersionedList(parameter)
+        self._version = getattr(self, "_version", 0) + 1
+        mark_block_changed()
+
+    @property
+    def is_inversed(self):
+        return self._is_inversed
+
+    @is_inversed.setter
+    def is_inversed(self, is_inversed):
+        self._is_inversed = is_inversed
+        self._version = getattr(self, "_version", 0) + 1
+        mark_block_changed()
+
+    def get_version(self):
+        """
+        Return the version of the block. The list of parameters is also versioned,
+        because it is shared by the shallow copies of the block
+        """
+        return self._version, self._parameter.version
+
+    def __setstate__(self, state):
+        # The blocks pickled before the parameters were versioned
+        if "parameter" in state:
+            state["_parameter"] = VersionedList(state.pop("parameter"))
+            state["_is_inversed"] = state.pop("is_inversed")
+            state["_version"] = 0
+        self.__dict__.update(state)
+
     def get_localized_operator(self,qsubset):
         return None
 
@@ -77,6 +152,12 @@ class Block():
         assert self.IS_DERIVATIVE_DEFINE
         return
 
+    def get_derivative_block_sign(self, para_position):
+        """
+        Return s, where the block of get_derivative_block() prepares s * d|psi>/d theta
+        """
+        return 1
+
     def __str__(self):
         return self.basic_info_string()
 
@@ -1,5 +1,6 @@
-from ._block import Block
+from ._block import Block, VersionedList, mark_block_changed, get_n_block_change
 from ._parametrized_circuit import ParametrizedCircuit
+from ..Backends._gate_program import trace_ansatz
 from copy import copy, deepcopy
 
 
@@ -22,14 +23,49 @@ class BlockCircuit:
     """
 
     def __init__(self, n_qubit, init_block=None):
-        self.block_list = []
+        self._block_list = VersionedList()
         self.n_qubit = n_qubit
         self.active_position_list = []
-        self.qubit_index_mapping = None
+        self._qubit_index_mapping = None
+        self._program_cache = {}
+        self._prefix_state = None
         self.add_block(init_block)
 
         return
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_program_cache"] = {}
+        state["_prefix_state"] = None
+        return state
+
+    def __setstate__(self, state):
+        # The circuits pickled before the block lists were versioned
+        if "block_list" in state:
+            state["_block_list"] = VersionedList(state.pop("block_list"))
+            state["_qubit_index_mapping"] = state.pop("qubit_index_mapping")
+        self.__dict__.update(state)
+        self._program_cache = {}
+        self._prefix_state = None
+
+    @property
+    def block_list(self):
+        return self._block_list
+
+    @block_list.setter
+    def block_list(self, block_list):
+        self._block_list = VersionedList(block_list)
+        mark_block_changed()
+
+    @property
+    def qubit_index_mapping(self):
+        return self._qubit_index_mapping
+
+    @qubit_index_mapping.setter
+    def qubit_index_mapping(self, qubit_index_mapping):
+        self._qubit_index_mapping = qubit_index_mapping
+        mark_block_changed()
+
     def add_block(self, block: Block):
         if block != None:
             self.block_list.append(copy(block))
@@ -39,6 +75,93 @@ class BlockCircuit:
         self.active_position_list.remove(len(self.block_list) - 1)
         self.block_list.remove(self.block_list[position])
 
+    def _get_block_versions(self, n_block=None):
+        """
+        Return the state of the first n_block blocks (all the blocks if None) as (the number of block changes
+        so far, n_block, the qubit index mapping, the blocks, their versions), see _is_up_to_date()
+        """
+        blocks = list(self.block_list[:n_block])
+        return [get_n_block_change(), n_block, self.qubit_index_mapping, blocks, [block.get_version() for block in blocks]]
+
+    def _is_up_to_date(self, block_versions):
+        """
+        Return whether the blocks are unchanged since _get_block_versions() returned block_versions.
+        If no block has changed in the process since then, only the change count is compared.
+        Otherwise the blocks are compared once and the change count in block_versions is renewed
+        """
+        n_block_change, n_block, qubit_index_mapping, blocks, versions = block_versions
+        if n_block_change == get_n_block_change():
+            return True
+        current_blocks = self.block_list[:n_block]
+        if qubit_index_mapping is not self.qubit_index_mapping or len(current_blocks) != len(blocks):
+            return False
+        for block, cached_block, version in zip(current_blocks, blocks, versions):
+            if block is not cached_block or block.get_version() != version:
+                return False
+        block_versions[0] = get_n_block_change()
+        return True
+
+    def compile(self, position_list=None, start_position=0):
+        """
+        Compile the circuit into a GateProgram, a flat array of op codes, qubit indices and parameter slots
+        with constant offsets (see Backends.GateProgram), which backends execute without walking the blocks.
+        The program is cached and rebuilt when the blocks, their parameters or the qubit index mapping change.
+        Args:
+            position_list: the blocks whose parameters are adjustable. Default: self.active_position_list
+            start_position: the blocks before it are not included in the program (see set_prefix_state())
+        Returns:
+            The GateProgram, or None if some block can not be traced
+            (its gates are not applied by Utilities.Operations or its angles are not affine in the parameters)
+        """
+        if position_list is None:
+            position_list = self.active_position_list
+        cache_key = (tuple(position_list), start_position)
+        if cache_key in self._program_cache:
+            block_versions, program = self._program_cache[cache_key]
+            if self._is_up_to_date(block_versions):
+                return program
+        block_versions = self._get_block_versions()
+        pcircuit = self._get_block_ansatz_by_position_list(position_list, start_position)
+        try:
+            program = trace_ansatz(pcircuit.ansatz, pcircuit.n_qubit, pcircuit.n_parameter)
+        except Exception:
+            program = None
+        self._program_cache[cache_key] = (block_versions, program)
+        return program
+
+    def set_prefix_state(self, amplitudes, n_prefix_block):
+        """
+        Set the statevector produced by the first n_prefix_block blocks (see get_circuit_prefix_state()).
+        When none of these blocks is adjustable, the ansatzes of the circuit start from it on native backends
+        instead of simulating these blocks again.
+        The prefix state is dropped when these blocks change and is not pickled or copied with the circuit.
+        """
+        if len(amplitudes) != 1 << self.n_qubit:
+            raise Exception("The prefix state does not match the number of qubits of the circuit!")
+        self._prefix_state = (amplitudes, n_prefix_block, self._get_block_versions(n_prefix_block))
+
+    def _get_prefix_state(self, position_list):
+        if self._prefix_state is None or self.qubit_index_mapping is not None:
+            return None
+        amplitudes, n_prefix_block, block_versions = self._prefix_state
+        if n_prefix_block > len(self.block_list) or not self._is_up_to_date(block_versions):
+            self._prefix_state = None
+            return None
+        for position in position_list:
+            if position < n_prefix_block:
+                return None
+        return amplitudes, n_prefix_block
+
+    def get_cached_amplitudes(self):
+        """
+        Return the statevector of the circuit if the prefix state (see set_prefix_state()) covers all the blocks,
+        otherwise None
+        """
+        prefix_state = self._get_prefix_state([])
+        if prefix_state is None or prefix_state[1] != len(self.block_list):
+            return None
+        return prefix_state[0]
+
     def count_n_parameter_by_position_list(self, position_list):
         n_parameter = 0
         for i in position_list:
@@ -62,21 +185,50 @@ class BlockCircuit:
         return self.get_parameter_on_position_list(self.active_position_list)
 
     def get_ansatz_by_position_list(self, position_list):
+        """
+        Return a ParametrizedCircuit with certain parameter adjustable.
+        The ansatz executes the compiled program of the circuit (see compile())
+        and starts from the prefix state if there is one (see set_prefix_state())
+        """
+        pcircuit = self._get_block_ansatz_by_position_list(position_list)
+        block_ansatz = pcircuit.ansatz
+
+        def ansatz(parameter, wavefunction):
+            prefix_state = self._get_prefix_state(position_list)
+            if prefix_state is not None and getattr(wavefunction, "IS_STATE_LOADING_AVAILABLE", False) \
+                    and wavefunction.is_zero_state():
+                amplitudes, n_prefix_block = prefix_state
+                program = self.compile(position_list, start_position=n_prefix_block)
+                if program is not None:
+                    wavefunction.load_amplitudes(amplitudes)
+                    program.apply(parameter, wavefunction)
+                    return
+            program = self.compile(position_list)
+            if program is None:
+                block_ansatz(parameter, wavefunction)
+            else:
+                program.apply(parameter, wavefunction)
+
+        pcircuit.ansatz = ansatz
+        return pcircuit
+
+    def _get_block_ansatz_by_position_list(self, position_list, start_position=0):
         if self.qubit_index_mapping == None:
-            return self._get_ansatz_by_position_list_0(position_list)
+            return self._get_ansatz_by_position_list_0(position_list, start_position)
         else:
             return self._get_ansatz_by_position_list_with_qubit_mapping(position_list, self.qubit_index_mapping)
 
-    def _get_ansatz_by_position_list_0(self, position_list):
+    def _get_ansatz_by_position_list_0(self, position_list, start_position=0):
         """
         Return a ParametrizedCircuit with certain parameter adjustable
         Args:
             position_list: contains the indices of the block_list where the block's parameter is adjustable
+            start_position: the blocks before it are skipped
         """
 
         def ansatz(parameter, wavefunction):
             para_index = 0
-            for i in range(len(self.block_list)):
+            for i in range(start_position, len(self.block_list)):
                 block: Block = self.block_list[i]
                 if i in position_list:
                     block.apply(
@@ -44,6 +44,10 @@ class RotationEntangler(Block):
         bc.add_block(GlobalPhaseBlock(init_angle=pi/2))
         return CompositiveBlock(bc)
 
+    def get_derivative_block_sign(self, para_position):
+        # i*P e^{-itP} is -d/dt e^{-itP}, and the inverse e^{itP} gets the opposite sign
+        return 1 if self.is_inversed else -1
+
     def get_gate_used(self):
         return {"CNOT": (len(self.qsubset) - 1) * 2,
                 "SingleRotation": count_single_gate_for_pauliword(self.pauliword) + 1}
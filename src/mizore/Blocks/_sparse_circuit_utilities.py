@@ -1,6 +1,7 @@
 from . import BlockCircuit
 from ..Utilities.CircuitEvaluation import evaluate_ansatz_0000_amplitudes
 from ._utilities import concatenate_circuit, get_inverse_circuit
+from ..Backends._factorized_backend import FactorizedBackend, get_factorized_overlap
 
 
 def get_inner_product_task_on_sparse_circuit(first_circuit: BlockCircuit, second_circuit: BlockCircuit):
@@ -9,6 +10,26 @@ def get_inner_product_task_on_sparse_circuit(first_circuit: BlockCircuit, second
     return get_0000_amplitude_on_sparse_circuit(circuit)
 
 
+def get_circuit_factorized_state(circuit: BlockCircuit):
+    """
+    Return the FactorizedState produced by the circuit, which keeps one statevector for each group of
+    entangled qubits (see Backends.FactorizedBackend)
+    """
+    backend = FactorizedBackend()
+    wavefunction = backend.allocate_wavefunction(circuit.n_qubit)
+    circuit.get_fixed_parameter_ansatz().ansatz([], wavefunction)
+    return wavefunction
+
+
+def get_matrix_term_on_sparse_circuit(first_circuit: BlockCircuit, second_circuit: BlockCircuit, hamiltonian=None):
+    """
+    Return <second|hamiltonian|first> (or <second|first> if hamiltonian is None) of the states of the circuits,
+    which are simulated by FactorizedBackend, so the dense statevectors are never built
+    """
+    return get_factorized_overlap(get_circuit_factorized_state(first_circuit),
+                                  get_circuit_factorized_state(second_circuit), hamiltonian)
+
+
 def get_0000_amplitude_on_sparse_circuit(circuit):
     disjoint_sets = circuit.get_disjoint_active_sets()
     localized_circuits = []
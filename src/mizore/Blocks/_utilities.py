@@ -1,5 +1,7 @@
 from ._block_circuit import BlockCircuit
+from ._block import Block
 from copy import copy
+import numpy as np
 from ..Utilities.CircuitEvaluation import evaluate_ansatz_0000_amplitudes
 from ..Utilities.CircuitEvaluation import get_ansatz_complete_amplitudes
 
@@ -37,6 +39,40 @@ def get_inverse_circuit(circuit: BlockCircuit):
 def get_inner_two_circuit_product(first_circuit: BlockCircuit, second_circuit: BlockCircuit):
     """
     Return <0...00|circuit(second)^ circuit(first)|0...00>
+
+    The statevectors cached by cache_circuit_amplitudes() are used when they are available.
+    Otherwise the blocks shared at the end of the two circuits cancel as U^U = I, and the state of the blocks
+    shared at the beginning is simulated once for both circuits.
+    """
+    first_amplitudes = first_circuit.get_cached_amplitudes()
+    second_amplitudes = second_circuit.get_cached_amplitudes()
+    if first_amplitudes is not None or second_amplitudes is not None:
+        if first_amplitudes is None:
+            first_amplitudes = get_circuit_complete_amplitudes(first_circuit)
+        if second_amplitudes is None:
+            second_amplitudes = get_circuit_complete_amplitudes(second_circuit)
+        return np.vdot(second_amplitudes, first_amplitudes)
+
+    if first_circuit.qubit_index_mapping is not None or second_circuit.qubit_index_mapping is not None:
+        return get_inner_two_circuit_product_by_inverse(first_circuit, second_circuit)
+
+    n_prefix, n_suffix = get_common_block_length(first_circuit, second_circuit)
+    n_first_block = len(first_circuit.block_list) - n_suffix
+    n_second_block = len(second_circuit.block_list) - n_suffix
+    if n_prefix == n_first_block and n_prefix == n_second_block:
+        return 1.0 + 0.0j
+    if n_prefix == 0:
+        return get_inner_two_circuit_product_by_inverse(get_sub_circuit(first_circuit, n_first_block),
+                                                        get_sub_circuit(second_circuit, n_second_block))
+    prefix_amplitudes, _n_prefix_block = get_circuit_prefix_state(first_circuit, n_prefix)
+    first_amplitudes = get_sub_circuit_amplitudes(first_circuit, n_first_block, prefix_amplitudes, n_prefix)
+    second_amplitudes = get_sub_circuit_amplitudes(second_circuit, n_second_block, prefix_amplitudes, n_prefix)
+    return np.vdot(second_amplitudes, first_amplitudes)
+
+
+def get_inner_two_circuit_product_by_inverse(first_circuit: BlockCircuit, second_circuit: BlockCircuit):
+    """
+    Return <0...00|circuit(second)^ circuit(first)|0...00> by simulating first_circuit + inverse of second_circuit
     """
 
     circuit = concatenate_circuit(
@@ -48,6 +84,88 @@ def get_inner_two_circuit_product(first_circuit: BlockCircuit, second_circuit: B
     return amp_0000
 
 
+def is_same_block(first_block: Block, second_block: Block):
+    """
+    Return whether the two blocks apply the same gates, i.e. they are of the same class with equal attributes
+    """
+    if first_block is second_block:
+        return True
+    if type(first_block) is not type(second_block) or first_block.__dict__.keys() != second_block.__dict__.keys():
+        return False
+    for key, value in first_block.__dict__.items():
+        if not is_same_attribute(value, second_block.__dict__[key]):
+            return False
+    return True
+
+
+def is_same_attribute(first_value, second_value):
+    if isinstance(first_value, Block) and isinstance(second_value, Block):
+        return is_same_block(first_value, second_value)
+    if hasattr(first_value, "terms") and hasattr(second_value, "terms"):
+        # QubitOperators are compared exactly rather than up to their tolerance
+        return first_value.terms == second_value.terms
+    if isinstance(first_value, np.ndarray) or isinstance(second_value, np.ndarray):
+        return np.shape(first_value) == np.shape(second_value) and np.array_equal(first_value, second_value)
+    if isinstance(first_value, (list, tuple)) and isinstance(second_value, (list, tuple)):
+        return len(first_value) == len(second_value) and all(
+            is_same_attribute(first, second) for first, second in zip(first_value, second_value))
+    try:
+        return bool(first_value == second_value)
+    except Exception:
+        return False
+
+
+def get_common_block_length(first_circuit: BlockCircuit, second_circuit: BlockCircuit):
+    """
+    Return (n_prefix, n_suffix), the numbers of the same blocks at the beginning and at the end of the two circuits.
+    They do not overlap, i.e. n_prefix + n_suffix is not larger than the number of blocks of either circuit
+    """
+    first_block_list, second_block_list = first_circuit.block_list, second_circuit.block_list
+    n_min_block = min(len(first_block_list), len(second_block_list))
+    n_prefix = 0
+    while n_prefix < n_min_block and is_same_block(first_block_list[n_prefix], second_block_list[n_prefix]):
+        n_prefix += 1
+    n_suffix = 0
+    while n_prefix + n_suffix < n_min_block and \
+            is_same_block(first_block_list[-1 - n_suffix], second_block_list[-1 - n_suffix]):
+        n_suffix += 1
+    return n_prefix, n_suffix
+
+
+def get_sub_circuit(circuit: BlockCircuit, n_block):
+    """
+    Return the circuit of the first n_block blocks of the circuit
+    """
+    sub_circuit = BlockCircuit(circuit.n_qubit)
+    for block in circuit.block_list[:n_block]:
+        sub_circuit.add_block(block)
+    return sub_circuit
+
+
+def get_sub_circuit_amplitudes(circuit: BlockCircuit, n_block, prefix_amplitudes, n_prefix_block):
+    """
+    Return the statevector of the first n_block blocks of the circuit,
+    starting from prefix_amplitudes, the statevector of its first n_prefix_block blocks
+    """
+    sub_circuit = get_sub_circuit(circuit, n_block)
+    sub_circuit.set_prefix_state(prefix_amplitudes, n_prefix_block)
+    return np.array(get_circuit_complete_amplitudes(sub_circuit))
+
+
+def cache_circuit_amplitudes(circuit: BlockCircuit):
+    """
+    Simulate the circuit and keep its statevector as its prefix state (see BlockCircuit.set_prefix_state()),
+    so get_inner_two_circuit_product() and the ansatzes of the circuit reuse it until its blocks change
+    Returns:
+        the statevector
+    """
+    if circuit.qubit_index_mapping is not None:
+        return get_circuit_complete_amplitudes(circuit)
+    amplitudes, n_block = get_circuit_prefix_state(circuit)
+    circuit.set_prefix_state(amplitudes, n_block)
+    return amplitudes
+
+
 def get_circuit_energy(circuit, hamiltonian):
     from ..ParameterOptimizer.ObjWrapper import evaluate_ansatz_expectation
     ansatz = circuit.get_fixed_parameter_ansatz().ansatz
@@ -61,11 +179,43 @@ def get_0000_amplitude_on_circuit(circuit):
 
 
 def get_circuit_complete_amplitudes(circuit):
+    """
+    Return the statevector (NumPy array) produced by the circuit.
+    See get_ansatz_complete_amplitudes() for the ordering of the qubits.
+    """
     pcircuit = circuit.get_fixed_parameter_ansatz()
     amps = get_ansatz_complete_amplitudes(pcircuit.n_qubit, pcircuit.ansatz)
     return amps
 
+
+def get_circuit_prefix_state(circuit, n_prefix_block=None):
+    """
+    Return (amplitudes, n_prefix_block), where amplitudes is a copy of the statevector produced by
+    the first n_prefix_block blocks of the circuit (default: all the blocks).
+    It can be passed to BlockCircuit.set_prefix_state() of the circuits starting with the same blocks.
+    """
+    import numpy as np
+    if n_prefix_block is None:
+        n_prefix_block = len(circuit.block_list)
+    prefix_circuit = BlockCircuit(circuit.n_qubit)
+    for block in circuit.block_list[:n_prefix_block]:
+        prefix_circuit.add_block(block)
+    return np.array(get_circuit_complete_amplitudes(prefix_circuit)), n_prefix_block
+
+
+def get_shared_prefix_state(circuit, n_prefix_block=None):
+    """
+    The same as get_circuit_prefix_state(), but return None if the backend can not export statevectors
+    (see Backend.IS_STATEVECTOR_AVAILABLE). The tasks then simulate all the blocks themselves
+    """
+    from ..Utilities.CircuitEvaluation import get_backend
+    if not get_backend().IS_STATEVECTOR_AVAILABLE:
+        return None
+    return get_circuit_prefix_state(circuit, n_prefix_block)
+
+
 def evaluate_off_diagonal_term_by_amps(amp1,amp2,ops_mat):
     import numpy as np
-    amp3=np.dot(ops_mat,amp1)
+    # ops_mat can be a matrix, a sparse matrix or a PauliSum
+    amp3=ops_mat.dot(amp1)
     return np.dot(np.conjugate(amp2),amp3)
\ No newline at end of file
@@ -23,7 +23,7 @@ class AnalyticalRTSConstructor(NoParameterConstructor):
         if trial_circuits == None:
             trial_circuits = self.trial_circuits
         
-        quality_list=calc_quality_of_many_circuits_parallel(self.task_manager,trial_circuits,self.cost.hamiltonian_mat,self.cost.hamiltonian_square)
+        quality_list=calc_quality_of_many_circuits_parallel(self.task_manager,trial_circuits,self.cost.hamiltonian_mat)
 
         trial_result_list=[]
         for i in range(len(trial_circuits)):
@@ -36,7 +36,7 @@ class AnalyticalRTSConstructor(NoParameterConstructor):
         return trial_result_list
     """
 
-def calc_quality_of_many_circuits_parallel(task_manager,trial_circuits,hamiltonian_mat,hamiltonian_square):
+def calc_quality_of_many_circuits_parallel(task_manager,trial_circuits,hamiltonian_mat):
     n_trial_circuit=len(trial_circuits)
 
     mat_C_task_id_list=[]
@@ -71,8 +71,9 @@ def calc_quality_of_many_circuits_parallel(task_manager,trial_circuits,hamiltoni
     for i in range(n_trial_circuit):
         derivative_list.append(calc_derivative(mat_A_result_list[i],mat_C_result_list[i]))
 
-    for trial_circuit in trial_circuits:
-        quality=calc_RTE_quality(hamiltonian_square,mat_A_result_list[i],mat_C_result_list[i],derivative_list[i],trial_circuit)
+    for i in range(n_trial_circuit):
+        square_energy=get_circuit_square_energy(trial_circuits[i],hamiltonian_mat)
+        quality=calc_RTE_quality(square_energy,mat_A_result_list[i],mat_C_result_list[i],derivative_list[i])
         print(quality)
         quality_list.append(quality)
 
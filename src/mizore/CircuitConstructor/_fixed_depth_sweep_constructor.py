@@ -1,6 +1,7 @@
 from ._greedy_constructor import GreedyConstructor
 from ..Objective._objective import Objective
 from ..PoolGenerator import BlockPool
+from ..Blocks._utilities import get_shared_prefix_state
 
 NOT_DEFINED = 999999
 
@@ -43,6 +44,8 @@ class FixedDepthSweepConstructor(GreedyConstructor):
             trial_circuit.active_position_list = [self.position2update]
             # print(trial_circuit)
             self.trial_circuits.append(trial_circuit)
+        # The blocks before the swept position are shared by all the trial circuits
+        self.prefix_state = get_shared_prefix_state(self.circuit, self.position2update)
         self.position2update += 1
         if self.position2update == self.n_max_block:
             self.position2update = self.sweep_start_position
@@ -66,6 +66,7 @@ class GreedyConstructor(CircuitConstructor):
         self.project_name = project_name
         self.save_name = project_name+"_"+self.time_string
         self.trial_circuits = []
+        self.prefix_state = None
         if "terminate_cost" in construct_obj.obj_info.keys():
             self.terminate_cost = construct_obj.obj_info["terminate_cost"]
 
@@ -182,6 +183,8 @@ class GreedyConstructor(CircuitConstructor):
             trial_circuit.add_block(block)
             trial_circuit.set_only_last_block_active()
             self.trial_circuits.append(trial_circuit)
+        # The trial circuits share self.circuit as the prefix, which is simulated only once here
+        self.prefix_state = get_shared_prefix_state(self.circuit)
 
     def do_trial_on_circuits_by_cost_value(self, trial_circuits=None):
         if trial_circuits == None:
@@ -191,7 +194,7 @@ class GreedyConstructor(CircuitConstructor):
         for trial_circuit in trial_circuits:
             task = OptimizationTask(trial_circuit, self.optimizer, None)
             self.task_manager.add_task_to_buffer(task, task_series_id=task_series_id)
-        self.task_manager.flush(public_resource={"cost": self.cost})
+        self.task_manager.flush(public_resource={"cost": self.cost, "prefix_state": self.prefix_state})
         res_list = self.task_manager.receive_task_result(
             task_series_id=task_series_id, progress_bar=True)
         for i in range(len(trial_circuits)):
@@ -215,7 +218,7 @@ class GreedyConstructor(CircuitConstructor):
             task = GradientTask(trial_circuit, None)
             self.task_manager.add_task_to_buffer(task, task_series_id=task_series_id)
 
-        self.task_manager.flush(public_resource={"cost": self.cost})
+        self.task_manager.flush(public_resource={"cost": self.cost, "prefix_state": self.prefix_state})
         res_list = self.task_manager.receive_task_result(task_series_id=task_series_id, progress_bar=True)
         res_list = [numpy.linalg.norm(res) for res in res_list]
         res_list = numpy.array(res_list)
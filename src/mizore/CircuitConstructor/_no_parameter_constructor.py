@@ -11,6 +11,7 @@ from ..Blocks import Block, BlockCircuit
 from ..PoolGenerator import BlockPool
 from ._result_display import save_construction
 from ..Utilities.Iterators import iter_qsubset
+from ..Blocks._utilities import get_shared_prefix_state
 NOT_DEFINED = 999999
 
 
@@ -50,7 +51,7 @@ class NoParameterConstructor(GreedyConstructor):
         for trial_circuit in trial_circuits:
             task = EvaluationTask(trial_circuit, None)
             self.task_manager.add_task_to_buffer(task, task_series_id=task_series_id)
-        self.task_manager.flush(public_resource={"cost": self.cost})
+        self.task_manager.flush(public_resource={"cost": self.cost, "prefix_state": self.prefix_state})
         res_list = self.task_manager.receive_task_result(
             task_series_id=task_series_id, progress_bar=True)
         for i in range(len(trial_circuits)):
@@ -68,6 +69,8 @@ class NoParameterConstructor(GreedyConstructor):
         block_pool=list(block_pool)
         self.trial_circuits=get_trial_circuits(self.circuit,self.n_block_per_iter,block_pool)
         self.set_trial_circuits_active_postion(self.trial_circuits)
+        # The trial circuits are evaluated with fixed parameters, so self.circuit is a prefix of all of them
+        self.prefix_state = get_shared_prefix_state(self.circuit)
    
     def set_trial_circuits_active_postion(self,trial_circuits):
         active_postions=set(get_active_postion_for_n_block_circuit(len(self.circuit.block_list),n_extra_active_blocks=self.n_extra_active_blocks,always_active_blocks=self.always_active_blocks))
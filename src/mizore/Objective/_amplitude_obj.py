@@ -23,7 +23,7 @@ class AmplitudeObjective(Objective):
         return AmplitudeCost(maximum)
 
 
-from ..Utilities.CircuitEvaluation import evaluate_ansatz_0000_amplitudes
+from ..Utilities.CircuitEvaluation import evaluate_ansatz_0000_amplitudes, evaluate_batch_amplitudes
 
 class AmplitudeCost(CostFunction):
     def __init__(self, maximum=False):
@@ -43,6 +43,19 @@ class AmplitudeCost(CostFunction):
 
         return obj
 
+    def get_cost_obj_batch(self, circuit):
+        pcircuit = circuit.get_ansatz_on_active_position()
+
+        def obj_batch(parameter_matrix):
+            amp = evaluate_batch_amplitudes(pcircuit, [False] * pcircuit.n_qubit, parameter_matrix)
+            if self.maximum:
+                coverage = -amp * np.conjugate(amp)
+            else:
+                coverage = amp * np.conjugate(amp)
+            return coverage
+
+        return obj_batch
+
     def get_cost_value(self, circuit):
         pcircuit = circuit.get_fixed_parameter_ansatz()
         amp = evaluate_ansatz_0000_amplitudes(pcircuit.n_qubit, pcircuit.ansatz)
@@ -75,7 +88,7 @@ class OneDMObjective(Objective):
         return OneDMCost(maximum, self.qubit, self.state)
 
 
-from Utilities.CircuitEvaluation import evaluate_ansatz_1DMs
+from ..Utilities.CircuitEvaluation import evaluate_ansatz_1DMs
 
 class OneDMCost(CostFunction):
     def __init__(self, maximum=False, qubit=0, state=0):
@@ -137,7 +150,7 @@ class TwoDMObjective(Objective):
         return TwoDMCost(maximum, self.qubit_i, self.qubit_j, self.state)
 
 
-from Utilities.CircuitEvaluation import evaluate_ansatz_2DMs
+from ..Utilities.CircuitEvaluation import evaluate_ansatz_2DMs
 
 class TwoDMCost(CostFunction):
     def __init__(self, maximum=False, qubit_i=1, qubit_j=0, state=0):
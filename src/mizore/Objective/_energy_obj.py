@@ -6,7 +6,7 @@ from ..Blocks._utilities import get_circuit_energy
 class EnergyObjective(Objective):
     """
     Attributes:
-        Hamiltonian
+        Hamiltonian: a QubitOperator or a PauliSum
         init_block: the block usually used for initiate the wave fucntion for the Hamiltonian.
         A block that produce a state near the ground state should be adopted.
         Usually, for the molecule, the Hartree Fock initialization is used
@@ -30,10 +30,14 @@ class EnergyObjective(Objective):
         return EnergyCost(self.hamiltonian)
 
 
-from ..Utilities.CircuitEvaluation import evaluate_ansatz_expectation
+from ..Utilities.CircuitEvaluation import evaluate_ansatz_expectation, evaluate_batch
+from ..Blocks._adjoint_utilities import is_adjoint_gradient_available, get_circuit_energy_gradient, \
+    get_circuit_energy_and_gradient
 
 
 class EnergyCost(CostFunction):
+    IS_ADJOINT_GRAD_AVAILABLE = True
+
     def __init__(self, hamiltonian):
         self.hamiltonian = hamiltonian
 
@@ -45,6 +49,28 @@ class EnergyCost(CostFunction):
 
         return obj
 
+    def get_cost_obj_batch(self, circuit):
+        pcircuit = circuit.get_ansatz_on_active_position()
+
+        def obj_batch(parameter_matrix):
+            return evaluate_batch(pcircuit, self.hamiltonian, parameter_matrix)
+
+        return obj_batch
+
+    def get_cost_obj_and_grad(self, circuit):
+        if not is_adjoint_gradient_available(circuit):
+            return None
+
+        def obj_and_grad(parameter):
+            return get_circuit_energy_and_gradient(circuit, self.hamiltonian, parameter)
+
+        return obj_and_grad
+
+    def get_cost_grad(self, circuit):
+        if not is_adjoint_gradient_available(circuit):
+            return self.get_cost_grad_by_difference(circuit)
+        return get_circuit_energy_gradient(circuit, self.hamiltonian)
+
     def get_cost_value(self, circuit):
         pcircuit = circuit.get_fixed_parameter_ansatz()
         return evaluate_ansatz_expectation([], pcircuit.n_qubit, self.hamiltonian, pcircuit.ansatz)
@@ -1,4 +1,5 @@
 from ._objective import Objective, CostFunction
+from ..Blocks import HartreeFockInitBlock
 from ..Blocks._utilities import get_circuit_energy
 from openfermion.ops import QubitOperator
 
@@ -24,10 +25,10 @@ class LeastSquareObjective(Objective):
             self.init_block = init_block
         else:
             self.init_block = HartreeFockInitBlock([])
-        if hamiltonian = None:
+        if hamiltonian is None:
             self.hamiltonian = QubitOperator()
             for i in range(n_qubit):
-            self.hamiltonian += QubitOperator("Z"+str(i))
+                self.hamiltonian += QubitOperator("Z"+str(i))
         else:
             self.hamiltonian = hamiltonian
         return
@@ -36,7 +37,7 @@ class LeastSquareObjective(Objective):
         return  LeastSquareCost(self.function, self.hamiltonian)
 
 
-from ..Utilities.CircuitEvaluation import evaluate_ansatz_expectation
+from ..Utilities.CircuitEvaluation import evaluate_ansatz_expectation, evaluate_batch
 
 
 class LeastSquareCost(CostFunction):
@@ -54,6 +55,15 @@ class LeastSquareCost(CostFunction):
 
         return obj
 
+    def get_cost_obj_batch(self, circuit):
+        pcircuit = circuit.get_ansatz_on_active_position()
+
+        def obj_batch(parameter_matrix):
+            exp = evaluate_batch(pcircuit, self.hamiltonian, parameter_matrix)
+            return (self.function - exp) ** 2
+
+        return obj_batch
+
     def get_cost_value(self, circuit):
         pcircuit = circuit.get_fixed_parameter_ansatz()
         exp = evaluate_ansatz_expectation([], pcircuit.n_qubit, self.hamiltonian, pcircuit.ansatz)
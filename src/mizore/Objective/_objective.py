@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Objective:
     """
     The base class of objectives.
@@ -17,11 +20,55 @@ class Objective:
 
 
 class CostFunction:
+    """
+    Attributes:
+        IS_ADJOINT_GRAD_AVAILABLE: Set to be true when get_cost_grad() is computed by the adjoint method
+        (see Blocks._adjoint_utilities) for the circuits where is_adjoint_gradient_available() holds
+    """
+
+    IS_ADJOINT_GRAD_AVAILABLE = False
+
     def __init__(self):
         return
 
     def get_cost_obj(self, circuit):
         return
 
+    def get_cost_obj_batch(self, circuit):
+        """
+        Return a function which maps a (n_batch x n_parameter) matrix to the array of costs of its rows.
+        Cost functions that can be evaluated in one vectorized pass should override it.
+        """
+        obj = self.get_cost_obj(circuit)
+
+        def obj_batch(parameter_matrix):
+            return np.array([obj(parameter) for parameter in parameter_matrix])
+
+        return obj_batch
+
+    def get_cost_obj_and_grad(self, circuit):
+        """
+        Return a function which maps the parameter to (cost, gradient), e.g. for scipy.optimize.minimize(jac=True),
+        or None if the cost can not provide the gradient cheaper than finite differences
+        """
+        return None
+
+    def get_cost_grad(self, circuit):
+        """
+        Return the gradient of the cost w.r.t. the parameters on the active positions of the circuit
+        """
+        return self.get_cost_grad_by_difference(circuit)
+
+    def get_cost_grad_by_difference(self, circuit, step_size=1e-6):
+        """
+        Return the gradient by forward differences, which costs n_parameter+1 evaluations of the cost
+        """
+        obj_batch = self.get_cost_obj_batch(circuit)
+        n_parameter = circuit.count_n_parameter_on_active_position()
+        # The first row is the start point and the others are the shifted points
+        parameter_matrix = np.vstack([np.zeros(n_parameter), np.eye(n_parameter) * step_size])
+        cost_array = obj_batch(parameter_matrix)
+        return (cost_array[1:] - cost_array[0]) / step_size
+
     def get_cost_value(self, circuit):
         return
@@ -1,6 +1,7 @@
 from ._objective import Objective, CostFunction
 from ..ParameterOptimizer._vqs_utilities import calc_RTE_quality_by_circuit,calc_RTE_quality_by_circuit_analytical
-from ..Utilities.Tools import qubit_operator2matrix
+from ..Utilities.OperatorCache import get_cached_operator_matrix, is_cache_used
+from ..Utilities.PauliSum import PauliSum
 import numpy as np
 
 
@@ -10,8 +11,6 @@ class CircuitQualityObjective(Objective):
         self.hamiltonian = hamiltonian
         self.diff = diff
         self.is_analytical=is_analytical
-        self.hamiltonian_square = self.hamiltonian*self.hamiltonian
-        self.hamiltonian_square.compress()
         self.n_qubit = n_qubit
         Objective.__init__(self, n_qubit=self.n_qubit)
         self.obj_info = obj_info
@@ -19,33 +18,52 @@ class CircuitQualityObjective(Objective):
 
     def get_cost(self):
         if not self.is_analytical:
-            return CircuitQualityCost(self.n_qubit,self.hamiltonian,self.hamiltonian_square, self.diff)
+            return CircuitQualityCost(self.n_qubit,self.hamiltonian, diff=self.diff)
         else:
-            return AnalyticalCircuitQualityCost(self.n_qubit,self.hamiltonian,self.hamiltonian_square, self.diff)
+            return AnalyticalCircuitQualityCost(self.n_qubit,self.hamiltonian, diff=self.diff)
 
 
 class CircuitQualityCost(CostFunction):
-    def __init__(self, n_qubit,hamiltonian, hamiltonian_square, diff):
+    def __init__(self, n_qubit,hamiltonian, hamiltonian_square=None, diff=1e-4):
+        """
+        Args:
+            hamiltonian_square: not used, <H^2> is evaluated as ||H|psi>||^2 (see get_circuit_square_energy())
+        """
         self.hamiltonian = hamiltonian
-        self.hamiltonian_square = hamiltonian_square
         self.diff = diff
-        self.hamiltonian_mat = qubit_operator2matrix(
-            n_qubit, hamiltonian)
+        self.n_qubit = n_qubit
+        self._hamiltonian_mat = None
+
+    @property
+    def hamiltonian_mat(self):
+        if self._hamiltonian_mat is None:
+            if isinstance(self.hamiltonian, PauliSum):
+                self._hamiltonian_mat = self.hamiltonian
+            else:
+                self._hamiltonian_mat = get_cached_operator_matrix(self.n_qubit, self.hamiltonian)
+        return self._hamiltonian_mat
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The workers load the matrix from the on-disk cache instead of receiving a copy
+        if is_cache_used(self.n_qubit) and not isinstance(self.hamiltonian, PauliSum):
+            state["_hamiltonian_mat"] = None
+        return state
 
     def get_cost_obj(self, circuit):
         def obj(parameter):
-            return calc_RTE_quality_by_circuit(circuit,self.hamiltonian_mat,self.hamiltonian_square,self.diff)
+            return calc_RTE_quality_by_circuit(circuit,self.hamiltonian_mat,self.diff)
         return obj
 
     def get_cost_value(self, circuit):
-        quality=calc_RTE_quality_by_circuit(circuit,self.hamiltonian_mat,self.hamiltonian_square,self.diff)
+        quality=calc_RTE_quality_by_circuit(circuit,self.hamiltonian_mat,self.diff)
         return quality
 
 class AnalyticalCircuitQualityCost(CircuitQualityCost):
     def get_cost_obj(self, circuit):
         def obj(parameter):
-            return calc_RTE_quality_by_circuit_analytical(circuit,self.hamiltonian_mat,self.hamiltonian_square)
+            return calc_RTE_quality_by_circuit_analytical(circuit,self.hamiltonian_mat)
         return obj
     def get_cost_value(self, circuit):
-        quality=calc_RTE_quality_by_circuit_analytical(circuit,self.hamiltonian_mat,self.hamiltonian_square)
+        quality=calc_RTE_quality_by_circuit_analytical(circuit,self.hamiltonian_mat)
         return quality
\ No newline at end of file
@@ -1,4 +1,5 @@
-from ._task_manager import TaskManager
+from ._task_manager import TaskManager, TaskFuture
 from ._optimization_task import OptimizationTask
 from ._gradient_task import GradientTask
 from ._inner_product_task import InnerProductTask
+from ._latency_benchmark import EchoTask, measure_round_trip_latency
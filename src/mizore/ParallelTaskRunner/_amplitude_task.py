@@ -1,6 +1,7 @@
 from ._task import Task
 from ..Blocks import BlockCircuit
 from ..Utilities.CircuitEvaluation import evaluate_ansatz_amplitudes
+import numpy as np
 
 
 class AmplitudeTask(Task):
@@ -19,3 +20,17 @@ class AmplitudeTask(Task):
         res = evaluate_ansatz_amplitudes(self.circuit.n_qubit, self.circuit.get_fixed_parameter_ansatz().ansatz,
                                          self.bit_strings)
         return res
+
+
+class CompleteAmplitudeTask(Task):
+    """
+    The task of evaluating the complete statevector produced by a BlockCircuit
+    """
+
+    def __init__(self, circuit: BlockCircuit):
+        Task.__init__(self)
+        self.circuit = circuit
+
+    def run(self):
+        from ..Blocks._utilities import get_circuit_complete_amplitudes
+        return np.array(get_circuit_complete_amplitudes(self.circuit), dtype=complex)
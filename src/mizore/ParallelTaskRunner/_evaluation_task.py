@@ -10,5 +10,6 @@ class EvaluationTask(Task):
         self.cost = cost
 
     def run(self):
+        self.apply_prefix_state(self.circuit)
         return self.cost.get_cost_value(self.circuit)
 
@@ -2,7 +2,9 @@ from ._task import Task
 from ..Blocks import BlockCircuit
 from openfermion.ops import QubitOperator
 from ..Objective._objective import CostFunction
+from ..Blocks._adjoint_utilities import is_adjoint_gradient_available
 from numpy.linalg import norm
+import numpy as np
 
 
 class GradientTask(Task):
@@ -10,6 +12,8 @@ class GradientTask(Task):
     The task for evaluate the gradient of a cost function at a point
     The start point should be defined in the input BlockCircuit
     A derivative vector will be returned
+    The adjoint gradient of the cost is used when every block to differentiate through has IS_INVERSE_DEFINED,
+    otherwise the gradient is taken by forward differences
     """
 
     def __init__(self, circuit: BlockCircuit, cost: CostFunction, step_size=1e-6):
@@ -19,13 +23,7 @@ class GradientTask(Task):
         self.step_size = step_size
 
     def run(self):
-        obj = self.cost.get_cost_obj(self.circuit)
-        n_parameter = self.circuit.count_n_parameter_on_active_position()
-        x = [0.0] * n_parameter
-        init_cost = obj(x)
-        cost_list = [0.0] * n_parameter
-        for i in range(n_parameter):
-            x[i] = self.step_size
-            cost_list[i] = (obj(x) - init_cost) / self.step_size
-            x[i] = 0.0
-        return cost_list
+        self.apply_prefix_state(self.circuit)
+        if self.cost.IS_ADJOINT_GRAD_AVAILABLE and is_adjoint_gradient_available(self.circuit):
+            return list(self.cost.get_cost_grad(self.circuit))
+        return list(self.cost.get_cost_grad_by_difference(self.circuit, step_size=self.step_size))
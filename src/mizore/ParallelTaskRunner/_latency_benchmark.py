@@ -0,0 +1,54 @@
+from ._task import Task
+from ._task_manager import TaskManager
+import time
+import numpy as np
+
+
+class EchoTask(Task):
+    """
+    A task that does nothing but return its payload, for measuring the overhead of the TaskManager
+    """
+
+    def __init__(self, payload=None):
+        Task.__init__(self)
+        self.payload = payload
+
+    def run(self):
+        return self.payload
+
+
+def measure_round_trip_latency(task_manager: TaskManager = None, n_series=200, n_task_per_series=2, payload=None,
+                               n_warmup=10):
+    """
+    Measure the time from add_task_to_buffer() to the end of receive_task_result() of series of EchoTasks,
+    i.e. the overhead paid by every series however fast its tasks are
+    Args:
+        task_manager: the TaskManager to measure. If None, a TaskManager with 4 processes is created and closed
+        n_series: the number of series measured
+        n_task_per_series: the number of EchoTasks in each series
+        payload: the object returned by the tasks
+        n_warmup: the number of series run before measuring
+    Returns:
+        a dict of the mean, median and maximum round-trip seconds per series
+    """
+    created = task_manager is None
+    if created:
+        task_manager = TaskManager(n_processor=4)
+    round_trip_list = []
+    for i_series in range(n_warmup + n_series):
+        series_id = "Latency Benchmark " + str(i_series)
+        start_time = time.perf_counter()
+        for _i in range(n_task_per_series):
+            task_manager.add_task_to_buffer(EchoTask(payload), task_series_id=series_id)
+        task_manager.flush()
+        task_manager.receive_task_result(task_series_id=series_id)
+        if i_series >= n_warmup:
+            round_trip_list.append(time.perf_counter() - start_time)
+    if created:
+        task_manager.close()
+    round_trip_list = np.array(round_trip_list)
+    res = {"mean": float(np.mean(round_trip_list)), "median": float(np.median(round_trip_list)),
+           "max": float(np.max(round_trip_list))}
+    print("Round trip per series (ms): mean {:.3f}, median {:.3f}, max {:.3f}".format(
+        res["mean"] * 1e3, res["median"] * 1e3, res["max"] * 1e3))
+    return res
@@ -1,10 +1,11 @@
 from ._task import Task
 from ..Blocks._utilities import get_inner_two_circuit_product
-from ..Blocks._sparse_circuit_utilities import get_0000_amplitude_on_sparse_circuit
+from ..Blocks._sparse_circuit_utilities import get_0000_amplitude_on_sparse_circuit, get_matrix_term_on_sparse_circuit
 from ..Blocks import BlockCircuit, PauliGatesBlock
 from ..Blocks._utilities import concatenate_circuit, get_inverse_circuit, get_0000_amplitude_on_circuit,get_inner_two_circuit_product
 from ..Blocks._utilities import get_circuit_complete_amplitudes,evaluate_off_diagonal_term_by_amps
-from ..Utilities.Tools import qubit_operator2matrix
+from ..Utilities.PauliSum import PauliSum
+from ..Utilities.OperatorCache import get_cached_operator_matrix, is_cache_used
 
 class MatrixTermTask(Task):
 
@@ -20,14 +21,18 @@ class MatrixTermTask(Task):
 
 def get_matrix_term(circuit1: BlockCircuit, circuit2: BlockCircuit, hamiltonian, is_sparse=False):
     if is_sparse:
-        for _i in range(10):
-            print("Sparse circuit is not supported in QSD solver now. Please wait for development.")
+        return get_matrix_term_on_sparse_circuit(circuit1, circuit2, hamiltonian)
 
     if hamiltonian is not None:
         circuit1_amp = get_circuit_complete_amplitudes(circuit1)
         circuit2_amp = get_circuit_complete_amplitudes(circuit2)
-        hamiltonian_mat=qubit_operator2matrix(
-                circuit1.n_qubit, hamiltonian)
+        if isinstance(hamiltonian, PauliSum):
+            hamiltonian_mat = hamiltonian
+        elif is_cache_used(circuit1.n_qubit):
+            # Every task of the same Hamiltonian maps the same matrix files
+            hamiltonian_mat = get_cached_operator_matrix(circuit1.n_qubit, hamiltonian)
+        else:
+            hamiltonian_mat = PauliSum.from_qubit_operator(hamiltonian, circuit1.n_qubit)
         mat_term=evaluate_off_diagonal_term_by_amps(
                 circuit1_amp, circuit2_amp, hamiltonian_mat)
     else:
@@ -19,5 +19,6 @@ class OptimizationTask(Task):
         self.cost = cost
 
     def run(self):
+        self.apply_prefix_state(self.circuit)
         res = self.optimizer.run_optimization(self.circuit, self.cost)
         return res
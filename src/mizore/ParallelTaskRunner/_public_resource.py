@@ -0,0 +1,125 @@
+from multiprocessing.shared_memory import SharedMemory
+import io
+import pickle
+import numpy as np
+
+"""
+The transport of the public resources of TaskManager (see TaskManager.register_public_resource()).
+
+A resource is pickled once into a payload sent to every TaskRunner. The large NumPy arrays in it
+(anywhere in the object, e.g. the arrays of a CSR matrix or the amplitudes of a prefix state) are not pickled
+but copied into blocks of multiprocessing.shared_memory, and the payload only holds the names of the blocks.
+The TaskRunners map the blocks as read-only arrays without copying them.
+A read-only array shared by several resources (found by its id) is copied only once while any of them
+is registered. The writable arrays may change between the registrations and are copied for each resource.
+"""
+
+# The arrays smaller than this are pickled into the payload
+SHARED_ARRAY_MIN_NBYTES = 1 << 16
+
+
+class SharedArrayRegistry:
+    """
+    The shared memory blocks created by the TaskManager, with the handles of the resources using them
+    """
+
+    def __init__(self):
+        # id(array) or (handle, id(array)) -> [array, SharedMemory, set of handles]
+        self.entry_dict = dict()
+
+    def share(self, array, handle):
+        """
+        Return the name of the block holding a copy of the array, and create it if the array is not shared yet
+        """
+        key = id(array) if not array.flags.writeable else (handle, id(array))
+        if key not in self.entry_dict:
+            block = SharedMemory(create=True, size=array.nbytes)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.entry_dict[key] = [array, block, set()]
+        self.entry_dict[key][2].add(handle)
+        return self.entry_dict[key][1].name
+
+    def release(self, handle):
+        """
+        Remove the blocks that are no longer used by any resource.
+        Removing the blocks mapped by the TaskRunners is safe, their mappings are kept
+        """
+        for key in list(self.entry_dict.keys()):
+            _array, block, handle_set = self.entry_dict[key]
+            handle_set.discard(handle)
+            if len(handle_set) == 0:
+                block.close()
+                block.unlink()
+                del self.entry_dict[key]
+
+    def get_nbytes(self):
+        return sum(entry[0].nbytes for entry in self.entry_dict.values())
+
+    def close(self):
+        for _array, block, _handle_set in self.entry_dict.values():
+            block.close()
+            block.unlink()
+        self.entry_dict = dict()
+
+
+class _SharingPickler(pickle.Pickler):
+
+    def __init__(self, file, registry: SharedArrayRegistry, handle):
+        pickle.Pickler.__init__(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.registry = registry
+        self.handle = handle
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, np.ndarray) or obj.nbytes < SHARED_ARRAY_MIN_NBYTES or obj.dtype.hasobject:
+            return None
+        return "shared_array", self.registry.share(obj, self.handle), obj.shape, obj.dtype.str
+
+
+class _SharingUnpickler(pickle.Unpickler):
+
+    def __init__(self, file):
+        pickle.Unpickler.__init__(self, file)
+        self.block_list = []
+
+    def persistent_load(self, pid):
+        _kind, name, shape, dtype = pid
+        block = attach_shared_memory(name)
+        self.block_list.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        return array
+
+
+def attach_shared_memory(name):
+    try:
+        # The blocks are owned by the TaskManager, not tracked by the TaskRunners (Python 3.13+)
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        return SharedMemory(name=name)
+
+
+def dump_public_resource(resource, registry: SharedArrayRegistry, handle):
+    """
+    Return the payload of the resource, whose large arrays are put into shared memory under the handle
+    """
+    file = io.BytesIO()
+    _SharingPickler(file, registry, handle).dump(resource)
+    return file.getvalue()
+
+
+def load_public_resource(payload):
+    """
+    Return (resource, block_list). The blocks should be kept open while the resource is used
+    """
+    unpickler = _SharingUnpickler(io.BytesIO(payload))
+    resource = unpickler.load()
+    return resource, unpickler.block_list
+
+
+def close_shared_blocks(block_list):
+    for block in block_list:
+        try:
+            block.close()
+        except BufferError:
+            # The arrays are still referenced, the mapping is closed when they are collected
+            pass
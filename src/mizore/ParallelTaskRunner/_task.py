@@ -2,15 +2,41 @@ class Task:
     """
     The base class of tasks. Task should include information for a TaskRunner to process
     By run(), a result should be returned
+    A prefix_state (see BlockCircuit.set_prefix_state()) can be shipped to the tasks as a public resource
     """
 
     def __init__(self):
         self.index_of_in = -1
         self.series_id = -1
+        self.prefix_state = None
         return
 
+    def apply_prefix_state(self, circuit):
+        """
+        Let the circuit start from self.prefix_state, which is (amplitudes, n_prefix_block) or None
+        """
+        if self.prefix_state is not None:
+            circuit.set_prefix_state(*self.prefix_state)
+
     def run(self):
         return
 
+    def get_size(self):
+        """
+        Return (n_qubit, n_block) of the BlockCircuits of the task (the attributes and the lists of them),
+        which is the size in the keys of the recorded runtimes (see TaskManager.task_difficulty_dict)
+        """
+        from ..Blocks import BlockCircuit
+        n_qubit, n_block = 0, 0
+        for value in self.__dict__.values():
+            circuits = [value]
+            if isinstance(value, (list, tuple)) and len(value) != 0 and isinstance(value[0], BlockCircuit):
+                circuits = value
+            for circuit in circuits:
+                if isinstance(circuit, BlockCircuit):
+                    n_qubit = max(n_qubit, circuit.n_qubit)
+                    n_block += len(circuit.block_list)
+        return n_qubit, n_block
+
     def __hash__(self):
         return self.__str__().__hash__()
@@ -1,41 +1,140 @@
 from multiprocessing import Process, Queue
-import time
+from multiprocessing import resource_tracker
+import concurrent.futures
+import asyncio
+import threading
 import pickle
+import traceback
+import queue
+import time
 import numpy
-from copy import deepcopy
 from ._task import Task
+from ._public_resource import SharedArrayRegistry, dump_public_resource, load_public_resource, close_shared_blocks
 from tqdm import tqdm
 
 
 class TaskResult:
 
-    def __init__(self, result, index_of_in, series_id):
+    def __init__(self, result, index_of_in, series_id, run_time=0.0):
         self.index_of_in = index_of_in
         self.result = result
         self.series_id = series_id
+        self.run_time = run_time
+
+
+class TaskFailure:
+    """
+    The result of a task that raised an exception in the TaskRunner.
+    It is raised again by receive_task_result() or the TaskFuture of the task
+    """
+
+    def __init__(self, task_name, trace):
+        self.task_name = task_name
+        self.trace = trace
+
+    def get_exception(self, task_series_id):
+        return Exception("The task " + self.task_name + " of the series " + str(task_series_id) +
+                         " failed in a TaskRunner:\n" + self.trace)
+
+
+class TaskFuture(concurrent.futures.Future):
+    """
+    The future of a task submitted by TaskManager.submit(). It is a concurrent.futures.Future, so
+    concurrent.futures.wait() and as_completed() accept it, and it can be awaited in asyncio.
+    The task cannot be stopped once submitted, so cancel() only discards its result
+    """
+
+    def __await__(self):
+        return (yield from asyncio.wrap_future(self).__await__())
 
 
 class TaskRunner(Process):
     """
     See TaskManager
+    The runner blocks on the task queue until a package arrives, so there is no polling delay.
+    It stops when it receives None (see TaskManager.close())
+    The public resources are registered and released by the messages in its own control_queue,
+    and the packages only carry their handles. A resource is loaded when a package first needs it
+    and is cached until it is released. The tasks of a package whose resource is released or never registered
+    fail (see TaskFailure) instead of blocking the runner.
+    The tasks arrive as (index_of_in, series_id, payload), where payload is the pickled task (see add_task_to_buffer())
     """
 
-    def __init__(self, task_queue, result_queue):
+    # The seconds waited for the registration of a resource after its package arrives
+    REGISTRATION_TIMEOUT = 60.0
+
+    def __init__(self, task_queue, result_queue, control_queue):
         Process.__init__(self)
         self.task_queue = task_queue
         self.result_queue = result_queue
+        self.control_queue = control_queue
+        # handle -> payload of the resources registered but not loaded yet
+        self.payload_dict = dict()
+        # handle -> (resource, shared memory blocks)
+        self.resource_dict = dict()
+        self.released_handle_set = set()
+
+    def process_control_message(self, message):
+        command, handle = message[0], message[1]
+        if command == "register":
+            self.payload_dict[handle] = message[2]
+        elif command == "release":
+            self.released_handle_set.add(handle)
+            self.payload_dict.pop(handle, None)
+            if handle in self.resource_dict:
+                _resource, block_list = self.resource_dict.pop(handle)
+                close_shared_blocks(block_list)
+
+    def get_public_resource(self, handle):
+        """
+        Return the resource of the handle, or a TaskFailure if it is released or never registered
+        """
+        if handle is None:
+            return None
+        while True:
+            try:
+                self.process_control_message(self.control_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            # The registration is sent before the packages using it, so it arrives soon unless the handle is unknown
+            while handle not in self.payload_dict and handle not in self.resource_dict:
+                if handle in self.released_handle_set:
+                    return TaskFailure("(public resource " + str(handle) + ")",
+                                       "The public resource is released before the task runs\n")
+                self.process_control_message(self.control_queue.get(True, TaskRunner.REGISTRATION_TIMEOUT))
+            if handle not in self.resource_dict:
+                self.resource_dict[handle] = load_public_resource(self.payload_dict.pop(handle))
+        except queue.Empty:
+            return TaskFailure("(public resource " + str(handle) + ")", "The public resource is not registered\n")
+        except Exception:
+            return TaskFailure("(public resource " + str(handle) + ")", traceback.format_exc())
+        return self.resource_dict[handle][0]
 
     def run(self):
         while True:
-            time.sleep(0.1)
             task_package = self.task_queue.get(True)
+            if task_package is None:
+                return
             result_package = []
-            public_resource = task_package[0]
+            public_resource = self.get_public_resource(task_package[0])
             for i in range(1, len(task_package)):
-                task = task_package[i]
-                dress_by_public_resource(public_resource, task)
-                result = task.run()
-                result_package.append(TaskResult(result, task.index_of_in, task.series_id))
+                index_of_in, series_id, payload = task_package[i]
+                if isinstance(public_resource, TaskFailure):
+                    result_package.append(TaskResult(public_resource, index_of_in, series_id))
+                    continue
+                task = None
+                start_time = time.perf_counter()
+                try:
+                    task = pickle.loads(payload)
+                    task.index_of_in = index_of_in
+                    task.series_id = series_id
+                    dress_by_public_resource(public_resource, task)
+                    result = task.run()
+                except Exception:
+                    result = TaskFailure(type(task).__name__ if task is not None else "(unpickling)",
+                                         traceback.format_exc())
+                result_package.append(TaskResult(result, index_of_in, series_id, time.perf_counter() - start_time))
             self.result_queue.put(result_package)
 
 
@@ -55,14 +154,47 @@ class TaskManager:
         1. Add tasks to the buffer and attach a *task_series_id*: add_task_to_buffer(_task, task_series_id)
         2. Use flush() to send the tasks in the buffer to the TaskRunners
         3. Use receive_task_result(task_series_id) to receive the results of the tasks with *task_series_id*
+        4. Use close() to stop the TaskRunners
+    The TaskRunners and a collecting thread of the TaskManager block on the queues instead of polling them,
+    so a series returns as soon as its last result package arrives (see measure_round_trip_latency()).
+    Futures:
+        submit(_task) sends a task at once and returns its TaskFuture, and submit_tasks() sends a list of tasks
+        scheduled like flush(). The futures are set by the collecting thread as the results arrive, so they
+        can be used while the other tasks are running, by TaskFuture.result(), as_completed(), map()
+        or await in asyncio. The tasks submitted do not join any series of receive_task_result().
     Advanced Usage:
         When flush(), a *public_resource* can be added to avoid including 
         large and common resources (like a big Hamiltonian) in every tasks
         public_resource should be a dict() with like {"hamiltonian":operator}
         By doing so, the TaskRunner will replace the attribute named "hamiltonian" by operator in the tasks before run 
+        The resource is sent to each TaskRunner once per flush() (see register_public_resource()), and released
+        after the results of all the flushed tasks have arrived.
+        A resource used by many flushes can be registered once by register_public_resource() and its handle
+        passed to flush() as the public_resource instead. It is kept until release_public_resource() or close().
+    Scheduling:
+        The runtime of every task is recorded in task_difficulty_dict by the type and the size of the task
+        (see Task.get_size()). flush() sends the tasks longest first by these records, in packages that
+        shrink with the remaining work (guided self-scheduling), and the idle TaskRunners take the next package
+        from the shared task queue. So the long tasks start first and the runners finish together.
+    Attributes:
+        task_package_size: the maximal number of tasks in a package, None for no limit
+        task_difficulty_dict: (task type name, size) -> the average runtime in seconds
     """
 
-    def __init__(self, n_processor=4, task_package_size=5):
+    # The estimated seconds of a package are at least this, so the short tasks are batched
+    # against the overhead of the queues
+    MIN_PACKAGE_TIME = 0.01
+    # A package takes about 1/(GUIDED_FACTOR*n_processor) of the remaining estimated time
+    GUIDED_FACTOR = 2
+    # The weight of a new runtime in the running averages of task_difficulty_dict
+    RUNTIME_AVERAGE_WEIGHT = 0.3
+    # The estimated seconds of the tasks whose type has no record yet
+    DEFAULT_TASK_TIME = 1.0
+
+    # The series id of the serialization stats of the tasks of submit() and submit_tasks()
+    FUTURE_SERIES_ID = "Futures"
+
+    def __init__(self, n_processor=4, task_package_size=None):
 
         self.n_processor = n_processor
         self.processor_list = []
@@ -75,83 +207,353 @@ class TaskManager:
         self.task_package_size = task_package_size
 
         self.task_difficulty_dict = dict()
+        # index_of_in -> the key of task_difficulty_dict, for the tasks not received yet
+        self.difficulty_key_by_index = dict()
+
+        self.control_queue_list = [Queue() for _i in range(n_processor)]
+        self.shared_array_registry = SharedArrayRegistry()
+        self.n_public_resource_registered = 0
+        # handle -> the registered resource, which keeps the ids in the keys valid
+        self.public_resource_dict = dict()
+        self.handle_by_key = dict()
+        # handle -> the number of tasks using it whose results have not arrived, for the resources released
+        # automatically (see hold_public_resource())
+        self.n_task_remain_by_handle = dict()
+        # index_of_in -> the handle held for the task
+        self.handle_by_index = dict()
+        # series id -> {"n_task", "n_byte", "time"} of the serialization of its tasks
+        self.serialization_stats_by_series_id = dict()
+        # index_of_in -> TaskFuture, for the submitted tasks not received yet
+        self.future_by_index = dict()
+        # Guards the states shared with the collecting thread, and is notified when results arrive
+        self.result_condition = threading.Condition()
 
+        # The runners should share the resource tracker of this process, which owns the shared memory
+        resource_tracker.ensure_running()
         for i in range(n_processor):
             self.processor_list.append(TaskRunner(
-                self.task_queue, self.result_queue))
+                self.task_queue, self.result_queue, self.control_queue_list[i]))
         for i in range(n_processor):
             self.processor_list[i].start()
+        # Started after the TaskRunners, which should not be forked with a running thread
+        self.collector = threading.Thread(target=self.collect_results, daemon=True)
+        self.collector.start()
+
+    def serialize_task(self, _task: Task, task_series_id):
+        """
+        Return the entry (index_of_in, series_id, payload) of the task. The task is pickled exactly once here,
+        so later changes of it (or of its circuit) do not affect the task sent, and it is neither copied nor changed
+        """
+        start_time = time.perf_counter()
+        payload = pickle.dumps(_task, protocol=pickle.HIGHEST_PROTOCOL)
+        serialization_time = time.perf_counter() - start_time
+        stats = self.serialization_stats_by_series_id[task_series_id]
+        stats["n_task"] += 1
+        stats["n_byte"] += len(payload)
+        stats["time"] += serialization_time
+        with self.result_condition:
+            index_of_in = self.n_task_processed
+            self.difficulty_key_by_index[index_of_in] = (type(_task).__name__, _task.get_size())
+            self.n_task_processed += 1
+        return index_of_in, task_series_id, payload
 
     def add_task_to_buffer(self, _task: Task, task_series_id=0):
-        task = deepcopy(_task)
-        task.index_of_in = self.n_task_processed
-        task.series_id = task_series_id
-        self.n_task_processed += 1
-        if task_series_id in self.n_task_remain_by_series_id.keys():
+        """
+        Serialize the task into the buffer (see serialize_task())
+        """
+        with self.result_condition:
+            if self.n_task_remain_by_series_id.get(task_series_id, 0) == 0:
+                # A new round of the series
+                self.serialization_stats_by_series_id[task_series_id] = {"n_task": 0, "n_byte": 0, "time": 0.0}
+                self.n_task_remain_by_series_id[task_series_id] = 0
+                self.recieve_buffer_by_series_id[task_series_id] = []
             self.n_task_remain_by_series_id[task_series_id] += 1
+        self.buffer_to_send.append(self.serialize_task(_task, task_series_id))
+
+    def get_serialization_stats(self, task_series_id=0):
+        """
+        Return {"n_task", "n_byte", "time"}: the number of tasks added to the series since all its previous tasks
+        were received, the total bytes of their payloads and the total seconds spent pickling them
+        """
+        return dict(self.serialization_stats_by_series_id.get(task_series_id, {"n_task": 0, "n_byte": 0,
+                                                                               "time": 0.0}))
+
+    def print_serialization_stats(self, task_series_id=0):
+        stats = self.get_serialization_stats(task_series_id)
+        print("Series", task_series_id, "serialized", stats["n_task"], "tasks,", stats["n_byte"], "bytes in",
+              "{:.3f}".format(stats["time"]), "s")
+
+    def register_public_resource(self, public_resource: dict, key=None):
+        """
+        Send the resource to every TaskRunner once and return its handle, which can be passed to flush().
+        The large NumPy arrays in it are shared through shared memory instead of being copied (see _public_resource.py)
+        Args:
+            key: (optional) a hashable. If a resource with the same key is registered, its handle is returned
+        """
+        if key is not None and key in self.handle_by_key:
+            return self.handle_by_key[key]
+        handle = self.n_public_resource_registered
+        self.n_public_resource_registered += 1
+        payload = dump_public_resource(public_resource, self.shared_array_registry, handle)
+        for control_queue in self.control_queue_list:
+            control_queue.put(("register", handle, payload))
+        self.public_resource_dict[handle] = public_resource
+        if key is not None:
+            self.handle_by_key[key] = handle
+        return handle
+
+    def release_public_resource(self, handle):
+        """
+        Let the TaskRunners drop the resource. It should not be used by the tasks not received yet
+        """
+        if handle not in self.public_resource_dict:
+            return
+        for control_queue in self.control_queue_list:
+            control_queue.put(("release", handle))
+        self.shared_array_registry.release(handle)
+        del self.public_resource_dict[handle]
+        with self.result_condition:
+            self.n_task_remain_by_handle.pop(handle, None)
+        for key in [key for key, key_handle in self.handle_by_key.items() if key_handle == handle]:
+            del self.handle_by_key[key]
+
+    def check_public_resource(self, public_resource):
+        if public_resource is None or isinstance(public_resource, dict):
+            return
+        if public_resource not in self.public_resource_dict:
+            raise Exception("The public resource " + str(public_resource) + " is not registered or already released")
+
+    def hold_public_resource(self, handle, entry_list):
+        """
+        Keep the resource until the results of all the tasks of entry_list have arrived,
+        and then release it by release_received_public_resources()
+        """
+        with self.result_condition:
+            self.n_task_remain_by_handle[handle] = len(entry_list)
+            for index_of_in, _series_id, _payload in entry_list:
+                self.handle_by_index[index_of_in] = handle
+
+    def release_received_public_resources(self):
+        # A task cancelled or not received yet still holds its resource until its result arrives,
+        # because its package may be waiting in the task queue
+        with self.result_condition:
+            handle_list = [handle for handle, n_task in self.n_task_remain_by_handle.items() if n_task == 0]
+        for handle in handle_list:
+            self.release_public_resource(handle)
+
+    def record_runtime(self, task_result: TaskResult):
+        key = self.difficulty_key_by_index.pop(task_result.index_of_in, None)
+        if key is None or isinstance(task_result.result, TaskFailure):
+            return
+        if key not in self.task_difficulty_dict:
+            self.task_difficulty_dict[key] = task_result.run_time
         else:
-            self.n_task_remain_by_series_id[task_series_id] = 1
-            self.recieve_buffer_by_series_id[task_series_id] = []
-        self.buffer_to_send.append(task)
+            weight = TaskManager.RUNTIME_AVERAGE_WEIGHT
+            self.task_difficulty_dict[key] = (1 - weight) * self.task_difficulty_dict[key] + weight * task_result.run_time
+
+    def estimate_runtime(self, key):
+        """
+        Return the recorded runtime of the key, or the mean of the records of the same task type,
+        or DEFAULT_TASK_TIME if the type has no record
+        """
+        if key in self.task_difficulty_dict:
+            return self.task_difficulty_dict[key]
+        same_type = [runtime for (task_type, _size), runtime in self.task_difficulty_dict.items() if task_type == key[0]]
+        if len(same_type) != 0:
+            return sum(same_type) / len(same_type)
+        return TaskManager.DEFAULT_TASK_TIME
 
     def flush(self, task_package_size=None, public_resource=None):
+        """
+        Send the tasks in the buffer, longest first, in packages sized by their estimated runtimes (see Scheduling)
+        Args:
+            task_package_size: the maximal number of tasks in a package. Default: self.task_package_size
+            public_resource: None, a dict registered for these tasks only, or a handle of register_public_resource()
+        """
+        if len(self.buffer_to_send) == 0:
+            return
+        self.release_received_public_resources()
+        self.check_public_resource(public_resource)
+        handle = public_resource
+        if isinstance(public_resource, dict):
+            handle = self.register_public_resource(public_resource)
+            self.hold_public_resource(handle, self.buffer_to_send)
+        self.send_packages(self.buffer_to_send, handle, task_package_size)
+        self.buffer_to_send = []
+
+    def send_packages(self, entry_list, handle, task_package_size=None):
         if task_package_size == None:
             task_package_size = self.task_package_size
-
-        task_package = [public_resource]
-        for task in self.buffer_to_send:
-            task_package.append(task)
-            if len(task_package) >= task_package_size:
+        with self.result_condition:
+            runtime_list = [self.estimate_runtime(self.difficulty_key_by_index[index]) for index, _series_id, _payload
+                            in entry_list]
+        order = sorted(range(len(entry_list)), key=lambda i: -runtime_list[i])
+        remaining_time = sum(runtime_list)
+        task_package = [handle]
+        package_time = 0.0
+        for i in order:
+            task_package.append(entry_list[i])
+            package_time += runtime_list[i]
+            target_time = max(remaining_time / (TaskManager.GUIDED_FACTOR * self.n_processor),
+                              TaskManager.MIN_PACKAGE_TIME)
+            if package_time >= target_time or (task_package_size is not None and
+                                               len(task_package) > max(1, task_package_size)):
                 self.task_queue.put(task_package)
-                task_package = [public_resource]
-        if len(task_package) != 0:
+                remaining_time -= package_time
+                task_package = [handle]
+                package_time = 0.0
+        if len(task_package) > 1:
             self.task_queue.put(task_package)
-        self.buffer_to_send = []
 
-    RECEIVE_PERIOD = 0.1
+    def submit_tasks(self, task_list, task_package_size=None, public_resource=None):
+        """
+        Send the tasks at once, scheduled like flush(), and return their TaskFutures in the same order.
+        The serialization stats of FUTURE_SERIES_ID cover the tasks of the last call
+        Args:
+            task_package_size: the maximal number of tasks in a package. Default: self.task_package_size
+            public_resource: None, a dict registered for these tasks only (released after all their results
+                have arrived, even if their futures are cancelled), or a handle of register_public_resource()
+        """
+        self.release_received_public_resources()
+        self.check_public_resource(public_resource)
+        self.serialization_stats_by_series_id[TaskManager.FUTURE_SERIES_ID] = {"n_task": 0, "n_byte": 0, "time": 0.0}
+        entry_list = [self.serialize_task(_task, TaskManager.FUTURE_SERIES_ID) for _task in task_list]
+        future_list = [TaskFuture() for _entry in entry_list]
+        with self.result_condition:
+            for (index_of_in, _series_id, _payload), future in zip(entry_list, future_list):
+                self.future_by_index[index_of_in] = future
+        if len(entry_list) == 0:
+            return future_list
+        handle = public_resource
+        if isinstance(public_resource, dict):
+            handle = self.register_public_resource(public_resource)
+            self.hold_public_resource(handle, entry_list)
+        self.send_packages(entry_list, handle, task_package_size)
+        return future_list
 
-    def receive_task_result(self, task_series_id=0, progress_bar=False):
+    def submit(self, _task: Task, public_resource=None):
+        """
+        Send the task at once and return its TaskFuture (see submit_tasks())
+        """
+        return self.submit_tasks([_task], task_package_size=1, public_resource=public_resource)[0]
 
-        result_list = []
-        index_list = []
-        n_total_tasks = self.n_task_remain_by_series_id[task_series_id]
-        for task_result in self.recieve_buffer_by_series_id[task_series_id]:
-            result_list.append(task_result.result)
-            index_list.append(task_result.index_of_in)
-            self.n_task_remain_by_series_id[task_series_id] -= 1
-        self.recieve_buffer_by_series_id[task_series_id] = []
+    def map(self, task_list, timeout=None, task_package_size=None, public_resource=None):
+        """
+        Like concurrent.futures.Executor.map(): submit the tasks at once (see submit_tasks()) and
+        return an iterator of their results in the same order, which raises the exception of a failed task
+        """
+        future_list = self.submit_tasks(task_list, task_package_size=task_package_size,
+                                        public_resource=public_resource)
+        end_time = time.monotonic() + timeout if timeout is not None else None
 
-        if progress_bar:
-            pbar = tqdm(total=n_total_tasks)
-            pbar.set_description(str(task_series_id))
-            last_progress_value = n_total_tasks
+        def result_iterator():
+            try:
+                for future in future_list:
+                    yield future.result(None if end_time is None else end_time - time.monotonic())
+            finally:
+                for future in future_list:
+                    future.cancel()
+
+        return result_iterator()
+
+    @staticmethod
+    def as_completed(future_list, timeout=None):
+        """
+        Return an iterator of the futures in the order they are done (see concurrent.futures.as_completed())
+        """
+        return concurrent.futures.as_completed(future_list, timeout=timeout)
 
-        while (self.n_task_remain_by_series_id[task_series_id] != 0):
+    def collect_results(self):
+        """
+        Run by the collecting thread. Set the futures of the arriving results and put the others
+        into the buffers of their series until the TaskManager is closed
+        """
+        while True:
             result_package = self.result_queue.get(True)
-            for task_result in result_package:
-                if task_result.series_id == task_series_id:
-                    result_list.append(task_result.result)
-                    index_list.append(task_result.index_of_in)
-                    self.n_task_remain_by_series_id[task_series_id] -= 1
+            if result_package is None:
+                return
+            future_result_list = []
+            with self.result_condition:
+                for task_result in result_package:
+                    self.record_runtime(task_result)
+                    handle = self.handle_by_index.pop(task_result.index_of_in, None)
+                    if handle in self.n_task_remain_by_handle:
+                        self.n_task_remain_by_handle[handle] -= 1
+                    future = self.future_by_index.pop(task_result.index_of_in, None)
+                    if future is not None:
+                        future_result_list.append((future, task_result.result))
+                    else:
+                        self.recieve_buffer_by_series_id.setdefault(task_result.series_id, []).append(task_result)
+                self.result_condition.notify_all()
+            # The callbacks of the futures run here, outside the lock
+            for future, result in future_result_list:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if isinstance(result, TaskFailure):
+                    future.set_exception(result.get_exception(TaskManager.FUTURE_SERIES_ID))
                 else:
-                    self.recieve_buffer_by_series_id[task_result.series_id].append(task_result)
+                    future.set_result(result)
 
-            if progress_bar:
-                pbar.update(last_progress_value - self.n_task_remain_by_series_id[task_series_id])
-                last_progress_value = self.n_task_remain_by_series_id[task_series_id]
+    def receive_task_result(self, task_series_id=0, progress_bar=False):
 
-            time.sleep(TaskManager.RECEIVE_PERIOD)
+        with self.result_condition:
+            n_total_tasks = self.n_task_remain_by_series_id[task_series_id]
+            if progress_bar:
+                pbar = tqdm(total=n_total_tasks)
+                pbar.set_description(str(task_series_id))
+                last_progress_value = 0
+            while len(self.recieve_buffer_by_series_id[task_series_id]) < n_total_tasks:
+                if progress_bar:
+                    pbar.update(len(self.recieve_buffer_by_series_id[task_series_id]) - last_progress_value)
+                    last_progress_value = len(self.recieve_buffer_by_series_id[task_series_id])
+                self.result_condition.wait()
+            task_result_list = self.recieve_buffer_by_series_id[task_series_id]
+            self.recieve_buffer_by_series_id[task_series_id] = []
+            self.n_task_remain_by_series_id[task_series_id] = 0
 
         if progress_bar:
+            pbar.update(n_total_tasks - last_progress_value)
             pbar.close()
 
+        self.release_received_public_resources()
+
+        for task_result in task_result_list:
+            if isinstance(task_result.result, TaskFailure):
+                raise task_result.result.get_exception(task_series_id)
+
+        index_list = [task_result.index_of_in for task_result in task_result_list]
         index_rank_list = numpy.argsort(numpy.array(index_list))
         ranked_result_list = []
 
         for i in range(len(index_list)):
-            ranked_result_list.append(result_list[index_rank_list[i]])
+            ranked_result_list.append(task_result_list[index_rank_list[i]].result)
         return ranked_result_list
 
+    # The seconds waited for a TaskRunner to finish its current package when closing
+    CLOSE_TIMEOUT = 1.0
+
     def close(self):
+        """
+        Stop the TaskRunners. They exit after their current package, and are terminated if they take too long.
+        The futures not done then raise an exception
+        """
+        for _processor in self.processor_list:
+            self.task_queue.put(None)
         for processor in self.processor_list:
-            processor.terminate()
+            processor.join(TaskManager.CLOSE_TIMEOUT)
+            if processor.is_alive():
+                processor.terminate()
+        self.result_queue.put(None)
+        self.collector.join()
+        for future in self.future_by_index.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(Exception("The TaskManager is closed before the task is done"))
+        self.future_by_index = dict()
+        for control_queue in self.control_queue_list:
+            # The registrations never read by the stopped runners should not block the exit
+            control_queue.cancel_join_thread()
+        self.shared_array_registry.close()
+        self.public_resource_dict = dict()
+        self.handle_by_key = dict()
+        self.n_task_remain_by_handle = dict()
+        self.handle_by_index = dict()
@@ -6,8 +6,15 @@ from ..Objective._objective import CostFunction
 
 
 class BasinhoppingOptimizer(ParameterOptimizer):
-
-    def __init__(self, random_initial=0.1, niter=10, temperature=0.1, stepsize=1e-6, tol=1e-6):
+    """
+    Attributes:
+        use_grad: If true, the gradient provided by cost.get_cost_obj_and_grad() (e.g. the adjoint gradient
+            of EnergyCost) is passed to BFGS by jac=True instead of approximating it by finite differences
+        n_evaluation: the number of evaluations of the cost (with or without gradient)
+        n_evaluation_saved: the number of cost evaluations the finite differences would have needed in addition
+    """
+
+    def __init__(self, random_initial=0.1, niter=10, temperature=0.1, stepsize=1e-6, tol=1e-6, use_grad=True):
         ParameterOptimizer.__init__(self)
 
         self.random_initial = random_initial
@@ -15,6 +22,9 @@ class BasinhoppingOptimizer(ParameterOptimizer):
         self.temperature = temperature
         self.stepsize = stepsize
         self.tol = tol
+        self.use_grad = use_grad
+        self.n_evaluation = 0
+        self.n_evaluation_saved = 0
 
     def run_optimization(self, circuit, cost: CostFunction):
         n_parameter = circuit.get_active_n_parameter()
@@ -22,12 +32,25 @@ class BasinhoppingOptimizer(ParameterOptimizer):
         if self.random_initial != 0:
             initial_parameter = random_list(-self.random_initial, self.random_initial, n_parameter)
 
-        obj = cost.get_cost_obj(circuit)
+        minimizer_kwargs = {"tol": self.tol, "method": 'BFGS'}
+        obj_and_grad = cost.get_cost_obj_and_grad(circuit) if self.use_grad else None
+        if obj_and_grad is not None:
+            obj = self.get_counted_obj(obj_and_grad, n_parameter)
+            minimizer_kwargs["jac"] = True
+        else:
+            obj = self.get_counted_obj(cost.get_cost_obj(circuit), 0)
 
         opt_result = basinhopping(obj, initial_parameter, niter=self.niter,
-                                  T=self.temperature, stepsize=self.stepsize, minimizer_kwargs={
-                "tol": self.tol, "method": 'BFGS'},
+                                  T=self.temperature, stepsize=self.stepsize, minimizer_kwargs=minimizer_kwargs,
                                   take_step=None, accept_test=None, callback=None,
                                   disp=False, niter_success=None)
 
         return opt_result.fun, opt_result.x
+
+    def get_counted_obj(self, obj, n_saved_per_call):
+        def counted_obj(parameter):
+            self.n_evaluation += 1
+            self.n_evaluation_saved += n_saved_per_call
+            return obj(parameter)
+
+        return counted_obj
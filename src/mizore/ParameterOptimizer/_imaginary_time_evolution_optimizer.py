@@ -10,6 +10,7 @@ from ..ParallelTaskRunner import TaskManager
 from ..ParallelTaskRunner._inner_product_task import InnerProductTask
 from ..Utilities.Visulization import draw_x_y_line_relation
 from ._vqs_utilities import *
+from ..Utilities.OperatorCache import get_cached_operator_matrix
 
 
 NOT_DEFINED = 999999
@@ -18,7 +19,9 @@ NOT_DEFINED = 999999
 class ImaginaryTimeEvolutionOptimizer(ParameterOptimizer):
     """
     This class implements imaginary time evolution described in npj Quantum Information (2019) 5:75.
-    Differing from the original paper, here we calculate the A and C matrix by finite difference rather than the swap test.
+    Differing from the original paper, here we calculate the A and C matrix from the derivative statevectors
+    (see calc_A_C_mat_by_derivative_states()), or by finite difference for the circuits with qubit_index_mapping,
+    rather than the swap test.
     """
 
     def __init__(self, get_best_result=True, random_adjust=0.01, diff=1e-4, stepsize=1e-1, n_step=10,
@@ -37,8 +40,6 @@ class ImaginaryTimeEvolutionOptimizer(ParameterOptimizer):
         self.fig_path = fig_path
         self.task_manager = task_manager
         self.calculate_quality = calculate_quality
-        if calculate_quality:
-            self.hamiltonian_square = None
 
     def save_fig(self, energy_list):
         if self.fig_path == None:
@@ -62,11 +63,16 @@ class ImaginaryTimeEvolutionOptimizer(ParameterOptimizer):
 
     def calc_derivative(self, circuit, hamiltonian):
 
-        adjusted_circuits = get_adjusted_circuit(self.diff, circuit)
-        n_parameter = len(adjusted_circuits)
-        mat_B = calc_B_mat(circuit, adjusted_circuits)
-        mat_C = (-1)*self.calc_C_mat(circuit, adjusted_circuits, hamiltonian)
-        mat_A = np.real(self.calc_A_mat(circuit, adjusted_circuits, mat_B))
+        if is_derivative_state_available(circuit):
+            mat_A, mat_C, _square_energy = calc_A_C_mat_by_derivative_states(
+                circuit, get_cached_operator_matrix(circuit.n_qubit, hamiltonian))
+            mat_A, mat_C = np.real(mat_A), (-1)*np.real(mat_C)
+        else:
+            adjusted_circuits = get_adjusted_circuit(self.diff, circuit)
+            mat_B = calc_B_mat(circuit, adjusted_circuits)
+            mat_C = (-1)*self.calc_C_mat(circuit, adjusted_circuits, hamiltonian)
+            mat_A = np.real(self.calc_A_mat(circuit, adjusted_circuits, mat_B))
+        n_parameter = len(mat_C)
         try:
             derivative = linalg.solve(mat_A, mat_C)
         except linalg.LinAlgError:
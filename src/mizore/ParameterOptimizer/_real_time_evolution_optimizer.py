@@ -1,5 +1,6 @@
 from ._imaginary_time_evolution_optimizer import *
 from ..Utilities.Tools import qubit_operator2matrix, random_list
+from ..Utilities.OperatorCache import get_cached_operator_matrix
 from ..Blocks._utilities import get_circuit_complete_amplitudes, evaluate_off_diagonal_term_by_amps, get_circuit_energy, get_inner_two_circuit_product
 
 
@@ -15,40 +16,57 @@ class RealTimeEvolutionOptimizer(ImaginaryTimeEvolutionOptimizer):
         self.quality_list = []
         self.evolution_time_list = []
 
-    def calc_derivative(self, circuit, hamiltonian, hamiltonian_square=None):
-        adjusted_circuits = get_adjusted_circuit(self.diff, circuit)
-        n_parameter = len(adjusted_circuits)
-        mat_B = calc_B_mat(circuit, adjusted_circuits)
-        mat_C = np.imag(self.calc_C_mat(
-            circuit, adjusted_circuits, hamiltonian))
-        mat_A = np.real(self.calc_A_mat(circuit, adjusted_circuits, mat_B))
+    def calc_derivative(self, circuit, hamiltonian, hamiltonian_square=None, with_quality=False):
+        """
+        Return the derivative of the parameters, and also the quality (see calc_RTE_quality())
+        if with_quality or hamiltonian_square is given. hamiltonian_square itself is not used
+        """
+        with_quality = with_quality or hamiltonian_square is not None
+        if is_derivative_state_available(circuit):
+            if self.hamiltonian_mat is None:
+                self.hamiltonian_mat = get_cached_operator_matrix(
+                    circuit.n_qubit, hamiltonian)
+            mat_A, mat_C, square_energy = calc_A_C_mat_by_derivative_states(circuit, self.hamiltonian_mat)
+            mat_A, mat_C = np.real(mat_A), np.imag(mat_C)
+        else:
+            adjusted_circuits = get_adjusted_circuit(self.diff, circuit)
+            mat_B = calc_B_mat(circuit, adjusted_circuits)
+            mat_C = np.imag(self.calc_C_mat(
+                circuit, adjusted_circuits, hamiltonian))
+            mat_A = np.real(self.calc_A_mat(circuit, adjusted_circuits, mat_B))
+            square_energy = get_circuit_square_energy(circuit, self.hamiltonian_mat) if with_quality else None
+        n_parameter = len(mat_C)
         try:
             derivative = linalg.solve(mat_A, mat_C)
         except linalg.LinAlgError:
             derivative = np.array(random_list(-self.random_adjust,
                                               self.random_adjust, n_parameter))
-        if hamiltonian_square is not None:
+        if with_quality:
             quality = self.calc_quality(
-                mat_A, mat_C, derivative, hamiltonian_square, circuit)
+                mat_A, mat_C, derivative, circuit=circuit, square_energy=square_energy)
             return derivative, quality
         else:
             return derivative
 
     def calc_C_mat(self, circuit, adjusted_circuits, hamiltonian):
         if self.hamiltonian_mat is None:
-            self.hamiltonian_mat = qubit_operator2matrix(
+            self.hamiltonian_mat = get_cached_operator_matrix(
                 circuit.n_qubit, hamiltonian)
         return calc_C_mat_by_hamiltonian_mat(self.hamiltonian_mat, self.diff, circuit, adjusted_circuits)
 
-    def calc_quality(self, mat_A, mat_C, derivative, hamiltonian_square, circuit):
-        return calc_RTE_quality(hamiltonian_square, mat_A, mat_C, derivative, circuit)
+    def calc_quality(self, mat_A, mat_C, derivative, hamiltonian_square=None, circuit=None, square_energy=None):
+        """
+        Args:
+            hamiltonian_square: not used, <H^2> is evaluated as ||H|psi>||^2 (see get_circuit_square_energy())
+            square_energy: <psi|H^2|psi> of the circuit if it is already known
+        """
+        if square_energy is None:
+            square_energy = get_circuit_square_energy(circuit, self.hamiltonian_mat)
+        return calc_RTE_quality(square_energy, mat_A, mat_C, derivative)
 
     def run_optimization(self, _circuit: BlockCircuit, hamiltonian, n_step):
         print("Unfinished")
         assert False
-        hamiltonian_square = hamiltonian*hamiltonian
-        hamiltonian_square.compress()
-
         circuit = _circuit.duplicate()
 
         n_parameter = circuit.count_n_parameter_on_active_position()
@@ -66,7 +84,7 @@ class RealTimeEvolutionOptimizer(ImaginaryTimeEvolutionOptimizer):
 
         for n_step_evolved in range(0, n_step):
             derivative, quality = self.calc_derivative(
-                circuit, hamiltonian, hamiltonian_square=hamiltonian_square)
+                circuit, hamiltonian, with_quality=True)
             if quality >= self.quality_cutoff:
                 break
             derivative_norm = linalg.norm(derivative)
@@ -81,9 +99,6 @@ class RealTimeEvolutionOptimizer(ImaginaryTimeEvolutionOptimizer):
 
     def do_time_evolution(self, _circuit: BlockCircuit, hamiltonian, evolution_time, max_n_step=500):
 
-        self.hamiltonian_square = hamiltonian*hamiltonian
-        self.hamiltonian_square.compress()
-
         circuit = _circuit.duplicate()
         n_parameter = circuit.count_n_parameter_on_active_position()
         self.evolution_time_list = []
@@ -99,7 +114,7 @@ class RealTimeEvolutionOptimizer(ImaginaryTimeEvolutionOptimizer):
 
         while True:
             derivative, quality = self.calc_derivative(
-                circuit, hamiltonian, self.hamiltonian_square)
+                circuit, hamiltonian, with_quality=True)
             if quality >= self.quality_cutoff:
                 break
 
@@ -131,7 +146,6 @@ class RealTimeEvolutionOptimizer(ImaginaryTimeEvolutionOptimizer):
 
     def do_adiabatic_time_evolution(self, _circuit: BlockCircuit, init_hamiltonian, final_hamiltonian, evolution_time, final_time=-1, start_time=0, max_n_step=500):
 
-        self.hamiltonian_square = None
         if final_time < 0:
             final_time = evolution_time
 
@@ -152,11 +166,11 @@ class RealTimeEvolutionOptimizer(ImaginaryTimeEvolutionOptimizer):
 
             hamiltonian = get_hamiltoian_in_adiabatic(
                 init_hamiltonian, final_hamiltonian, final_time, start_time+evolved_time)
-            hamiltonian_square = square_operator(hamiltonian)
-            self.hamiltonian_mat=None
+            # The Hamiltonian changes every step, so its matrix is not worth caching on disk
+            self.hamiltonian_mat = qubit_operator2matrix(circuit.n_qubit, hamiltonian)
 
             derivative, quality = self.calc_derivative(
-                circuit, hamiltonian, hamiltonian_square)
+                circuit, hamiltonian, with_quality=True)
             if quality >= self.quality_cutoff:
                 break
 
@@ -1,5 +1,6 @@
 from ._real_time_evolution_optimizer import *
 from ..Utilities.Tools import qubit_operator2matrix, random_list
+from ..Utilities.OperatorCache import get_cached_operator_matrix
 from ..Blocks._utilities import get_circuit_complete_amplitudes, evaluate_off_diagonal_term_by_amps, get_circuit_energy, get_inner_two_circuit_product
 
 
@@ -7,26 +8,37 @@ class RTEAnalyticalOptimizer(RealTimeEvolutionOptimizer):
     def __init__(self, *args, **kwargs):
         RealTimeEvolutionOptimizer.__init__(self, *args, **kwargs)
 
-    def calc_derivative(self, circuit, hamiltonian, hamiltonian_square=None):
-        derivative_circuits = get_derivative_circuit(circuit)
-        mat_C,mat_A=self.calc_C_A_mat(circuit, derivative_circuits, hamiltonian)
+    def calc_derivative(self, circuit, hamiltonian, hamiltonian_square=None, with_quality=False):
+        with_quality = with_quality or hamiltonian_square is not None
+        if is_derivative_state_available(circuit):
+            if self.hamiltonian_mat is None:
+                self.hamiltonian_mat = get_cached_operator_matrix(
+                    circuit.n_qubit, hamiltonian)
+            mat_A, mat_C, square_energy = calc_A_C_mat_by_derivative_states(circuit, self.hamiltonian_mat)
+            # The same derivatives as those of the derivative circuits of get_derivative_circuit()
+            sign_list = get_derivative_circuit_signs(circuit)
+            mat_A, mat_C = mat_A * np.outer(sign_list, sign_list), mat_C * sign_list
+        else:
+            derivative_circuits = get_derivative_circuit(circuit)
+            mat_C,mat_A=self.calc_C_A_mat(circuit, derivative_circuits, hamiltonian)
+            square_energy = get_circuit_square_energy(circuit, self.hamiltonian_mat) if with_quality else None
         mat_C = np.imag(mat_C)
         mat_A = np.real(mat_A)
         try:
             derivative = linalg.solve(mat_A, mat_C)
         except linalg.LinAlgError:
-            n_parameter = len(derivative_circuits)
+            n_parameter = len(mat_C)
             derivative = np.array(random_list(-self.random_adjust,
                                               self.random_adjust, n_parameter))
-        if hamiltonian_square is not None:
-            quality=self.calc_quality(mat_A, mat_C, derivative, hamiltonian_square, circuit)
+        if with_quality:
+            quality=self.calc_quality(mat_A, mat_C, derivative, circuit=circuit, square_energy=square_energy)
             return derivative,quality
         else:
             return derivative
 
     def calc_C_A_mat(self, circuit, derivative_circuits, hamiltonian):
         if self.hamiltonian_mat is None:
-            self.hamiltonian_mat = qubit_operator2matrix(
+            self.hamiltonian_mat = get_cached_operator_matrix(
                 circuit.n_qubit, hamiltonian)
         if self.task_manager == None or len(derivative_circuits)<=1:
             mat_C=self.calc_C_mat(circuit, derivative_circuits, hamiltonian)
@@ -43,6 +55,6 @@ class RTEAnalyticalOptimizer(RealTimeEvolutionOptimizer):
 
     def calc_C_mat(self, circuit, derivative_circuits, hamiltonian):
         if self.hamiltonian_mat is None:
-            self.hamiltonian_mat = qubit_operator2matrix(
+            self.hamiltonian_mat = get_cached_operator_matrix(
                 circuit.n_qubit, hamiltonian)
         return calc_C_mat_by_hamiltonian_mat_analytical(self.hamiltonian_mat, circuit, derivative_circuits)
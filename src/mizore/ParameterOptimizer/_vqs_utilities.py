@@ -1,10 +1,37 @@
-from ..Blocks._utilities import get_circuit_complete_amplitudes, evaluate_off_diagonal_term_by_amps, get_circuit_energy, get_inner_two_circuit_product
+from ..Blocks._utilities import get_circuit_complete_amplitudes, evaluate_off_diagonal_term_by_amps, get_circuit_energy, get_inner_two_circuit_product, \
+    cache_circuit_amplitudes
 import numpy as np
 import time
+from copy import copy
 from ..ParallelTaskRunner._inner_product_task import InnerProductTask
+from ..Blocks._adjoint_utilities import is_derivative_state_available, get_circuit_derivative_states
 LARGE_NUMBER = 99999
 
-def calc_RTE_quality_by_circuit(circuit, hamiltonian_mat, hamiltonian_square, diff):
+def calc_A_C_mat_by_derivative_states(circuit, hamiltonian_mat):
+    """
+    Return (mat_A, mat_C, square_energy) with mat_A[i][j] = <d_i psi|d_j psi>, mat_C[i] = <d_i psi|H|psi>
+    and square_energy = <psi|H^2|psi>. mat_C follows calc_C_mat_by_hamiltonian_mat().
+    The derivative states V are computed once (see get_circuit_derivative_states()),
+    so mat_A is the Gram matrix V^H V and mat_C is one product with H|psi>,
+    whose squared norm is also square_energy
+    """
+    amplitudes, derivative_states = get_circuit_derivative_states(circuit)
+    hamiltonian_applied = hamiltonian_mat.dot(amplitudes)
+    mat_A = np.conjugate(derivative_states) @ derivative_states.T
+    mat_C = np.conjugate(derivative_states) @ hamiltonian_applied
+    square_energy = float(np.real(np.vdot(hamiltonian_applied, hamiltonian_applied)))
+    return mat_A, mat_C, square_energy
+
+def get_circuit_square_energy(circuit, hamiltonian_mat):
+    """
+    Return <psi|H^2|psi> of the circuit as ||H|psi>||^2, so the operator H^2 is never built
+    """
+    hamiltonian_applied = hamiltonian_mat.dot(get_circuit_complete_amplitudes(circuit))
+    return float(np.real(np.vdot(hamiltonian_applied, hamiltonian_applied)))
+
+def calc_RTE_quality_by_circuit(circuit, hamiltonian_mat, diff):
+    if is_derivative_state_available(circuit):
+        return calc_RTE_quality_by_derivative_states(circuit, hamiltonian_mat)
 
     adjusted_circuits = get_adjusted_circuit(diff, circuit)
     mat_B = calc_B_mat(circuit, adjusted_circuits)
@@ -17,11 +44,13 @@ def calc_RTE_quality_by_circuit(circuit, hamiltonian_mat, hamiltonian_square, di
     except np.linalg.LinAlgError:
         return LARGE_NUMBER
     quality = calc_RTE_quality(
-        hamiltonian_square, mat_A, mat_C, derivative, circuit)
+        get_circuit_square_energy(circuit, hamiltonian_mat), mat_A, mat_C, derivative)
     return abs(quality)
 
 
-def calc_RTE_quality_by_circuit_analytical(circuit, hamiltonian_mat, hamiltonian_square):
+def calc_RTE_quality_by_circuit_analytical(circuit, hamiltonian_mat):
+    if is_derivative_state_available(circuit):
+        return calc_RTE_quality_by_derivative_states(circuit, hamiltonian_mat)
 
     derivative_circuits = get_derivative_circuit(circuit)
     mat_C = np.imag(calc_C_mat_by_hamiltonian_mat_analytical(
@@ -29,7 +58,14 @@ def calc_RTE_quality_by_circuit_analytical(circuit, hamiltonian_mat, hamiltonian
     mat_A = np.real(calc_A_mat_analytical_0(circuit, derivative_circuits))
     derivative=calc_derivative(mat_A,mat_C)
     quality = calc_RTE_quality(
-        hamiltonian_square, mat_A, mat_C, derivative, circuit)
+        get_circuit_square_energy(circuit, hamiltonian_mat), mat_A, mat_C, derivative)
+    return abs(quality)
+
+def calc_RTE_quality_by_derivative_states(circuit, hamiltonian_mat):
+    mat_A, mat_C, square_energy = calc_A_C_mat_by_derivative_states(circuit, hamiltonian_mat)
+    mat_A, mat_C = np.real(mat_A), np.imag(mat_C)
+    derivative = calc_derivative(mat_A, mat_C)
+    quality = calc_RTE_quality(square_energy, mat_A, mat_C, derivative)
     return abs(quality)
 
 def calc_derivative(mat_A,mat_C):
@@ -40,26 +76,35 @@ def calc_derivative(mat_A,mat_C):
 
 def calc_quality_derivative_by_obj_parallel_ana(task_manager,quality_cost,circuit):
     derivative_circuits=get_derivative_circuit(circuit)
-    return calc_derivative_quality_parallel_ana(task_manager,quality_cost.hamiltonian_mat,quality_cost.hamiltonian_square,circuit,derivative_circuits)
+    return calc_derivative_quality_parallel_ana(task_manager,quality_cost.hamiltonian_mat,circuit,derivative_circuits)
 
-def calc_derivative_quality_parallel_ana(task_manager,hamiltonian_mat,hamiltonian_square,circuit,derivative_circuits):
+def calc_derivative_quality_parallel_ana(task_manager,hamiltonian_mat,circuit,derivative_circuits):
     mat_C,mat_A=calc_mat_C_A_parallel_ana(task_manager,hamiltonian_mat,circuit,derivative_circuits)
     derivative=calc_derivative(mat_A,mat_C)
     quality = calc_RTE_quality(
-        hamiltonian_square, mat_A, mat_C, derivative, circuit)
+        get_circuit_square_energy(circuit, hamiltonian_mat), mat_A, mat_C, derivative)
     return derivative,quality
 
 def calc_mat_C_A_parallel_ana(task_manager,hamiltonian_mat,circuit,derivative_circuits):
-    mat_C_id=add_calc_C_mat_analytical_task(task_manager,hamiltonian_mat,circuit,derivative_circuits)
-    task_manager.flush(task_package_size=1)
+    # The matrix is shared through shared memory instead of being pickled with the task,
+    # and released as soon as mat_C is received, so it is not kept by the TaskRunners
+    hamiltonian_handle = task_manager.register_public_resource({"hamiltonian_mat": hamiltonian_mat})
+    mat_C_id=add_calc_C_mat_analytical_task(task_manager,None,circuit,derivative_circuits)
+    task_manager.flush(task_package_size=1, public_resource=hamiltonian_handle)
     mat_A_id=add_calc_A_mat_analytical_tasks(task_manager,circuit,derivative_circuits)
     task_manager.flush(task_package_size=20)
     mat_C=task_manager.receive_task_result(task_series_id=mat_C_id)[0]
+    task_manager.release_public_resource(hamiltonian_handle)
     mat_A=calc_A_mat_analytical_by_task_results(task_manager,mat_A_id,len(derivative_circuits))
     return mat_C,mat_A
     
 
-def calc_RTE_quality(hamiltonian_square, mat_A, mat_C, derivative, circuit):
+def calc_RTE_quality(square_energy, mat_A, mat_C, derivative):
+    """
+    Return the McLachlan distance sum_ij A_ij d_i d_j - 2 sum_i C_i d_i + <H^2>
+    Args:
+        square_energy: <psi|H^2|psi>, see get_circuit_square_energy()
+    """
     n_parameter = len(mat_C)
     quality = 0
     for i in range(n_parameter):
@@ -67,7 +112,7 @@ def calc_RTE_quality(hamiltonian_square, mat_A, mat_C, derivative, circuit):
             quality += mat_A[i][j]*derivative[i]*derivative[j]
     for i in range(n_parameter):
         quality -= 2*mat_C[i]*derivative[i]
-    quality += get_circuit_energy(circuit, hamiltonian_square)
+    quality += square_energy
     if quality < -1e-1:
         print(quality)
         print(derivative)
@@ -87,6 +132,19 @@ def get_derivative_circuit(circuit):
     return derivative_circuits
 
 
+def get_derivative_circuit_signs(circuit):
+    """
+    Return the signs s_i, where the i-th circuit of get_derivative_circuit() prepares s_i * d|psi>/d theta_i
+    (see Block.get_derivative_block_sign())
+    """
+    sign_list = []
+    for position in circuit.active_position_list:
+        active_block = circuit.block_list[position]
+        for in_block_position in range(active_block.n_parameter):
+            sign_list.append(active_block.get_derivative_block_sign(in_block_position))
+    return np.array(sign_list)
+
+
 def get_adjusted_circuit(diff, circuit):
     adjusted_circuits = []
     for position in circuit.active_position_list:
@@ -148,7 +206,7 @@ def calc_C_mat_by_hamiltonian_mat(hamiltonian_mat, diff, circuit, adjusted_circu
     mat_C = np.array([0.0 for col in range(
         len(adjusted_circuits))], dtype=complex)
     origin_energy = np.dot(np.conjugate(circuit_amp),
-                           np.dot(hamiltonian_mat, circuit_amp))
+                           hamiltonian_mat.dot(circuit_amp))
     for i in range(len(adjusted_circuits)):
         term_value = evaluate_off_diagonal_term_by_amps(
             circuit_amp, adjusted_circuit_amps[i], hamiltonian_mat)-origin_energy
@@ -268,6 +326,9 @@ def calc_A_mat_parallel(task_manager, diff, circuit, adjusted_circuits, mat_B):
 
 
 def calc_B_mat(circuit, adjusted_circuits):
+    # The state of the circuit is simulated once for all the inner products
+    circuit = copy(circuit)
+    cache_circuit_amplitudes(circuit)
     mat_B = [get_inner_two_circuit_product(
         circuit, adjusted_circuits[i]) for i in range(len(adjusted_circuits))]
     return mat_B
@@ -2,6 +2,8 @@
 import numpy as np
 import scipy.sparse.linalg as slg
 import scipy.linalg as dlg
+from scipy.sparse import issparse
+from ..Utilities.OperatorCache import get_cached_operator_matrix, get_cached_ground_state
 PauliI = np.array([[1, 0], [0, 1]], np.complex)
 PauliX = np.array([[0, 1], [1, 0]], np.complex)
 PauliY = np.array([[0, -1j], [1j, 0]], np.complex)
@@ -9,52 +11,121 @@ PauliZ = np.array([[1, 0], [0, -1]], np.complex)
 P = [PauliI, PauliX, PauliY, PauliZ]
 pauli_dict = {"I":PauliI,"X":PauliX,"Y":PauliY, "Z":PauliZ}
 
-def solve_ground_state_energy(energy_obj):
-    return solve_ground_state_of_operator(energy_obj.n_qubit,energy_obj.hamiltonian)[0]
+# The Hamiltonian is applied by its CSR matrix when the matrix takes less bytes than this,
+# otherwise it is applied matrix-free from the Pauli terms (see Utilities.Tools.qubit_operator2matrix)
+GROUND_STATE_MEMORY_BUDGET = 1 << 30
+# Spaces not larger than this are diagonalized densely
+DENSE_DIM_LIMIT = 64
+# The weight of the random vector mixed into the warm start
+WARM_START_NOISE = 1e-3
+# The seed of the random vector, which is drawn from its own generator so the solves are reproducible
+# and do not change the global random state of NumPy
+WARM_START_SEED = 0
 
-def solve_ground_state(energy_obj):
-    return solve_ground_state_of_operator(energy_obj.n_qubit,energy_obj.hamiltonian)
+def solve_ground_state_energy(energy_obj, n_particle=None):
+    return solve_ground_state(energy_obj, n_particle=n_particle)[0]
 
-def solve_ground_state_of_operator(n_qubit,hamiltonian):
-    return solve_ground_state_by_mat(qubit_operator2matrix(n_qubit,hamiltonian))
+def solve_ground_state(energy_obj, init_vector=None, n_particle=None):
+    """
+    Get the ground state (energy, vector) of the Hamiltonian of an EnergyObjective.
+    When init_vector is not given, the state prepared by energy_obj.init_block (e.g. the HF determinant)
+    is used as the warm start. See solve_ground_state_of_operator()
+    """
+    if init_vector is None and energy_obj.init_block is not None:
+        from ..Blocks import BlockCircuit
+        from ..Blocks._utilities import get_circuit_complete_amplitudes
+        init_vector = get_circuit_complete_amplitudes(BlockCircuit(energy_obj.n_qubit, energy_obj.init_block))
+    return solve_ground_state_of_operator(energy_obj.n_qubit, energy_obj.hamiltonian,
+                                          init_vector=init_vector, n_particle=n_particle)
+
+def solve_ground_state_of_operator(n_qubit, hamiltonian, init_vector=None, n_particle=None,
+                                   memory_budget=GROUND_STATE_MEMORY_BUDGET):
+    """
+    Get the ground state (energy, vector) by Lanczos (ARPACK with k=1) without building the dense matrix
+    Args:
+        hamiltonian: a QubitOperator or a PauliSum
+        init_vector: (optional) the warm start of length 2^n_qubit
+        n_particle: (optional) only search the states with n_particle qubits in |1>,
+            i.e. the particle number sector in the Jordan-Wigner encoding. The Hamiltonian should conserve it
+        memory_budget: the largest CSR matrix (in bytes) to build. Larger Hamiltonians are applied matrix-free
+    Returns:
+        the ground energy and the ground state of length 2^n_qubit
+    The matrix and the result are kept in the on-disk cache if it is enabled, see Utilities.OperatorCache
+    """
+    def solve():
+        return _solve_ground_state_of_operator(n_qubit, hamiltonian, init_vector, n_particle, memory_budget)
+    return get_cached_ground_state(n_qubit, hamiltonian, n_particle, solve)
+
+def _solve_ground_state_of_operator(n_qubit, hamiltonian, init_vector, n_particle, memory_budget):
+    h = get_cached_operator_matrix(n_qubit, hamiltonian, memory_budget=memory_budget)
+    sector = None
+    if n_particle is not None:
+        sector = get_particle_number_sector(n_qubit, n_particle)
+        if issparse(h):
+            h = h[sector][:, sector]
+        else:
+            h = SectorOperator(h, sector)
+    n_dim = h.shape[0]
+    if n_dim <= DENSE_DIM_LIMIT:
+        dense = h.toarray() if issparse(h) else h.dot(np.eye(n_dim))
+        eig, eigvec = dlg.eigh(dense)
+    else:
+        v0 = None
+        if init_vector is not None:
+            v0 = np.array(init_vector, dtype=complex)
+            if sector is not None:
+                v0 = v0[sector]
+            # Mix a little random vector, or the Krylov space can be trapped if v0 is an eigenstate
+            noise = np.random.RandomState(WARM_START_SEED).randn(n_dim)
+            v0 = v0 / max(np.linalg.norm(v0), 1e-12) + WARM_START_NOISE * noise / np.linalg.norm(noise)
+        eig, eigvec = slg.eigsh(h, k=1, which="SA", v0=v0, maxiter=100000)
+    vector = eigvec[:, 0]
+    if sector is not None:
+        full_vector = np.zeros(1 << n_qubit, dtype=vector.dtype)
+        full_vector[sector] = vector
+        vector = full_vector
+    return eig[0], vector
+
+def get_particle_number_sector(n_qubit, n_particle):
+    """
+    Return the indices of the basis states with n_particle qubits in |1>
+    """
+    basis = np.arange(1 << n_qubit)
+    n_one = np.zeros(1 << n_qubit, dtype=np.int64)
+    for i in range(n_qubit):
+        n_one += (basis >> i) & 1
+    return np.nonzero(n_one == n_particle)[0]
+
+class SectorOperator(slg.LinearOperator):
+    """
+    The operator restricted to the subspace spanned by the basis states in sector
+    """
+
+    def __init__(self, operator, sector):
+        slg.LinearOperator.__init__(self, dtype=complex, shape=(len(sector), len(sector)))
+        self.operator = operator
+        self.sector = sector
+
+    def _matvec(self, vector):
+        full_vector = np.zeros(self.operator.shape[0], dtype=complex)
+        full_vector[self.sector] = np.ravel(vector)
+        return self.operator.dot(full_vector)[self.sector].reshape(np.shape(vector))
+
+    def _adjoint(self):
+        return SectorOperator(self.operator.H, self.sector)
 
 def solve_ground_state_by_mat(h,nmax=3000):
-  """Get a ground state"""
+  """Get a ground state
+  h can be a dense matrix, a sparse matrix or a LinearOperator"""
   info = False
-  if h.shape[0]>nmax:
+  if h.shape[0]>nmax or isinstance(h, slg.LinearOperator):
     if info: print("Calling ARPACK")
-    eig,eigvec = slg.eigsh(h,k=10,which="SA",maxiter=100000)
-    eig = np.sort(eig)
+    eig,eigvec = slg.eigsh(h,k=min(10,h.shape[0]-2),which="SA",maxiter=100000)
+    order = np.argsort(eig)
+    eig,eigvec = eig[order],eigvec[:,order]
   else:
     if info: print("Full diagonalization")
+    if issparse(h):
+      h = h.toarray()
     eig,eigvec = dlg.eigh(h)
   return eig[0],eigvec.transpose()[0]
-
-def qubit_operator2matrix(n_qubit,hamiltonian):
-    n_dim = 2**n_qubit
-    mat = np.zeros((n_dim, n_dim), complex)
-    for pauli_and_coff in hamiltonian.get_operators():
-        for string_pauli in pauli_and_coff.terms:
-            if not string_pauli:
-                mat += pauli_and_coff.terms[string_pauli]*np.eye(n_dim)
-                continue
-            string_pauli_i=0
-            if string_pauli[0][0]==0:
-                pauli0 = pauli_dict[string_pauli[0][1]]
-                string_pauli_i+=1
-            else:
-                pauli0 = PauliI
-            for i in range(1,n_qubit):
-                if string_pauli_i==len(string_pauli):
-                    pauli0 = np.kron(PauliI,pauli0)
-                    continue
-                if i == string_pauli[string_pauli_i][0]:
-                    pauli0 = np.kron(pauli_dict[string_pauli[string_pauli_i][1]],pauli0)
-                    string_pauli_i+=1
-                else:
-                    pauli0 = np.kron(PauliI,pauli0)
-            
-            mat += pauli_and_coff.terms[string_pauli]*pauli0
-    return mat
-    
-
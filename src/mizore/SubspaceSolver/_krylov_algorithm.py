@@ -2,6 +2,9 @@ from ..Blocks import BlockCircuit
 from ..Blocks._time_evolution_block import TimeEvolutionBlock
 from ..Blocks._trotter_evolution_block import TrotterTimeEvolutionBlock
 from ..Utilities.Tools import get_operator_n_qubit
+from ..Blocks._utilities import get_circuit_complete_amplitudes
+from ..Backends._numpy_backend import StateVector
+import numpy as np
 
 
 def generate_krylov_circuits(init_circuit: BlockCircuit, hamiltonian, delta_t, n_circuit):
@@ -34,6 +37,47 @@ def generate_trotter_krylov_circuits(init_circuit: BlockCircuit, hamiltonian, de
     return circuits
 
 
+def generate_krylov_states(init_circuits, hamiltonian, delta_t, n_circuit, n_trotter_step=None):
+    """
+    Generate the Krylov basis of generate_krylov_circuits() (or generate_trotter_krylov_circuits() if
+    n_trotter_step is given) for each of the init_circuits together with the statevectors of the basis.
+    The k-th state is obtained by applying U(delta_t) to the (k-1)-th one instead of simulating
+    the k-th circuit, and the states of all the init_circuits are evolved together as a batch,
+    so the cost is linear in n_circuit. The circuits are kept for running on the quantum computers.
+    Args:
+        init_circuits: a BlockCircuit or a list of them
+    Returns:
+        (circuits, states), where circuits are ordered by the init circuit and then by k = 1,...,n_circuit,
+        and states[i] is the statevector produced by circuits[i].
+        They can be passed to SubspaceSolver(circuits, hamiltonian, basis_states=states)
+    """
+    if isinstance(init_circuits, BlockCircuit):
+        init_circuits = [init_circuits]
+    n_init_circuit = len(init_circuits)
+    n_qubit = init_circuits[0].n_qubit
+    if n_trotter_step is None:
+        step_block = TimeEvolutionBlock(hamiltonian, init_angle=delta_t)
+    else:
+        step_block = TrotterTimeEvolutionBlock(hamiltonian, n_trotter_step=n_trotter_step, evolution_time=delta_t)
+
+    circuits = []
+    for init_circuit in init_circuits:
+        if n_trotter_step is None:
+            circuits.extend(generate_krylov_circuits(init_circuit, hamiltonian, delta_t, n_circuit))
+        else:
+            circuits.extend(generate_trotter_krylov_circuits(init_circuit, hamiltonian, delta_t, n_trotter_step,
+                                                             n_circuit))
+
+    init_states = np.array([get_circuit_complete_amplitudes(init_circuit) for init_circuit in init_circuits],
+                           dtype=complex)
+    register = StateVector(n_qubit, init_states, n_batch=n_init_circuit)
+    states = np.zeros((n_init_circuit, n_circuit, 1 << n_qubit), dtype=complex)
+    for k in range(n_circuit):
+        step_block.apply([0.0], register)
+        states[:, k] = register.amplitudes
+    return circuits, states.reshape(n_init_circuit * n_circuit, 1 << n_qubit)
+
+
 def generate_trotter_krylov_circuits_by_total_step(init_circuit: BlockCircuit, hamiltonian, delta_t,n_trotter_step, n_circuit):
     circuits = [0] * n_circuit
     for i in range(1, n_circuit + 1):
@@ -1,13 +1,24 @@
 from ..Blocks import BlockCircuit
 import numpy as np
-from ..Blocks._utilities import get_inner_two_circuit_product
+from ..Blocks._utilities import get_inner_two_circuit_product, cache_circuit_amplitudes, \
+    get_circuit_complete_amplitudes
 from ..Blocks._pauli_gates_block import PauliGatesBlock
+from ..Blocks._sparse_circuit_utilities import get_circuit_factorized_state
+from ..Backends._factorized_backend import get_factorized_overlap
 from scipy.linalg import eigh
 from ..ParallelTaskRunner import TaskManager
 from ..ParallelTaskRunner._mat_term_task import MatrixTermTask
+from ..ParallelTaskRunner._amplitude_task import CompleteAmplitudeTask
+from ..Utilities.PauliSum import PauliSum
+from ..Utilities.OperatorCache import get_cached_operator_matrix
 from tqdm import tqdm
 from ..Utilities.Iterators import iter_partial_operators
 import time
+import tempfile
+from copy import copy
+
+# The default number of bytes of the statevectors held in memory by the Gram-matrix mode
+GRAM_MEMORY_BUDGET = 1 << 31
 
 class SubspaceSolver:
     """
@@ -19,19 +30,32 @@ class SubspaceSolver:
     Hc=ScE, where H_{ij}=<psi_i|H|psi_j>, S_{ij}=<psi_i|psi_j>, E is the eigenvalue and c is the eigenvector
     The terms can be evaluated efficiently by quantum computers.
     The main problem is how to construct the subspace.
+
+    With gram_matrix=True, every circuit is simulated only once (in parallel if there is a task_manager)
+    into the statevectors V = [|psi_1>,...,|psi_N>], and S = V^H V, H = V^H (H V) are taken by matrix products.
+    When V does not fit into memory_budget, it is kept in a temporary file and processed by blocks of columns.
+    The statevectors can also be given as basis_states, e.g. by generate_krylov_states(), and are not simulated.
+
     Attributes:
         circuit_list: the list of circuits produce the state set Psi
         hamiltonian: the objective hamiltonian
+        gram_matrix: whether to use the Gram-matrix mode
+        memory_budget: the number of bytes of statevectors held in memory by the Gram-matrix mode
+        basis_states: (optional) the (n_basis x 2^n_qubit) statevectors of the circuits, which turns on gram_matrix
         S_mat, H_mat: will be generated after execute()
         eigvals, eigvecs, ground_energy, ground_state will all be generated after execute
     """
 
-    def __init__(self, circuit_list, hamiltonian, task_manager=None, progress_bar=False, sparse_circuit=False):
+    def __init__(self, circuit_list, hamiltonian, task_manager=None, progress_bar=False, sparse_circuit=False,
+                 gram_matrix=False, memory_budget=GRAM_MEMORY_BUDGET, basis_states=None):
 
         self.circuit_list = circuit_list
         self.task_manager = task_manager
         self.progress_bar = progress_bar
         self.sparse_circuit = sparse_circuit
+        self.gram_matrix = gram_matrix or basis_states is not None
+        self.basis_states = basis_states
+        self.memory_budget = memory_budget
         self.n_basis = len(self.circuit_list)
         self.S_mat = np.array([[0.0] * self.n_basis] * self.n_basis, dtype=complex)
         self.H_mat = np.array([[0.0] * self.n_basis] * self.n_basis, dtype=complex)
@@ -50,11 +74,16 @@ class SubspaceSolver:
 
     def execute(self):
         print("QSD solver Started")
-        print("Calculating S matrix")
-        self.calc_S_mat()
-        revise_little_negative(self.S_mat)
-        print("Calculating H matrix")
-        self.calc_H_mat()
+        if self.gram_matrix:
+            print("Calculating S and H matrix")
+            self.calc_S_H_mat_by_gram()
+            revise_little_negative(self.S_mat)
+        else:
+            print("Calculating S matrix")
+            self.calc_S_mat()
+            revise_little_negative(self.S_mat)
+            print("Calculating H matrix")
+            self.calc_H_mat()
         
         # print(self.H_mat)
         # print(self.S_mat)
@@ -69,12 +98,16 @@ class SubspaceSolver:
     def calc_S_mat(self):
         if self.task_manager != None:
             self.S_mat=self._calc_mat_term_parellel(None)
+        elif self.sparse_circuit:
+            self.S_mat=self._calc_mat_term_sparse(None)
         else:
             self._calc_S_mat_0()
 
     def calc_H_mat(self):
         if self.task_manager != None:
             self.H_mat=self._calc_mat_term_parellel(self.hamiltonian)
+        elif self.sparse_circuit:
+            self.H_mat=self._calc_mat_term_sparse(self.hamiltonian)
         else:
             self._calc_H_mat_0()
 
@@ -107,7 +140,8 @@ class SubspaceSolver:
         
         for i in range(self.n_basis):
             for j in range(i, self.n_basis):
-                self.task_manager.add_task_to_buffer(MatrixTermTask(self.circuit_list[i],self.circuit_list[j],hamiltonian),task_series_id=task_series_id)
+                self.task_manager.add_task_to_buffer(MatrixTermTask(self.circuit_list[i],self.circuit_list[j],hamiltonian,
+                                                                    is_sparse=self.sparse_circuit),task_series_id=task_series_id)
 
         self.task_manager.flush()
         res_list = self.task_manager.receive_task_result(
@@ -126,14 +160,98 @@ class SubspaceSolver:
             pbar.close()
         return mat
 
+    def calc_S_H_mat_by_gram(self):
+        """
+        Calculate S_mat = V^H V and H_mat = V^H (H V) from the statevectors V of the circuits,
+        block by block of columns when V does not fit into self.memory_budget
+        """
+        n_state = 1 << self.circuit_list[0].n_qubit
+        # A block of V, H times it and another block of V are held at the same time
+        block_size = max(1, min(self.n_basis, self.memory_budget // (3 * 16 * n_state)))
+        states = self._get_basis_states(block_size)
+        if isinstance(self.hamiltonian, PauliSum):
+            hamiltonian_mat = self.hamiltonian
+        else:
+            hamiltonian_mat = get_cached_operator_matrix(self.circuit_list[0].n_qubit, self.hamiltonian)
+
+        if self.progress_bar:
+            pbar = tqdm(total=(self.n_basis + block_size - 1) // block_size)
+            pbar.set_description(str("S and H matrix"))
+        for start in range(0, self.n_basis, block_size):
+            end = min(start + block_size, self.n_basis)
+            column_block = np.array(states[start:end])
+            # The rows of the blocks are the statevectors, i.e. the blocks of columns of V
+            if isinstance(hamiltonian_mat, PauliSum):
+                h_column_block = hamiltonian_mat.dot(column_block)
+            else:
+                h_column_block = hamiltonian_mat.dot(column_block.T).T
+            for row_start in range(0, end, block_size):
+                row_end = min(row_start + block_size, self.n_basis)
+                row_block = column_block if row_start == start else np.array(states[row_start:row_end])
+                # S_mat[i][j] = <psi_j|psi_i> and H_mat[i][j] = <psi_j|H|psi_i>, the same as the other modes
+                self.S_mat[row_start:row_end, start:end] = row_block @ np.conjugate(column_block).T
+                self.H_mat[row_start:row_end, start:end] = row_block @ np.conjugate(h_column_block).T
+                if row_start != start:
+                    self.S_mat[start:end, row_start:row_end] = np.conjugate(self.S_mat[row_start:row_end, start:end]).T
+                    self.H_mat[start:end, row_start:row_end] = np.conjugate(self.H_mat[row_start:row_end, start:end]).T
+            if self.progress_bar:
+                pbar.update(1)
+        if self.progress_bar:
+            pbar.close()
+        return
+
+    def _get_basis_states(self, block_size):
+        """
+        Return the (n_basis x 2^n_qubit) array of the statevectors of the circuits.
+        It is a memory map of a temporary file if it has more than block_size statevectors
+        """
+        if self.basis_states is not None:
+            return self.basis_states
+        n_state = 1 << self.circuit_list[0].n_qubit
+        if block_size >= self.n_basis:
+            states = np.zeros((self.n_basis, n_state), dtype=complex)
+        else:
+            states = np.memmap(tempfile.TemporaryFile(), dtype=complex, mode="w+", shape=(self.n_basis, n_state))
+        for start in range(0, self.n_basis, block_size):
+            end = min(start + block_size, self.n_basis)
+            if self.task_manager is not None:
+                task_series_id = "QSD states" + str(time.time() % 10000)
+                for circuit in self.circuit_list[start:end]:
+                    self.task_manager.add_task_to_buffer(CompleteAmplitudeTask(circuit), task_series_id=task_series_id)
+                self.task_manager.flush(task_package_size=max(1, (end - start) // self.task_manager.n_processor))
+                states[start:end] = self.task_manager.receive_task_result(task_series_id=task_series_id)
+            else:
+                for i in range(start, end):
+                    states[i] = get_circuit_complete_amplitudes(self.circuit_list[i])
+        return states
+
+    def _calc_mat_term_sparse(self, hamiltonian):
+        """
+        Calculate the matrix from the factorized states of the circuits (see Backends.FactorizedBackend),
+        each simulated once
+        """
+        if isinstance(hamiltonian, PauliSum):
+            hamiltonian = hamiltonian.to_qubit_operator()
+        states = [get_circuit_factorized_state(circuit) for circuit in self.circuit_list]
+        mat = np.array([[0.0] * self.n_basis] * self.n_basis, dtype=complex)
+        for i in range(self.n_basis):
+            for j in range(i, self.n_basis):
+                mat[i][j] = get_factorized_overlap(states[i], states[j], hamiltonian)
+                mat[j][i] = np.conjugate(mat[i][j])
+        return mat
+
     def _calc_S_mat_0(self):
+        # Each state is simulated once and the inner products are taken between the cached statevectors
+        circuit_list = [copy(circuit) for circuit in self.circuit_list]
+        for circuit in circuit_list:
+            cache_circuit_amplitudes(circuit)
         for i in range(self.n_basis):
             for j in range(i, self.n_basis):
                 if i == j:
                     self.S_mat[i][j] = 1.0
                     continue
                 s = get_inner_two_circuit_product(
-                    self.circuit_list[i], self.circuit_list[j])
+                    circuit_list[i], circuit_list[j])
                 # print(i,j,s)
                 self.S_mat[i][j] = s
                 self.S_mat[j][i] = np.conjugate(s)
@@ -1,39 +1,51 @@
-from projectq import MainEngine
-from projectq.ops import X, All, Measure, CNOT, Z, Rz, Rx, C, TimeEvolution,Ph
-from projectq.backends import CommandPrinter, CircuitDrawer
-from projectq.backends import Simulator as projectq_simulator
-from projectq.meta import Loop, Compute, Uncompute, Control
-
 from projectq.cengines import (MainEngine,
                                AutoReplacer,
                                LocalOptimizer,
                                TagRemover,
                                DecompositionRuleSet)
 import projectq.setups.decompositions
+from ..Backends import Backend, NumPyBackend, ProjectQBackend, FactorizedBackend, MPSBackend
+from ..Backends._projectq_backend import get_projectq_engine
 
 from time import time
+import numpy as np
 
 """
 This file provides functions for common tasks that use the quantum simulation backend, including expectation value and amplitude
 The functions accept a function called *ansatz(parameter,wavefunction)* as input.
+The backend used can be selected by set_backend(). The NumPy statevector simulator is used by default.
 """
 
 
-# This part can easily change to use HiQ.
-# We use projectq here because it can be easily installed by pip and thus easily for Mizore to be installed.
+# We use the in-process NumPy simulator by default because the setup of the engine of projectq is expensive.
+# The projectq simulator is still available by set_backend("projectq"). This part can easily change to use HiQ.
 
+BACKEND_NAME_DICT = {"numpy": NumPyBackend, "projectq": ProjectQBackend, "factorized": FactorizedBackend,
+                     "mps": MPSBackend}
 
-def get_quantum_engine():
-    # Create a main compiler engine with a simulator backend:
-    backend = projectq_simulator(gate_fusion=True)
-    cache_depth = 10
-    rule_set = DecompositionRuleSet(modules=[projectq.setups.decompositions])
-    engines = [TagRemover(),
-               LocalOptimizer(cache_depth),
-               AutoReplacer(rule_set)]
-    compiler_engine = MainEngine(backend=backend, engine_list=engines)
+_backend = NumPyBackend()
 
-    return compiler_engine
+
+def set_backend(backend):
+    """
+    Set the backend used for circuit evaluation
+    Args:
+        backend: an instance of Backend, or a name in BACKEND_NAME_DICT ("numpy", "projectq", "factorized" or "mps")
+    """
+    global _backend
+    if isinstance(backend, str):
+        backend = BACKEND_NAME_DICT[backend]()
+    if not isinstance(backend, Backend):
+        raise Exception("The backend should be a Backend or one of " + str(list(BACKEND_NAME_DICT.keys())))
+    _backend = backend
+
+
+def get_backend():
+    return _backend
+
+
+def get_quantum_engine():
+    return get_projectq_engine()
 
 
 def get_hiq_quantum_engine():
@@ -57,29 +69,96 @@ def evaluate_ansatz_expectation(parameter, n_qubit, hamiltonian, ansatz):
 
     """
 
-    compiler_engine = get_quantum_engine()
+    backend = get_backend()
 
     # Initialize the wavefunction
-    wavefunction = compiler_engine.allocate_qureg(n_qubit)
+    wavefunction = backend.allocate_wavefunction(n_qubit)
 
     # Apply the circuit
     ansatz(parameter, wavefunction)
 
     # Use the engine to implement the gates
-    compiler_engine.flush()
+    backend.flush(wavefunction)
 
     # Evaluate the energy
-    energy = compiler_engine.backend.get_expectation_value(
-        hamiltonian, wavefunction)
+    energy = backend.get_expectation_value(hamiltonian, wavefunction)
 
     # For deallocate qubit
-    All(Measure) | wavefunction
-    compiler_engine.flush()
+    backend.deallocate(wavefunction)
 
     # print(energy,parameter)
 
     return energy
 
+# The maximum number of amplitudes (n_batch x 2^n_qubit) simulated together by the batch evaluation
+# Larger batches are split into chunks of rows
+MAX_BATCH_AMPLITUDES = 1 << 22
+
+
+def evaluate_ansatz_batch(n_qubit, ansatz, parameter_matrix, measure):
+    """
+    Apply the ansatz with each row of parameter_matrix and measure the wavefunctions.
+    If the backend supports batch (Backend.IS_BATCH_AVAILABLE), the rows are simulated together as a
+    (n_batch x 2^n_qubit) array in one vectorized pass, in which the ansatz receives the transposed
+    parameter_matrix, i.e. parameter[i] is the array of the i-th parameter of all the rows.
+    Otherwise, the rows are simulated one by one.
+    Args:
+        parameter_matrix: (n_batch x n_parameter) array
+        measure: measure(backend, wavefunction) returns the value (or the array of values for a batch wavefunction)
+    Returns:
+        numpy array of the values of the rows
+    """
+    backend = get_backend()
+    parameter_matrix = np.array(parameter_matrix, dtype=float)
+    n_batch = len(parameter_matrix)
+    if not backend.IS_BATCH_AVAILABLE:
+        value_list = []
+        for parameter in parameter_matrix:
+            wavefunction = backend.allocate_wavefunction(n_qubit)
+            ansatz(parameter, wavefunction)
+            backend.flush(wavefunction)
+            value_list.append(measure(backend, wavefunction))
+            backend.deallocate(wavefunction)
+        return np.array(value_list)
+    chunk_size = max(1, MAX_BATCH_AMPLITUDES >> n_qubit)
+    value_list = []
+    for start in range(0, n_batch, chunk_size):
+        chunk = parameter_matrix[start:start + chunk_size]
+        wavefunction = backend.allocate_batch_wavefunction(n_qubit, len(chunk))
+        ansatz(chunk.T, wavefunction)
+        backend.flush(wavefunction)
+        value_list.append(measure(backend, wavefunction))
+        backend.deallocate(wavefunction)
+    return np.concatenate(value_list)
+
+
+def evaluate_batch(pcircuit, hamiltonian, parameter_matrix):
+    """
+    Evaluate the expectation values of the hamiltonian for each row of parameter_matrix in one vectorized pass
+    Args:
+        pcircuit: ParametrizedCircuit
+        parameter_matrix: (n_batch x n_parameter) array
+    Returns:
+        numpy array of the expectation values
+    """
+
+    def measure(backend, wavefunction):
+        return backend.get_expectation_value(hamiltonian, wavefunction)
+
+    return evaluate_ansatz_batch(pcircuit.n_qubit, pcircuit.ansatz, parameter_matrix, measure)
+
+
+def evaluate_batch_amplitudes(pcircuit, bit_string, parameter_matrix):
+    """
+    Evaluate the amplitude of the ket of bit_string for each row of parameter_matrix in one vectorized pass
+    """
+
+    def measure(backend, wavefunction):
+        return backend.get_amplitude(bit_string, wavefunction)
+
+    return evaluate_ansatz_batch(pcircuit.n_qubit, pcircuit.ansatz, parameter_matrix, measure)
+
+
 def number2bitstring(n_qubit,number):
     bitstring = [False]*n_qubit
     for i in range(0, n_qubit):
@@ -87,19 +166,23 @@ def number2bitstring(n_qubit,number):
             bitstring[i]=True
     return bitstring
 
-def get_ansatz_complete_amplitudes(n_qubit, ansatz):
-    compiler_engine = get_quantum_engine()
-    wavefunction = compiler_engine.allocate_qureg(n_qubit)
-    ansatz([0] * 100, wavefunction)
-    compiler_engine.flush()
-    n_amp = 2**n_qubit
-    raw_amps = [0]*n_amp
-    for i in range(0, n_amp):
-        raw_amps[i] = compiler_engine.backend.get_amplitude(
-            number2bitstring(n_qubit, i), wavefunction)
-    All(Measure) | wavefunction
-    compiler_engine.flush()
-    return raw_amps
+def get_ansatz_complete_amplitudes(n_qubit, ansatz, parameter=None):
+    """
+    Return all the amplitudes of the wavefunction produced by the ansatz as a NumPy array exported in one call.
+    The ordering is little-endian: the i-th qubit corresponds to the i-th bit of the index of the array,
+    i.e. amplitudes[sum_i b_i*2^i] is the amplitude of the ket with the i-th qubit in |b_i>
+    (the same as ProjectQ and Utilities.Tools.qubit_operator2matrix()).
+    """
+    backend = get_backend()
+    wavefunction = backend.allocate_wavefunction(n_qubit)
+    if parameter is None:
+        ansatz([0] * 100, wavefunction)
+    else:
+        ansatz(parameter, wavefunction)
+    backend.flush(wavefunction)
+    amplitudes = backend.get_statevector(wavefunction)
+    backend.deallocate(wavefunction)
+    return amplitudes
 
 
 def evaluate_ansatz_amplitudes(n_qubit, ansatz, bit_string_list, parameter=None):
@@ -108,10 +191,10 @@ def evaluate_ansatz_amplitudes(n_qubit, ansatz, bit_string_list, parameter=None)
     Each bit_string should be a list of booleans like [False]*n_qubit
     False: |0>; True: |1>
     """
-    compiler_engine = get_quantum_engine()
+    backend = get_backend()
 
     # Initialize the wavefunction
-    wavefunction = compiler_engine.allocate_qureg(n_qubit)
+    wavefunction = backend.allocate_wavefunction(n_qubit)
 
     # Apply the circuit
     if  parameter is None:
@@ -120,17 +203,16 @@ def evaluate_ansatz_amplitudes(n_qubit, ansatz, bit_string_list, parameter=None)
         ansatz(parameter, wavefunction)
 
     # Use the engine to implement the gates
-    compiler_engine.flush()
+    backend.flush(wavefunction)
 
     amp_list = []
     # Evaluate the amplitude
     for bit_string in bit_string_list:
-        amp = compiler_engine.backend.get_amplitude(bit_string, wavefunction)
+        amp = backend.get_amplitude(bit_string, wavefunction)
         amp_list.append(amp)
 
     # For deallocate qubit
-    All(Measure) | wavefunction
-    compiler_engine.flush()
+    backend.deallocate(wavefunction)
 
     return amp_list
 
@@ -143,28 +225,26 @@ def evaluate_ansatz_1DMs(parameter, n_qubit, ansatz):
     from .WaveLocalProperties import get_one_DMs
     import numpy as np
     from openfermion.ops import QubitOperator
-    compiler_engine = get_quantum_engine()
-    wavefunction = compiler_engine.allocate_qureg(n_qubit)
+    backend = get_backend()
+    wavefunction = backend.allocate_wavefunction(n_qubit)
     ansatz(parameter, wavefunction)
-    compiler_engine.flush()
+    backend.flush(wavefunction)
     one_DMs = get_one_DMs(
-        compiler_engine.backend.get_expectation_value, wavefunction)
+        backend.get_expectation_value, wavefunction)
 
-    All(Measure) | wavefunction
-    compiler_engine.flush()
+    backend.deallocate(wavefunction)
     return one_DMs
 
 def evaluate_ansatz_2DMs(parameter, n_qubit, ansatz):
-    from Utilities.WaveLocalProperties import get_two_DMs
+    from .WaveLocalProperties import get_two_DMs
     import numpy as np
     from openfermion.ops import QubitOperator
-    compiler_engine = get_quantum_engine()
-    wavefunction = compiler_engine.allocate_qureg(n_qubit)
+    backend = get_backend()
+    wavefunction = backend.allocate_wavefunction(n_qubit)
     ansatz(parameter, wavefunction)
-    compiler_engine.flush()
+    backend.flush(wavefunction)
     two_DMs = get_two_DMs(
-        compiler_engine.backend.get_expectation_value, wavefunction)
+        backend.get_expectation_value, wavefunction)
 
-    All(Measure) | wavefunction
-    compiler_engine.flush()
+    backend.deallocate(wavefunction)
     return two_DMs
\ No newline at end of file
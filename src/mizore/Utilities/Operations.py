@@ -1,16 +1,85 @@
-from projectq.ops import CZ,H, X, Y, Z, All, Measure, CNOT, Z, Rz, Ry, Rx, C, TimeEvolution
+from projectq.ops import CZ,H, X, Y, Z, All, Measure, CNOT, Z, Rz, Ry, Rx, C, TimeEvolution, Ph
 import math
 import projectq
 from openfermion.ops import QubitOperator
+from ..Backends._backend import NativeQubit, get_register_and_indices
+from ..Backends._numpy_backend import get_pauliword_masks
 
 PAULI_CHAR2OPERATION = {"X": X, "Y": Y, "Z": Z}
 
 """
 The common quantum operations that are used in Mizore
+The wavefunction can be a ProjectQ qureg or a register of a native backend (see Backends).
+For the latter, the kernels of the register are called directly.
 """
 
 
+def _x(qubit):
+    if isinstance(qubit, NativeQubit):
+        qubit.register.apply_x(qubit.index)
+    else:
+        X | qubit
+
+
+def _h(qubit):
+    if isinstance(qubit, NativeQubit):
+        qubit.register.apply_h(qubit.index)
+    else:
+        H | qubit
+
+
+def _pauli(pauli_char, qubit):
+    if isinstance(qubit, NativeQubit):
+        if pauli_char == "X":
+            qubit.register.apply_x(qubit.index)
+        elif pauli_char == "Y":
+            qubit.register.apply_y(qubit.index)
+        else:
+            qubit.register.apply_z(qubit.index)
+    else:
+        PAULI_CHAR2OPERATION[pauli_char] | qubit
+
+
+def _rx(angle, qubit):
+    if isinstance(qubit, NativeQubit):
+        qubit.register.apply_rx(qubit.index, angle)
+    else:
+        Rx(angle) | qubit
+
+
+def _ry(angle, qubit):
+    if isinstance(qubit, NativeQubit):
+        qubit.register.apply_ry(qubit.index, angle)
+    else:
+        Ry(angle) | qubit
+
+
+def _rz(angle, qubit):
+    if isinstance(qubit, NativeQubit):
+        qubit.register.apply_rz(qubit.index, angle)
+    else:
+        Rz(angle) | qubit
+
+
+def _cnot(control, target):
+    if isinstance(control, NativeQubit):
+        control.register.apply_cnot(control.index, target.index)
+    else:
+        CNOT | (control, target)
+
+
+def _cz(qubit1, qubit2):
+    if isinstance(qubit1, NativeQubit):
+        qubit1.register.apply_cz(qubit1.index, qubit2.index)
+    else:
+        CZ | (qubit1, qubit2)
+
+
 def apply_time_evolution(hamiltonian: QubitOperator, time, wavefunction):
+    if isinstance(wavefunction[0], NativeQubit):
+        register, indices = get_register_and_indices(wavefunction)
+        register.apply_time_evolution(hamiltonian.terms.items(), time, indices)
+        return
     projectq_qubit_operator = projectq.ops.QubitOperator()
     for term, coefficient in hamiltonian.terms.items():
         projectq_qubit_operator.terms[term] = coefficient
@@ -20,34 +89,34 @@ def apply_time_evolution(hamiltonian: QubitOperator, time, wavefunction):
 
 def apply_X_gates(qsubset, wavefunction):
     for i in qsubset:
-        X | wavefunction[i]
+        _x(wavefunction[i])
 
 
 def apply_H_gates(qsubset, wavefunction):
     for i in qsubset:
-        H | wavefunction[i]
+        _h(wavefunction[i])
 
 
 def apply_CZ_gates(pairset,wavefunction):
     for pair in pairset:
-        CZ | (wavefunction[pair[0]],wavefunction[pair[1]])
+        _cz(wavefunction[pair[0]], wavefunction[pair[1]])
 
 
 def apply_Pauli_gates(paulistring, wavefunction):
     for term in paulistring:
-        PAULI_CHAR2OPERATION[term[1]] | wavefunction[term[0]]
+        _pauli(term[1], wavefunction[term[0]])
 
 
 def CNOT_entangler(wavefunction, qsubset):
     for i in range(len(qsubset) - 1):
-        CNOT | (wavefunction[qsubset[i]], wavefunction[qsubset[i + 1]])
-    CNOT | (wavefunction[qsubset[i + 1]], wavefunction[qsubset[0]])
+        _cnot(wavefunction[qsubset[i]], wavefunction[qsubset[i + 1]])
+    _cnot(wavefunction[qsubset[i + 1]], wavefunction[qsubset[0]])
 
 
 def inversed_CNOT_entangler(wavefunction, qsubset):
-    CNOT | (wavefunction[qsubset[len(qsubset) - 1]], wavefunction[qsubset[0]])
+    _cnot(wavefunction[qsubset[len(qsubset) - 1]], wavefunction[qsubset[0]])
     for i in reversed(range(len(qsubset) - 1)):
-        CNOT | (wavefunction[qsubset[i]], wavefunction[qsubset[i + 1]])
+        _cnot(wavefunction[qsubset[i]], wavefunction[qsubset[i + 1]])
 
 
 def XY_full_rotation(wavefunction, qsubset, parameter):
@@ -56,8 +125,8 @@ def XY_full_rotation(wavefunction, qsubset, parameter):
     """
     n_qubit = len(qsubset)
     for i in range(len(qsubset)):
-        Rx(parameter[i]) | wavefunction[qsubset[i]]
-        Ry(parameter[n_qubit + i]) | wavefunction[qsubset[i]]
+        _rx(parameter[i], wavefunction[qsubset[i]])
+        _ry(parameter[n_qubit + i], wavefunction[qsubset[i]])
 
 
 def inversed_XY_full_rotation(wavefunction, qsubset, parameter):
@@ -66,8 +135,8 @@ def inversed_XY_full_rotation(wavefunction, qsubset, parameter):
     """
     n_qubit = len(qsubset)
     for i in range(len(qsubset)):
-        Ry(-parameter[n_qubit + i]) | wavefunction[qsubset[i]]
-        Rx(-parameter[i]) | wavefunction[qsubset[i]]
+        _ry(-parameter[n_qubit + i], wavefunction[qsubset[i]])
+        _rx(-parameter[i], wavefunction[qsubset[i]])
 
 
 def full_rotation(wavefunction, qsubset, parameter):
@@ -76,9 +145,9 @@ def full_rotation(wavefunction, qsubset, parameter):
     """
     n_qubit = len(qsubset)
     for i in range(len(qsubset)):
-        Rx(parameter[i]) | wavefunction[qsubset[i]]
-        Rz(parameter[n_qubit + i]) | wavefunction[qsubset[i]]
-        Rx(parameter[2 * n_qubit + i]) | wavefunction[qsubset[i]]
+        _rx(parameter[i], wavefunction[qsubset[i]])
+        _rz(parameter[n_qubit + i], wavefunction[qsubset[i]])
+        _rx(parameter[2 * n_qubit + i], wavefunction[qsubset[i]])
 
 
 def inversed_full_rotation(wavefunction, qsubset, parameter):
@@ -87,13 +156,15 @@ def inversed_full_rotation(wavefunction, qsubset, parameter):
     """
     n_qubit = len(qsubset)
     for i in range(len(qsubset)):
-        Rx(-parameter[2 * n_qubit + i]) | wavefunction[qsubset[i]]
-        Rz(-parameter[n_qubit + i]) | wavefunction[qsubset[i]]
-        Rx(-parameter[i]) | wavefunction[qsubset[i]]
+        _rx(-parameter[2 * n_qubit + i], wavefunction[qsubset[i]])
+        _rz(-parameter[n_qubit + i], wavefunction[qsubset[i]])
+        _rx(-parameter[i], wavefunction[qsubset[i]])
 
 def apply_global_phase(wavefunction,angle):
-    from projectq.ops import Ph
-    Ph(angle) | wavefunction[0]
+    if isinstance(wavefunction[0], NativeQubit):
+        wavefunction[0].register.apply_global_phase(angle)
+    else:
+        Ph(angle) | wavefunction[0]
 
 def generalized_rotation(wavefunction, qsubset, pauliword, evolution_time):
     """Apply e^{iPt} on the wavefunction
@@ -102,6 +173,14 @@ def generalized_rotation(wavefunction, qsubset, pauliword, evolution_time):
         pauliword: The Pauli word P in e^{iPt} 1:X,2:Y,3:Z
         evolution_time: t in e^{iPt}
     """
+    if isinstance(wavefunction[qsubset[0]], NativeQubit):
+        # Native backends apply the rotation by a fused kernel instead of the gates below.
+        # The gates are still the reference for counting (see get_gate_used() of the blocks)
+        indices = tuple(wavefunction[i].index for i in qsubset)
+        x_mask, z_mask, n_y = get_pauliword_masks(indices, tuple(pauliword))
+        wavefunction[qsubset[0]].register.apply_pauli_rotation(x_mask, z_mask, n_y, evolution_time)
+        return
+
     HALF_PI = math.pi / 2
     n_qubit = len(qsubset)
 
@@ -111,9 +190,9 @@ def generalized_rotation(wavefunction, qsubset, pauliword, evolution_time):
     for p in range(0, n_qubit):
         pop = pauliword[p]  # Pauli op
         if pop == 1:
-            H | wavefunction[qsubset[p]]  # Hadamard
+            _h(wavefunction[qsubset[p]])  # Hadamard
         elif pop == 2:
-            Rx(HALF_PI) | wavefunction[qsubset[p]]
+            _rx(HALF_PI, wavefunction[qsubset[p]])
 
     # 2. First set CNOTs
     prev_index = None
@@ -123,11 +202,11 @@ def generalized_rotation(wavefunction, qsubset, pauliword, evolution_time):
         if pop == 0:
             continue
         if prev_index is not None:
-            CNOT | (wavefunction[prev_index], wavefunction[qsubset[p]])
+            _cnot(wavefunction[prev_index], wavefunction[qsubset[p]])
         prev_index = qsubset[p]
 
     # 3. Rotation (Note kexp & Ntrot)
-    Rz(evolution_time * 2) | wavefunction[prev_index]
+    _rz(evolution_time * 2, wavefunction[prev_index])
 
     # 4. Second set of CNOTs
     prev_index = None
@@ -136,13 +215,13 @@ def generalized_rotation(wavefunction, qsubset, pauliword, evolution_time):
         if pop == 0:
             continue
         if prev_index is not None:
-            CNOT | (wavefunction[qsubset[p]], wavefunction[prev_index])
+            _cnot(wavefunction[qsubset[p]], wavefunction[prev_index])
         prev_index = qsubset[p]
 
     # 5. Rotate back to Z basis
     for p in range(0, len(pauliword)):
         pop = pauliword[p]  # Pauli op
         if pop == 1:
-            H | wavefunction[qsubset[p]]  # Hadamard
+            _h(wavefunction[qsubset[p]])  # Hadamard
         elif pop == 2:
-            Rx(-HALF_PI) | wavefunction[qsubset[p]]
+            _rx(-HALF_PI, wavefunction[qsubset[p]])
@@ -0,0 +1,282 @@
+import os, hashlib, shutil
+import numpy as np
+from scipy.sparse import csr_matrix
+
+"""
+A persistent content-addressed cache of the arrays derived from the Hamiltonians,
+e.g. the CSR matrices and the ground states.
+
+An entry is a folder named by the hash of the operator (see get_operator_hash()) holding one .npy file per array.
+The arrays are loaded by np.load(mmap_mode='r'), so the worker processes using the same Hamiltonian
+share the pages of the files instead of building and keeping their own copies.
+When the total size exceeds CACHE_SIZE_LIMIT, the least recently used entries are removed.
+
+The cache is off by default. It is enabled by set_operator_cache(enabled=True), or by setting the environment
+variable MIZORE_OPERATOR_CACHE to the folder of the cache, which also reaches the worker processes.
+The default folder is mizore/operator_cache in the user cache directory ($XDG_CACHE_HOME, or ~/.cache).
+"""
+
+
+def get_default_cache_path():
+    """
+    Return $MIZORE_OPERATOR_CACHE if it is set, otherwise mizore/operator_cache in the user cache directory
+    """
+    if os.environ.get("MIZORE_OPERATOR_CACHE"):
+        return os.environ["MIZORE_OPERATOR_CACHE"]
+    user_cache_path = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(user_cache_path, "mizore", "operator_cache")
+
+
+CACHE_PATH = get_default_cache_path()
+# The maximal number of bytes of all the entries
+CACHE_SIZE_LIMIT = 1 << 32
+# The operators on fewer qubits are cheaper to build than to load, and are never cached
+MIN_CACHED_N_QUBIT = 8
+IS_CACHE_ENABLED = bool(os.environ.get("MIZORE_OPERATOR_CACHE"))
+
+
+def set_operator_cache(path=None, size_limit=None, enabled=None, min_n_qubit=None):
+    """
+    Configure the cache. The arguments not given are unchanged.
+    Call it before creating the TaskManager, so its TaskRunners use the same settings
+    Args:
+        path: the folder of the cache. Default: see get_default_cache_path()
+        size_limit: the maximal number of bytes of the cache
+        enabled: whether the cache is used. Default: False, unless MIZORE_OPERATOR_CACHE is set
+        min_n_qubit: the smallest number of qubits of the operators to cache
+    """
+    global CACHE_PATH, CACHE_SIZE_LIMIT, IS_CACHE_ENABLED, MIN_CACHED_N_QUBIT
+    if path is not None:
+        CACHE_PATH = path
+    if size_limit is not None:
+        CACHE_SIZE_LIMIT = size_limit
+    if enabled is not None:
+        IS_CACHE_ENABLED = enabled
+    if min_n_qubit is not None:
+        MIN_CACHED_N_QUBIT = min_n_qubit
+
+
+def is_cache_used(n_qubit):
+    return IS_CACHE_ENABLED and n_qubit >= MIN_CACHED_N_QUBIT
+
+
+def get_operator_hash(n_qubit, hamiltonian):
+    """
+    Return the hex digest identifying (n_qubit, hamiltonian).
+    The terms are merged and sorted by their bitmasks, so the hash does not depend on the order of the terms
+    or on whether the operator is a QubitOperator or a PauliSum. The coefficients are compared bit by bit.
+    """
+    from .PauliSum import PauliSum
+    if not isinstance(hamiltonian, PauliSum):
+        hamiltonian = PauliSum.from_qubit_operator(hamiltonian, n_qubit)
+    term_dict = {}
+    for x_mask, z_mask, coeff in zip(hamiltonian.x_masks.tolist(), hamiltonian.z_masks.tolist(),
+                                     hamiltonian.coeffs.tolist()):
+        term_dict[(x_mask, z_mask)] = term_dict.get((x_mask, z_mask), 0) + coeff
+    keys = sorted(key for key in term_dict if term_dict[key] != 0)
+    masks = np.array(keys, dtype=np.int64).reshape(-1, 2)
+    # Adding 0.0 turns -0.0 into 0.0
+    coeffs = np.array([term_dict[key] for key in keys], dtype=complex) + 0.0
+    digest = hashlib.sha256()
+    digest.update(np.int64(n_qubit).tobytes())
+    digest.update(masks.tobytes())
+    digest.update(coeffs.tobytes())
+    return digest.hexdigest()
+
+
+def get_entry_path(key):
+    return os.path.join(CACHE_PATH, key)
+
+
+def load_cached_arrays(key, names):
+    """
+    Return the dict of the arrays of the names in the entry, memory-mapped read-only.
+    Return None if any of them is not cached
+    """
+    entry_path = get_entry_path(key)
+    arrays = {}
+    try:
+        for name in names:
+            arrays[name] = np.load(os.path.join(entry_path, name + ".npy"), mmap_mode="r")
+        # Mark the entry as recently used
+        os.utime(entry_path)
+    except (OSError, ValueError):
+        return None
+    return arrays
+
+
+def store_cached_arrays(key, arrays):
+    """
+    Save the dict of arrays into the entry and evict the old entries if the cache is too large.
+    A file is written to a temporary name and then renamed, so other processes never read a partial file.
+    Returns:
+        whether the arrays are stored
+    """
+    n_byte = sum(np.asarray(array).nbytes for array in arrays.values())
+    if n_byte > CACHE_SIZE_LIMIT:
+        return False
+    entry_path = get_entry_path(key)
+    try:
+        os.makedirs(entry_path, exist_ok=True)
+        for name, array in arrays.items():
+            temp_path = os.path.join(entry_path, "{}.{}.tmp.npy".format(name, os.getpid()))
+            np.save(temp_path, np.asarray(array))
+            os.replace(temp_path, os.path.join(entry_path, name + ".npy"))
+    except OSError:
+        return False
+    evict_operator_cache(keep_key=key)
+    return True
+
+
+def get_entry_size(entry_path):
+    size = 0
+    for file in os.scandir(entry_path):
+        size += file.stat().st_size
+    return size
+
+
+def evict_operator_cache(size_limit=None, keep_key=None):
+    """
+    Remove the least recently used entries until the cache takes no more than size_limit bytes
+    """
+    if size_limit is None:
+        size_limit = CACHE_SIZE_LIMIT
+    if not os.path.isdir(CACHE_PATH):
+        return
+    entry_list = []
+    total_size = 0
+    for entry in os.scandir(CACHE_PATH):
+        try:
+            size = get_entry_size(entry.path)
+            entry_list.append((entry.stat().st_mtime, entry.name, entry.path, size))
+        except OSError:
+            continue
+        total_size += size
+    entry_list.sort()
+    for _mtime, name, path, size in entry_list:
+        if total_size <= size_limit:
+            break
+        if name == keep_key:
+            continue
+        # Removing the files mapped by other processes is safe, their mappings are kept
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+
+def clear_operator_cache():
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+
+
+def get_cached_operator_matrix(n_qubit, hamiltonian, memory_budget=None):
+    """
+    The same as Utilities.Tools.qubit_operator2matrix(), but the CSR matrix is loaded from the cache
+    (memory-mapped) if it was built before, and is saved into the cache otherwise
+    """
+    from .Tools import qubit_operator2matrix
+    if not is_cache_used(n_qubit):
+        return qubit_operator2matrix(n_qubit, hamiltonian, memory_budget=memory_budget)
+    key = get_operator_hash(n_qubit, hamiltonian)
+    names = ["csr_data", "csr_indices", "csr_indptr"]
+    arrays = load_cached_arrays(key, names)
+    if arrays is not None:
+        if memory_budget is None or sum(array.nbytes for array in arrays.values()) <= memory_budget:
+            n_dim = 1 << n_qubit
+            return csr_matrix((arrays["csr_data"], arrays["csr_indices"], arrays["csr_indptr"]),
+                              shape=(n_dim, n_dim), copy=False)
+    mat = qubit_operator2matrix(n_qubit, hamiltonian, memory_budget=memory_budget)
+    if isinstance(mat, csr_matrix):
+        store_cached_arrays(key, {"csr_data": mat.data, "csr_indices": mat.indices, "csr_indptr": mat.indptr})
+    return mat
+
+
+def get_cached_ground_state(n_qubit, hamiltonian, n_particle, solve):
+    """
+    Return the ground state (energy, vector) from the cache, or call solve() and cache its result
+    Args:
+        n_particle: the particle number sector searched by solve(), None for the whole space
+        solve: a function returning (energy, vector)
+    """
+    if not is_cache_used(n_qubit):
+        return solve()
+    key = get_operator_hash(n_qubit, hamiltonian)
+    sector_name = "all" if n_particle is None else str(n_particle)
+    names = ["ground_energy_" + sector_name, "ground_vector_" + sector_name]
+    arrays = load_cached_arrays(key, names)
+    if arrays is not None:
+        return float(arrays[names[0]]), np.array(arrays[names[1]])
+    energy, vector = solve()
+    store_cached_arrays(key, {names[0]: np.array(energy), names[1]: vector})
+    return energy, vector
+
+
+def get_cached_diagonal(n_qubit, hamiltonian, store=False):
+    """
+    Return the real diagonal of the Z terms of the operator (see PauliSum.get_diagonal()),
+    which is the energy of every basis state for a diagonal Hamiltonian like MaxCut.
+    It is loaded from the cache if it was stored before, and computed otherwise
+    Args:
+        store: whether to store the computed diagonal into the cache
+    """
+    from .PauliSum import PauliSum
+    if not isinstance(hamiltonian, PauliSum):
+        hamiltonian = PauliSum.from_qubit_operator(hamiltonian, n_qubit)
+    if is_cache_used(n_qubit):
+        key = get_operator_hash(n_qubit, hamiltonian)
+        arrays = load_cached_arrays(key, ["z_diagonal"])
+        if arrays is not None:
+            return arrays["z_diagonal"]
+    diagonal = np.real(hamiltonian.get_diagonal(n_qubit))
+    diagonal.setflags(write=False)
+    if store and is_cache_used(n_qubit):
+        store_cached_arrays(key, {"z_diagonal": diagonal})
+    return diagonal
+
+
+class OperatorDiagonal:
+    """
+    The diagonal of the Z terms of an operator and its other terms, kept on the operator by get_operator_diagonal().
+    It is emptied when the operator is pickled or copied, so the tasks carrying the operator do not carry the diagonal
+    Attributes:
+        n_qubit: the number of qubits of the diagonal
+        terms: a copy of the terms of the QubitOperator when the diagonal was computed, None for a PauliSum
+        diagonal: the real diagonal, None if there is no Z term
+        other_part: the QubitOperator of the other terms, None for a PauliSum
+    """
+
+    def __init__(self):
+        self.n_qubit = None
+        self.terms = None
+        self.diagonal = None
+        self.other_part = None
+
+    def __reduce__(self):
+        return OperatorDiagonal, ()
+
+
+def get_operator_diagonal(n_qubit, operator):
+    """
+    Return (diagonal, other_part), see OperatorDiagonal. They are computed once per operator and kept on it
+    as operator.operator_diagonal until the terms of the operator change.
+    A diagonal stored in the cache is loaded (see get_cached_diagonal()), but nothing is written to the disk here
+    """
+    from .PauliSum import PauliSum
+    from .Tools import split_diagonal_terms
+    operator_diagonal = getattr(operator, "operator_diagonal", None)
+    if not isinstance(operator_diagonal, OperatorDiagonal):
+        operator_diagonal = OperatorDiagonal()
+        operator.operator_diagonal = operator_diagonal
+    is_pauli_sum = isinstance(operator, PauliSum)
+    # The PauliSums are not changed after they are built, but the QubitOperators can be changed in place
+    if operator_diagonal.n_qubit == n_qubit and (is_pauli_sum or operator_diagonal.terms == operator.terms):
+        return operator_diagonal.diagonal, operator_diagonal.other_part
+    if is_pauli_sum:
+        diagonal_part, other_part = operator, None
+        has_diagonal = bool(np.any(operator.x_masks == 0))
+    else:
+        diagonal_part, other_part = split_diagonal_terms(operator)
+        has_diagonal = len(diagonal_part.terms) != 0
+    operator_diagonal.diagonal = get_cached_diagonal(n_qubit, diagonal_part) if has_diagonal else None
+    operator_diagonal.other_part = other_part
+    operator_diagonal.terms = None if is_pauli_sum else dict(operator.terms)
+    operator_diagonal.n_qubit = n_qubit
+    return operator_diagonal.diagonal, operator_diagonal.other_part
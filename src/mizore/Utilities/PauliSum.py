@@ -0,0 +1,162 @@
+from openfermion.ops import QubitOperator
+import numpy as np
+from scipy.sparse.linalg import LinearOperator
+from ..Backends._numpy_backend import get_basis_indices, get_pauli_masks, iter_grouped_diagonals, \
+    get_csr_matrix_by_masks, get_diagonal_by_z_masks
+from .Tools import get_operator_n_qubit
+
+"""
+A compact representation of the Hamiltonians as a sum of Pauli words stored by bitmasks.
+"""
+
+
+class PauliSum:
+    """
+    The operator H = sum_k coeffs[k] P_k, where the Pauli word P_k has X or Y on the bits of x_masks[k]
+    and Z or Y on the bits of z_masks[k], i.e. P_k = i^{n_y} X^{x_masks[k]} Z^{z_masks[k]} with n_y = |x_masks[k] & z_masks[k]|.
+    The i-th qubit is the i-th bit, the same as the statevectors (see CircuitEvaluation.get_ansatz_complete_amplitudes()).
+
+    H|psi> and <psi|H|psi> are computed by vectorized bit operations in O(n_term*2^n_qubit) time
+    and O(2^n_qubit) memory. The terms sharing a x_mask are applied together.
+    A PauliSum can be used in place of a QubitOperator for the expectation values and in place of the
+    Hamiltonian matrix for the products like hamiltonian_mat.dot(amplitudes).
+
+    Attributes:
+        n_qubit: number of qubits
+        x_masks, z_masks: int64 arrays of the masks of the terms
+        coeffs: complex array of the coefficients of the terms
+    """
+
+    def __init__(self, n_qubit, x_masks, z_masks, coeffs):
+        self.n_qubit = n_qubit
+        self.x_masks = np.array(x_masks, dtype=np.int64)
+        self.z_masks = np.array(z_masks, dtype=np.int64)
+        self.coeffs = np.array(coeffs, dtype=complex)
+        n_ys = [bin(x_mask & z_mask).count("1") for x_mask, z_mask in zip(self.x_masks.tolist(), self.z_masks.tolist())]
+        # The coefficients of X^x Z^z
+        self.phased_coeffs = self.coeffs * (1j ** (np.array(n_ys, dtype=np.int64) % 4))
+
+    @classmethod
+    def from_qubit_operator(cls, operator: QubitOperator, n_qubit=None):
+        if n_qubit is None:
+            n_qubit = get_operator_n_qubit(operator)
+        x_masks, z_masks, coeffs = [], [], []
+        for string_pauli, coeff in operator.terms.items():
+            x_mask, z_mask, _n_y = get_pauli_masks(string_pauli)
+            x_masks.append(x_mask)
+            z_masks.append(z_mask)
+            coeffs.append(coeff)
+        return cls(n_qubit, x_masks, z_masks, coeffs)
+
+    def to_qubit_operator(self):
+        operator = QubitOperator()
+        for x_mask, z_mask, coeff in zip(self.x_masks.tolist(), self.z_masks.tolist(), self.coeffs.tolist()):
+            string_pauli = []
+            index = 0
+            while (x_mask | z_mask) >> index:
+                x_bit, z_bit = (x_mask >> index) & 1, (z_mask >> index) & 1
+                if x_bit or z_bit:
+                    string_pauli.append((index, "Y" if x_bit and z_bit else ("X" if x_bit else "Z")))
+                index += 1
+            if coeff.imag == 0:
+                coeff = coeff.real
+            operator += QubitOperator(tuple(string_pauli), coeff)
+        return operator
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def dot(self, amplitudes):
+        """
+        Return H|psi>. The amplitudes can also be a (n_batch x 2^n_qubit) array
+        """
+        amplitudes = np.asarray(amplitudes)
+        n_dim = amplitudes.shape[-1]
+        basis = get_basis_indices(n_dim)
+        result = np.zeros(amplitudes.shape, dtype=complex)
+        for x_mask, diagonal in iter_grouped_diagonals(n_dim, self.x_masks, self.z_masks, self.phased_coeffs):
+            if x_mask == 0:
+                result += diagonal * amplitudes
+            else:
+                source = basis ^ x_mask
+                result += diagonal[source] * amplitudes[..., source]
+        return result
+
+    def get_expectation(self, amplitudes):
+        """
+        Return the real part of <psi|H|psi>, or the array of it for a (n_batch x 2^n_qubit) array of amplitudes
+        """
+        amplitudes = np.asarray(amplitudes)
+        expectation = np.sum(np.conjugate(amplitudes) * self.dot(amplitudes), axis=-1)
+        if amplitudes.ndim == 1:
+            return float(np.real(expectation))
+        return np.real(expectation)
+
+    def is_diagonal(self):
+        """
+        Return whether the operator only has Z (and identity) terms, i.e. is diagonal in the computational basis
+        """
+        return not np.any(self.x_masks)
+
+    def get_diagonal(self, n_qubit=None):
+        """
+        Return the diagonal of the Z terms of the operator, the energies of the basis states when is_diagonal().
+        The diagonal is real if the coefficients are real
+        """
+        if n_qubit is None:
+            n_qubit = self.n_qubit
+        z_part = self.x_masks == 0
+        coeffs = self.coeffs[z_part]
+        if not np.any(coeffs.imag):
+            coeffs = coeffs.real
+        return get_diagonal_by_z_masks(n_qubit, self.z_masks[z_part], coeffs)
+
+    def get_sparse_matrix_nbytes(self, n_qubit=None):
+        """
+        Return the number of bytes of the matrix returned by get_sparse_matrix()
+        """
+        if n_qubit is None:
+            n_qubit = self.n_qubit
+        n_dim = 1 << n_qubit
+        nnz = len(np.unique(self.x_masks)) * n_dim
+        index_size = 4 if nnz < 2 ** 31 else 8
+        return nnz * (16 + index_size) + (n_dim + 1) * index_size
+
+    def get_sparse_matrix(self, n_qubit=None):
+        """
+        Return the scipy CSR matrix of the operator. There are at most 2^n_qubit nonzeros for each term
+        and the terms sharing a x_mask share the nonzeros.
+        """
+        if n_qubit is None:
+            n_qubit = self.n_qubit
+        return get_csr_matrix_by_masks(1 << n_qubit, self.x_masks, self.z_masks, self.phased_coeffs)
+
+    def get_linear_operator(self, n_qubit=None):
+        """
+        Return a matrix-free scipy LinearOperator of the operator, which applies dot() when multiplied
+        """
+        if n_qubit is None:
+            n_qubit = self.n_qubit
+        return PauliSumLinearOperator(self, n_qubit)
+
+
+class PauliSumLinearOperator(LinearOperator):
+    """
+    The LinearOperator of a PauliSum. See PauliSum.get_linear_operator()
+    """
+
+    def __init__(self, pauli_sum: PauliSum, n_qubit):
+        n_dim = 1 << n_qubit
+        LinearOperator.__init__(self, dtype=complex, shape=(n_dim, n_dim))
+        self.pauli_sum = pauli_sum
+
+    def _matvec(self, vector):
+        return self.pauli_sum.dot(np.ravel(vector)).reshape(np.shape(vector))
+
+    def _matmat(self, matrix):
+        return self.pauli_sum.dot(np.asarray(matrix).T).T
+
+    def _adjoint(self):
+        conjugated = PauliSum(self.pauli_sum.n_qubit, self.pauli_sum.x_masks, self.pauli_sum.z_masks,
+                              np.conjugate(self.pauli_sum.coeffs))
+        return PauliSumLinearOperator(conjugated, int(self.shape[0]).bit_length() - 1)
@@ -75,32 +75,40 @@ PauliY = np.array([[0, -1j], [1j, 0]], np.complex)
 PauliZ = np.array([[1, 0], [0, -1]], np.complex)
 pauli_dict = {"I":PauliI,"X":PauliX,"Y":PauliY, "Z":PauliZ}
 
-def qubit_operator2matrix(n_qubit,hamiltonian: QubitOperator):
-    n_dim = 2**n_qubit
-    mat = np.zeros((n_dim, n_dim), complex)
-    for pauli_and_coff in hamiltonian.get_operators():
-        for string_pauli in pauli_and_coff.terms:
-            if not string_pauli:
-                mat += pauli_and_coff.terms[string_pauli]*np.eye(n_dim)
-                continue
-            string_pauli_i=0
-            if string_pauli[0][0]==0:
-                pauli0 = pauli_dict[string_pauli[0][1]]
-                string_pauli_i+=1
-            else:
-                pauli0 = PauliI
-            for i in range(1,n_qubit):
-                if string_pauli_i==len(string_pauli):
-                    pauli0 = np.kron(PauliI,pauli0)
-                    continue
-                if i == string_pauli[string_pauli_i][0]:
-                    pauli0 = np.kron(pauli_dict[string_pauli[string_pauli_i][1]],pauli0)
-                    string_pauli_i+=1
-                else:
-                    pauli0 = np.kron(PauliI,pauli0)
-            
-            mat += pauli_and_coff.terms[string_pauli]*pauli0
-    return mat
+def qubit_operator2matrix(n_qubit, hamiltonian: QubitOperator, memory_budget=None):
+    """
+    Return the matrix of the operator as a scipy CSR matrix.
+    The matrix is built from the bitmasks of the Pauli words (see PauliSum.get_sparse_matrix())
+    without any dense 2^n_qubit x 2^n_qubit intermediate.
+    Args:
+        hamiltonian: a QubitOperator or a PauliSum
+        memory_budget: (optional) the maximal number of bytes of the matrix. If the CSR matrix exceeds it,
+            a matrix-free scipy LinearOperator is returned instead (see PauliSum.get_linear_operator())
+    Returns:
+        a CSR matrix or a LinearOperator. Use mat.dot(vector) for the products
+    """
+    from .PauliSum import PauliSum
+    if isinstance(hamiltonian, PauliSum):
+        pauli_sum = hamiltonian
+    else:
+        pauli_sum = PauliSum.from_qubit_operator(hamiltonian, n_qubit)
+    if memory_budget is not None and pauli_sum.get_sparse_matrix_nbytes(n_qubit) > memory_budget:
+        return pauli_sum.get_linear_operator(n_qubit)
+    return pauli_sum.get_sparse_matrix(n_qubit)
+
+def split_diagonal_terms(operator: QubitOperator):
+    """
+    Return (the identity and Z terms, the other terms) of the operator as two QubitOperators.
+    The first part is diagonal in the computational basis
+    """
+    diagonal_part = QubitOperator()
+    other_part = QubitOperator()
+    for string_pauli, coeff in operator.terms.items():
+        if all(pauli == "Z" for _qubit, pauli in string_pauli):
+            diagonal_part.terms[string_pauli] = coeff
+        else:
+            other_part.terms[string_pauli] = coeff
+    return diagonal_part, other_part
 
 def pauliword2string(pauli):
     string = ""
@@ -0,0 +1,29 @@
+import numpy as np
+
+from mizore.Backends._factorized_backend import FactorizedState
+from mizore.Backends._numpy_backend import StateVector
+
+
+def test_copy_does_not_share_changes():
+    state = FactorizedState(3)
+    state.apply_h(0)
+    state.apply_cnot(0, 2)
+    copied_state = state.copy()
+    copied_state.apply_x(1)
+    copied_state.apply_rz(0, 0.7)
+    copied_state.apply_global_phase(0.3)
+    copied_state.apply_cnot(1, 2)
+    state.apply_ry(2, 0.4)
+
+    expected_state = StateVector(3)
+    expected_state.apply_h(0)
+    expected_state.apply_cnot(0, 2)
+    expected_copied_state = StateVector(3, expected_state.amplitudes.copy())
+    expected_copied_state.apply_x(1)
+    expected_copied_state.apply_rz(0, 0.7)
+    expected_copied_state.apply_global_phase(0.3)
+    expected_copied_state.apply_cnot(1, 2)
+    expected_state.apply_ry(2, 0.4)
+
+    assert np.allclose(state.get_statevector(), expected_state.amplitudes)
+    assert np.allclose(copied_state.get_statevector(), expected_copied_state.amplitudes)
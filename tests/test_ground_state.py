@@ -0,0 +1,25 @@
+import numpy as np
+from openfermion.ops import QubitOperator
+
+from mizore.Precalculation.NumPyCore import solve_ground_state_of_operator
+
+N_QUBIT = 7
+
+
+def get_hamiltonian():
+    hamiltonian = QubitOperator()
+    for i in range(N_QUBIT):
+        hamiltonian += QubitOperator("X" + str(i), 0.5) + QubitOperator("Z{} Z{}".format(i, (i + 1) % N_QUBIT), 1.0)
+    return hamiltonian
+
+
+def test_warm_start_keeps_global_random_state():
+    init_vector = np.zeros(1 << N_QUBIT)
+    init_vector[0] = 1.0
+    np.random.seed(1)
+    expected_numbers = np.random.rand(3)
+    np.random.seed(1)
+    energy, _vector = solve_ground_state_of_operator(N_QUBIT, get_hamiltonian(), init_vector=init_vector)
+    assert np.array_equal(np.random.rand(3), expected_numbers)
+    repeated_energy, _vector = solve_ground_state_of_operator(N_QUBIT, get_hamiltonian(), init_vector=init_vector)
+    assert energy == repeated_energy
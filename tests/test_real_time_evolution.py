@@ -0,0 +1,35 @@
+import numpy as np
+from openfermion.ops import QubitOperator
+
+from mizore.Blocks import BlockCircuit, RotationEntangler
+from mizore.Blocks._minor_blocks import GlobalPhaseBlock
+from mizore.ParameterOptimizer import RealTimeEvolutionOptimizer
+from mizore.ParameterOptimizer._rte_analytical_optimizer import RTEAnalyticalOptimizer
+
+N_QUBIT = 2
+HAMILTONIAN = QubitOperator("Z0", 0.5) + QubitOperator("X0", 0.3) + QubitOperator("X1", 0.4) + QubitOperator("Z1", -0.2)
+
+
+def get_product_circuit():
+    """
+    A product ansatz which can follow the evolution of HAMILTONIAN exactly
+    """
+    circuit = BlockCircuit(N_QUBIT)
+    for qubit in range(N_QUBIT):
+        for pauli, angle in ((1, 0.6), (3, 0.7)):
+            circuit.add_block(RotationEntangler([qubit], [pauli], angle))
+    circuit.add_block(GlobalPhaseBlock(0.1))
+    circuit.set_all_block_active()
+    return circuit
+
+
+def test_derivative_states_agree_with_fallback():
+    # Each optimizer keeps the convention of its fallback: finite differences for RealTimeEvolutionOptimizer
+    # and the derivative circuits for RTEAnalyticalOptimizer
+    for optimizer_class in (RealTimeEvolutionOptimizer, RTEAnalyticalOptimizer):
+        derivative_by_states = optimizer_class(random_adjust=0).calc_derivative(get_product_circuit(), HAMILTONIAN)
+        mapped_circuit = get_product_circuit()
+        # The circuits with qubit_index_mapping take the fallback path
+        mapped_circuit.qubit_index_mapping = list(range(N_QUBIT))
+        derivative_by_fallback = optimizer_class(random_adjust=0).calc_derivative(mapped_circuit, HAMILTONIAN)
+        assert np.allclose(derivative_by_states, derivative_by_fallback, atol=1e-4)
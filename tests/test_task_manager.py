@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from mizore.ParallelTaskRunner import TaskManager
+from mizore.ParallelTaskRunner._task import Task
+
+
+class SleepTask(Task):
+    def __init__(self, sleep_time, value):
+        Task.__init__(self)
+        self.sleep_time = sleep_time
+        self.value = value
+        self.offset = 0
+
+    def run(self):
+        time.sleep(self.sleep_time)
+        return self.value + self.offset
+
+
+@pytest.fixture
+def task_manager():
+    task_manager = TaskManager(n_processor=2)
+    yield task_manager
+    task_manager.close()
+
+
+def test_cancelled_futures_keep_their_resource(task_manager):
+    future_list = task_manager.submit_tasks([SleepTask(0.05, i) for i in range(8)], task_package_size=1,
+                                            public_resource={"offset": 100})
+    for future in future_list:
+        future.cancel()
+    # The resource of the cancelled tasks still in the queue must not be released before they run
+    new_future_list = task_manager.submit_tasks([SleepTask(0.0, i) for i in range(4)],
+                                                public_resource={"offset": 10})
+    assert [future.result(timeout=30) for future in new_future_list] == [10, 11, 12, 13]
+    assert task_manager.submit(SleepTask(0.0, 1)).result(timeout=30) == 1
+    assert list(task_manager.map([SleepTask(0.0, i) for i in range(3)], timeout=30)) == [0, 1, 2]
+    # All the results have arrived now, so both resources are released by the next call
+    task_manager.submit(SleepTask(0.0, 0)).result(timeout=30)
+    task_manager.submit(SleepTask(0.0, 0)).result(timeout=30)
+    assert len(task_manager.public_resource_dict) == 0
+
+
+def test_released_resource_fails_the_tasks(task_manager):
+    handle = task_manager.register_public_resource({"offset": 1})
+    task_manager.release_public_resource(handle)
+    with pytest.raises(Exception):
+        task_manager.submit(SleepTask(0.0, 0), public_resource=handle)
+    handle = task_manager.register_public_resource({"offset": 1})
+    future_list = task_manager.submit_tasks([SleepTask(0.1, i) for i in range(6)], task_package_size=1,
+                                            public_resource=handle)
+    task_manager.release_public_resource(handle)
+    for future in future_list:
+        # Failed or done, but never blocking the TaskRunners
+        future.exception(timeout=30)
+    assert task_manager.submit(SleepTask(0.0, 2)).result(timeout=30) == 2